@@ -0,0 +1,174 @@
+"""
+Incrementally maintained aggregates for Budget Tracker
+
+Running sums are kept per type, per category, per month and per
+(month, category) in integer minor units, so totals never need a pass over
+the ledger. Every bucket holds [income, expense, count]; a bucket is dropped
+once its last transaction is removed.
+"""
+
+from datetime import date
+from functools import lru_cache
+
+from transaction_store import EXPENSE, INCOME
+
+AGGREGATE_TABLES = ("by_category", "by_month", "by_month_category")
+
+
+# Get the "YYYY-MM" month key of a day ordinal (cached, days repeat)
+@lru_cache(maxsize=None)
+def month_key(date_ordinal):
+    day = date.fromordinal(date_ordinal)
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+class AggregateEngine:
+    #################### Initiation ####################
+    def __init__(self):
+        self.by_type = [0, 0]  # Indexed by INCOME / EXPENSE
+        self.count = 0
+        self.by_category = {}  # category -> [income, expense, count]
+        self.by_month = {}  # "YYYY-MM" -> [income, expense, count]
+        self.by_month_category = {}  # ("YYYY-MM", category) -> [...]
+
+    # Build an engine from every transaction in a store
+    @classmethod
+    def from_store(cls, store):
+        engine = cls()
+        engine.add_store(store)
+        return engine
+
+    # Build an engine from the output of to_json()
+    @classmethod
+    def from_json(cls, saved):
+        engine = cls()
+        engine.by_type = saved["by_type"]
+        engine.count = saved["count"]
+        for name in AGGREGATE_TABLES:
+            setattr(
+                engine,
+                name,
+                {
+                    tuple(key) if isinstance(key, list) else key: bucket
+                    for key, bucket in saved[name]
+                },
+            )
+        return engine
+
+    # Get every sum as JSON-ready data; JSON has no tuple keys, so tables are
+    # stored as [key, bucket] pairs
+    def to_json(self):
+        return {
+            "by_type": self.by_type,
+            "count": self.count,
+            **{name: list(getattr(self, name).items()) for name in AGGREGATE_TABLES},
+        }
+
+    #################### Updates ####################
+    # Add one transaction to every aggregate
+    def add(self, date_ordinal, category, transaction_type, amount):
+        self.apply(date_ordinal, category, transaction_type, amount, 1)
+
+    # Remove one transaction from every aggregate
+    def remove(self, date_ordinal, category, transaction_type, amount):
+        self.apply(date_ordinal, category, transaction_type, amount, -1)
+
+    # Replace an edited transaction; old and new are (date, category, type, amount)
+    def update(self, old, new):
+        self.remove(*old)
+        self.add(*new)
+
+    # Add the transaction at index of a store
+    def add_index(self, store, index):
+        self.add(
+            store.dates[index],
+            store.category(index),
+            store.types[index],
+            store.amounts[index],
+        )
+
+    # Add every live transaction of a store
+    def add_store(self, store):
+        for index in store.live_positions():
+            self.add_index(store, index)
+
+    # Add every sum of another engine, e.g. one built from a separate chunk
+    def merge(self, other):
+        self.by_type[INCOME] += other.by_type[INCOME]
+        self.by_type[EXPENSE] += other.by_type[EXPENSE]
+        self.count += other.count
+        for name in AGGREGATE_TABLES:
+            table = getattr(self, name)
+            for key, (income, expense, count) in getattr(other, name).items():
+                bucket = table.get(key)
+                if bucket is None:
+                    bucket = table[key] = [0, 0, 0]
+                bucket[INCOME] += income
+                bucket[EXPENSE] += expense
+                bucket[2] += count
+
+    # Add (sign=1) or remove (sign=-1) a transaction
+    def apply(self, date_ordinal, category, transaction_type, amount, sign):
+        amount *= sign
+        self.by_type[transaction_type] += amount
+        self.count += sign
+
+        month = month_key(date_ordinal)
+        for table, key in (
+            (self.by_category, category),
+            (self.by_month, month),
+            (self.by_month_category, (month, category)),
+        ):
+            bucket = table.get(key)
+            if bucket is None:
+                bucket = table[key] = [0, 0, 0]
+            bucket[transaction_type] += amount
+            bucket[2] += sign
+            if bucket[2] == 0:
+                del table[key]
+
+    #################### Queries ####################
+    # Get (income, expense, balance) in minor units
+    def totals(self):
+        income = self.by_type[INCOME]
+        expense = self.by_type[EXPENSE]
+        return income, expense, income - expense
+
+    # Get sorted "YYYY-MM" keys of months with transactions
+    def months(self):
+        return sorted(self.by_month)
+
+    # Get (income, expense) of a month
+    def month_totals(self, month):
+        bucket = self.by_month.get(month, (0, 0))
+        return bucket[INCOME], bucket[EXPENSE]
+
+    # Get (income, expense) of a category
+    def category_totals(self, category):
+        bucket = self.by_category.get(category, (0, 0))
+        return bucket[INCOME], bucket[EXPENSE]
+
+    # Get (income, expense) of a category within a month
+    def month_category_totals(self, month, category):
+        bucket = self.by_month_category.get((month, category), (0, 0))
+        return bucket[INCOME], bucket[EXPENSE]
+
+    #################### Verification ####################
+    # Compare against a full recompute over store and return the mismatches
+    # as (aggregate name, key, expected, actual) tuples
+    def verify(self, store):
+        expected = AggregateEngine.from_store(store)
+        mismatches = []
+        if expected.by_type != self.by_type:
+            mismatches.append(("by_type", None, expected.by_type, self.by_type))
+        if expected.count != self.count:
+            mismatches.append(("count", None, expected.count, self.count))
+        for name in ("by_category", "by_month", "by_month_category"):
+            expected_table = getattr(expected, name)
+            actual_table = getattr(self, name)
+            for key in expected_table.keys() | actual_table.keys():
+                if expected_table.get(key) != actual_table.get(key):
+                    mismatches.append(
+                        (name, key, expected_table.get(key), actual_table.get(key))
+                    )
+        return mismatches
@@ -0,0 +1,105 @@
+"""
+Synthetic ledger generator for benchmarks
+
+Writes a ledger of any size (10^3 to 10^7 rows and beyond) with rows that
+look like real use:
+
+- dates spread evenly over a number of years, in chronological order
+- mostly expenses; categories drawn from categories.json with a skewed
+  distribution, so a few categories dominate as they do in practice
+- log-normal amounts, small for expenses and large for income
+- notes from empty to a few Thai and English words
+
+Rows are generated lazily and written in batches through the storage
+backend, so memory stays flat at any size. The same seed gives the same
+ledger.
+
+Usage: python benchmarks/generate_ledger.py OUTPUT.csv|OUTPUT.db|OUTPUT/ --rows N
+       [--seed S] [--start-year 2015] [--years 10]
+"""
+
+from datetime import date
+import argparse, os, random, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from categories import load_categories
+from journal import DURABILITY_EXIT
+from storage import open_storage
+from transaction_store import EXPENSE, INCOME, MINOR_UNITS
+
+INCOME_SHARE = 0.12  # Fraction of rows that are income
+EXPENSE_AMOUNT = (5.5, 1.2)  # Log-normal mu and sigma in baht, median ~245
+INCOME_AMOUNT = (9.5, 0.8)  # Median ~13,000
+NOTE_WORDS = (
+    "ค่าอาหาร",
+    "กาแฟ",
+    "ตลาดนัด",
+    "ร้านสะดวกซื้อ",
+    "เติมน้ำมัน",
+    "ค่าส่ง",
+    "โอนเงิน",
+    "lunch",
+    "coffee",
+    "taxi",
+    "grab",
+    "shopee",
+    "refund",
+    "monthly",
+)
+NOTE_LENGTHS = (0, 1, 2, 3, 6)  # Words per note
+NOTE_LENGTH_WEIGHTS = (40, 25, 20, 10, 5)
+
+
+# Yield (date ordinal, category ID, type, amount, note) records in date order
+def generate_records(rows, catalog, seed=0, start_year=2015, years=10):
+    rng = random.Random(seed)
+    ids = (catalog.ids["income"], catalog.ids["expense"])
+    # Zipf-like weights over a seeded shuffle of each type's categories
+    weights = []
+    for category_ids in ids:
+        order = list(range(len(category_ids)))
+        rng.shuffle(order)
+        weights.append([1 / (rank + 1) for rank in order])
+
+    start = date(start_year, 1, 1).toordinal()
+    span = date(start_year + years, 1, 1).toordinal() - start
+    for index in range(rows):
+        if rng.random() < INCOME_SHARE:
+            transaction_type, (mu, sigma) = INCOME, INCOME_AMOUNT
+        else:
+            transaction_type, (mu, sigma) = EXPENSE, EXPENSE_AMOUNT
+        category = rng.choices(ids[transaction_type], weights[transaction_type])[0]
+        amount = max(1, round(rng.lognormvariate(mu, sigma) * MINOR_UNITS))
+        words = rng.choices(NOTE_LENGTHS, NOTE_LENGTH_WEIGHTS)[0]
+        note = " ".join(rng.choices(NOTE_WORDS, k=words))
+        yield start + index * span // rows, category, transaction_type, amount, note
+
+
+# Write a synthetic ledger of rows transactions to path (CSV, SQLite or a
+# partitioned directory)
+def generate_ledger(path, rows, seed=0, start_year=2015, years=10):
+    catalog = load_categories(os.path.join(ROOT, "categories.json"))
+    storage = open_storage(path, DURABILITY_EXIT)
+    try:
+        storage.import_records(generate_records(rows, catalog, seed, start_year, years))
+    finally:
+        storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("output")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start-year", type=int, default=2015)
+    parser.add_argument("--years", type=int, default=10)
+    args = parser.parse_args()
+    if os.path.exists(args.output):
+        sys.exit(f"{args.output} already exists")
+    generate_ledger(args.output, args.rows, args.seed, args.start_year, args.years)
+
+
+if __name__ == "__main__":
+    main()
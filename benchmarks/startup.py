@@ -0,0 +1,108 @@
+"""
+Startup-time harness for preview.py
+
+Each run starts a fresh interpreter and records, in seconds from the start
+of the import:
+
+- import: preview module imported
+- first_paint: first Expose event of the window
+- charts_ready: dashboard charts created (matplotlib loaded and drawn)
+
+The median, min and max of every metric are printed as JSON, together with
+the commit and interpreter, so results can be compared across releases.
+
+Usage: python benchmarks/startup.py [--runs N] [--output startup.json]
+A display is needed; on a headless machine run it under xvfb-run.
+"""
+
+import argparse, json, os, platform, statistics, subprocess, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMEOUT_MS = 30000  # Give up on a run that never shows its charts
+
+
+# Measure one startup in this interpreter and print the result as JSON
+def measure_once():
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import preview
+
+    result = {"import": time.perf_counter() - start}
+    app = preview.App()
+
+    def on_expose(event):
+        result.setdefault("first_paint", time.perf_counter() - start)
+
+    def on_charts_ready(event):
+        result["charts_ready"] = time.perf_counter() - start
+        app.after_idle(app.destroy)
+
+    app.bind("<Expose>", on_expose, add="+")
+    app.frames["HomePage"].bind("<<ChartsReady>>", on_charts_ready, add="+")
+    app.after(TIMEOUT_MS, app.destroy)
+    app.mainloop()
+    print(json.dumps(result))
+
+
+# Get the current commit, if the tree is a git checkout
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_once()
+        return
+
+    samples = {}
+    for _ in range(args.runs):
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if child.returncode != 0:
+            sys.exit(child.stderr)
+        for name, value in json.loads(child.stdout.splitlines()[-1]).items():
+            samples.setdefault(name, []).append(value)
+
+    results = {
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": args.runs,
+        "metrics": {
+            name: {
+                "median": statistics.median(values),
+                "min": min(values),
+                "max": max(values),
+            }
+            for name, values in samples.items()
+        },
+    }
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
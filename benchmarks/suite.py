@@ -0,0 +1,220 @@
+"""
+Benchmark suite for budget_tracker.py and preview.py
+
+For every ledger size a synthetic ledger is generated (see
+generate_ledger.py) in a temporary directory, and both GUIs are driven
+through withdrawn Tk roots so nothing is shown. Timed, in seconds:
+
+- background_load: BudgetTracker startup until the worker load finishes
+- load_transactions_cold: full reload with the snapshot cache removed
+- load_transactions: full reload from the snapshot cache
+- get_totals, refresh_transaction_table, save_transaction, toggle_language,
+  each including the coalesced redraw it schedules (see ui_scheduler.py)
+- reload_dashboard / update_dashboard: preview HomePage with its charts, the
+  reload until its background load is done
+- reports_<name>: every preview ReportPage report, over the whole ledger
+- parse_sequential / parse_parallel: cold load of the ledger without the
+  GUIs, in one process and in a pool of every core (see parallel_parse.py)
+
+The median, min and max of every metric per size are printed as JSON,
+together with the commit and interpreter, so results can be compared across
+commits.
+
+Usage: python benchmarks/suite.py [--sizes 1000 10000 100000] [--runs 5]
+       [--output results.json]
+A display is needed; on a headless machine run it under xvfb-run.
+"""
+
+import argparse, json, os, platform, shutil, statistics, tempfile, time
+
+from generate_ledger import ROOT, generate_ledger
+from startup import current_commit
+
+LOAD_WAIT_S = 0.005  # Sleep between event loop passes while waiting for loads
+
+
+# Time function runs times, calling setup (untimed) before each call
+def time_calls(function, runs, setup=None):
+    samples = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+# Run the event loop of root until a preview page's background load is done
+def wait_for_load(root, page):
+    while page.load_queue is not None:
+        root.update()
+        time.sleep(LOAD_WAIT_S)
+
+
+# Wrap a GUI operation so its deferred redraws are timed with it
+def flushed(function, ui):
+    def run():
+        function()
+        ui.flush()
+
+    return run
+
+
+# Time the BudgetTracker operations on the ledger in the working directory
+def measure_budget_tracker(runs):
+    from tkinter import Tk
+    import budget_tracker
+
+    samples = {}
+    root = Tk()
+    root.withdraw()
+    start = time.perf_counter()
+    app = budget_tracker.BudgetTracker(root)
+    while app.load_queue is not None:
+        root.update()
+        time.sleep(LOAD_WAIT_S)
+    samples["background_load"] = [time.perf_counter() - start]
+
+    def remove_snapshot():
+        snapshot = budget_tracker.LEDGER_FILE + ".snapshot"
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+
+    def fill_fields():
+        app.amount_var.set("123.45")
+        app.note_var.insert("1.0", "benchmark")
+
+    samples["load_transactions_cold"] = time_calls(
+        flushed(app.load_transactions, app.ui), runs, remove_snapshot
+    )
+    samples["load_transactions"] = time_calls(
+        flushed(app.load_transactions, app.ui), runs
+    )
+    samples["get_totals"] = time_calls(app.get_totals, runs)
+    samples["refresh_transaction_table"] = time_calls(
+        app.refresh_transaction_table, runs
+    )
+    samples["save_transaction"] = time_calls(
+        flushed(app.save_transaction, app.ui), runs, fill_fields
+    )
+    samples["toggle_language"] = time_calls(flushed(app.toggle_language, app.ui), runs)
+    app.close()
+    return samples
+
+
+# Time the preview dashboard on the ledger in the working directory
+def measure_preview(runs):
+    import preview
+
+    samples = {}
+    app = preview.App()
+    app.withdraw()
+    home = app.frames["HomePage"]
+    home.create_charts()  # A withdrawn window never gets its first Expose
+    wait_for_load(app, home)
+
+    # The month buckets load on a worker thread; a reload is timed until
+    # they are in and the dashboard is redrawn
+    def reload_dashboard():
+        home.reload_dashboard()
+        wait_for_load(app, home)
+        app.ui.flush()
+
+    samples["reload_dashboard"] = time_calls(reload_dashboard, runs)
+    samples["update_dashboard"] = time_calls(home.update_dashboard, runs)
+    app.show_frame("ReportPage")
+    report = app.frames["ReportPage"]
+    wait_for_load(app, report)
+    for name, report_name in zip(
+        ("pivot", "year_over_year", "top_categories", "percentiles"),
+        preview.REPORT_NAMES,
+    ):
+        report.report_var.set(report_name)
+        samples[f"reports_{name}"] = time_calls(report.show_report, runs)
+    app.close()
+    return samples
+
+
+# Time cold loads of the ledger in the working directory in one process and
+# in a process pool, whatever its size
+def measure_parse(runs):
+    import parallel_parse
+    from snapshot import LedgerLoader, load_chunks
+
+    def remove_snapshot():
+        if os.path.exists("transactions.csv.snapshot"):
+            os.remove("transactions.csv.snapshot")
+
+    samples = {}
+    min_bytes = parallel_parse.PARALLEL_MIN_BYTES
+    parallel_parse.PARALLEL_MIN_BYTES = 0
+    try:
+        for name, jobs in (("sequential", 1), ("parallel", os.cpu_count() or 1)):
+            samples[f"parse_{name}"] = time_calls(
+                lambda: load_chunks(LedgerLoader("transactions.csv", jobs=jobs)),
+                runs,
+                remove_snapshot,
+            )
+    finally:
+        parallel_parse.PARALLEL_MIN_BYTES = min_bytes
+    return samples
+
+
+# Generate a ledger of rows transactions and time both GUIs on it
+def measure_size(rows, runs, seed):
+    workdir = tempfile.mkdtemp(prefix="budget-benchmark-")
+    cwd = os.getcwd()
+    try:
+        # The GUIs read their ledger and categories from the working directory
+        shutil.copy(os.path.join(ROOT, "categories.json"), workdir)
+        os.chdir(workdir)
+        start = time.perf_counter()
+        generate_ledger("transactions.csv", rows, seed)
+        samples = {"generate_ledger": [time.perf_counter() - start]}
+        samples.update(measure_budget_tracker(runs))
+        samples.update(measure_preview(runs))
+        samples.update(measure_parse(runs))
+        return samples
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    metrics = {}
+    for rows in args.sizes:
+        metrics[str(rows)] = {
+            name: {
+                "median": statistics.median(values),
+                "min": min(values),
+                "max": max(values),
+            }
+            for name, values in measure_size(rows, args.runs, args.seed).items()
+        }
+
+    results = {
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": args.runs,
+        "seed": args.seed,
+        "metrics": metrics,
+    }
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
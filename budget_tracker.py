@@ -5,9 +5,33 @@ Date: August 2025
 """
 
 from tkinter import Tk, Frame, Label, Button, Entry, StringVar, messagebox, Text
-from tkinter import ttk
+from tkinter import DoubleVar, filedialog, ttk
 from datetime import datetime
-import csv, os, json
+from array import array
+from bisect import insort
+import os, queue, threading
+
+from aggregates import AggregateEngine
+from categories import CategoryIndex, load_categories
+from compaction import COMPACT_GARBAGE_RATIO, COMPACT_MIN_GARBAGE
+from date_index import DateIndex
+from export import export_csv, export_pdf, iter_records
+from importer import import_statement
+from note_search import NoteIndex
+from journal import COMMIT_INTERVAL_MS, DURABILITY_INTERVAL
+from profiling import profiled, span
+from snapshot import merge_chunk
+from stats_panel import StatsPanel
+from storage import open_storage
+from transaction_store import (
+    TRANSACTION_TYPES,
+    TransactionStore,
+    format_amount,
+    format_decimal,
+    parse_amount,
+    parse_type,
+)
+from ui_scheduler import UpdateScheduler
 
 # Constants for the application
 APP_TITLE = "Budget Tracker"
@@ -21,10 +45,26 @@ FG_COLOR = "#faf9f6"  # Foreground (text) color
 CONTROL_BG_COLOR = "#121212"  # Control panel background color
 DISPLAY_BG_COLOR = "#171717"  # Display panel background color
 
-# CSV file for persistent storage
-CSV_FILE = "transactions.csv"
+# Ledger file for persistent storage (.csv, or .db/.sqlite for SQLite)
+LEDGER_FILE = "transactions.csv"  # .csv, .db/.sqlite, or a directory/ (partitioned)
+LEDGER_DURABILITY = DURABILITY_INTERVAL  # When saved rows are synced, see journal.py
 CATEGORIES = "categories.json"
 
+# Cross-check the running aggregates against a full recompute after every
+# update (slow, for debugging only)
+VERIFY_AGGREGATES = os.environ.get("BUDGET_VERIFY_AGGREGATES") == "1"
+
+# Virtual transaction table: only the visible rows plus a buffer are kept
+# in the Treeview, whatever the size of the ledger
+TABLE_VISIBLE_ROWS = 10  # Rows shown at once
+TABLE_BUFFER_ROWS = 10  # Extra rows kept above and below the visible ones
+TABLE_POOL_ROWS = TABLE_VISIBLE_ROWS + 2 * TABLE_BUFFER_ROWS
+TABLE_WHEEL_ROWS = 3  # Rows moved per mouse wheel step
+
+# Background loading
+LOAD_POLL_MS = 50  # Delay between checks for newly parsed chunks
+LOAD_CHUNKS_PER_POLL = 4  # Chunks merged per check, keeps each UI slice short
+
 
 class BudgetTracker:
     #################### Initiation ####################
@@ -42,13 +82,11 @@ class BudgetTracker:
         self.root.grid_rowconfigure(0, weight=1)
         self.root.grid_columnconfigure(0, weight=1)
         self.root.grid_columnconfigure(1, weight=1)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
         #################### Load categories from JSON file ####################
-        self.categories = []
-        if os.path.exists(CATEGORIES):
-            with open(CATEGORIES, "r", encoding="utf-8") as file:
-                loaded_categories = json.load(file)
-                self.categories = loaded_categories
+        # Compiled into category IDs with label tuples per language
+        self.categories = load_categories(CATEGORIES)
 
         #################### Label variables ####################
         # Display panel labels
@@ -80,16 +118,22 @@ class BudgetTracker:
         self.note_label = StringVar(value="หมายเหตุ (ไม่จำเป็น)")
         self.save_button_label = StringVar(value="บันทึก")
         self.reset_button_label = StringVar(value="ล้างข้อมูล")
+        self.import_button_label = StringVar(value="นำเข้า CSV")
 
         # Filter panel labels
-        # self.filter_label = StringVar(value="ตัวกรอง")
-        # self.start_date_filter_label = StringVar(value="วันที่เริ่มต้น")
-        # self.end_date_filter_label = StringVar(value="วันที่สิ้นสุด")
-        # self.category_filter_option_label = StringVar(value="ทั้งหมด")
-        # self.apply_filter_button_label = StringVar(value="ใช้ตัวกรอง")
-        # self.clear_filter_button_label = StringVar(value="ล้างตัวกรอง")
-        # self.export_csv_button_label = StringVar(value="ส่งออก CSV")
-        # self.export_pdf_button_label = StringVar(value="ส่งออก PDF")
+        self.filter_label = StringVar(value="ตัวกรอง")
+        self.search_note_label = StringVar(value="ค้นหาหมายเหตุ")
+        self.start_date_filter_label = StringVar(value="วันที่เริ่มต้น")
+        self.end_date_filter_label = StringVar(value="วันที่สิ้นสุด")
+        self.category_filter_option_label = StringVar(value="ทั้งหมด")
+        self.apply_filter_button_label = StringVar(value="ใช้ตัวกรอง")
+        self.clear_filter_button_label = StringVar(value="ล้างตัวกรอง")
+        self.export_csv_button_label = StringVar(value="ส่งออก CSV")
+        self.export_pdf_button_label = StringVar(value="ส่งออก PDF")
+        self.cancel_export_button_label = StringVar(value="ยกเลิก")
+
+        # Stats panel labels
+        self.stats_label = StringVar(value="สถิติ")
         # self.delete_all_button_label = StringVar(value="ลบทั้งหมด")
 
         #################### Common variables ####################
@@ -109,15 +153,69 @@ class BudgetTracker:
         self.category_var = StringVar()
         self.amount_var = StringVar()
 
-        # Loaded transaction variable
-        self.loaded_transactions = []
+        # Ledger storage backend and loaded transactions, kept column by column
+        self.storage = open_storage(LEDGER_FILE, LEDGER_DURABILITY)
+        self.storage.recover(self.categories)
+        self.transactions = TransactionStore()
+
+        # Running sums in minor units, kept in step with transactions
+        self.aggregates = AggregateEngine()
+
+        # Filter variables, the range starts on the first of the current month
+        self.start_day_var = StringVar(value=1)
+        self.start_month_var = StringVar(value=datetime.now().month)
+        self.start_year_var = StringVar(value=datetime.now().year)
+        self.end_day_var = StringVar(value=datetime.now().day)
+        self.end_month_var = StringVar(value=datetime.now().month)
+        self.end_year_var = StringVar(value=datetime.now().year)
+
+        # Filter state
+        self.date_index = None  # Built on the first filter, see date_index.py
+        self.category_index = None  # Built on the first category filter
+        self.filter_category = None  # Category ID of the active filter, None for all
+        self.filter_range = None  # (start, end) day ordinals of the active filter
+        self.table_rows = None  # Store positions shown by the table, None for all
+        # Ascending indexes into table_rows (store positions when it is None)
+        # of the rows deleted since it was set, skipped by the table
+        self.table_hidden = array("L")
+
+        # Edit state
+        self.editing_id = None  # Transaction ID loaded into the form for editing
+        self.compact_queue = None  # Set while a compaction is running
+        self.compactor = None
+
+        # Note search state
+        self.search_var = StringVar()
+        self.search_query = ""  # Text the table is narrowed to, "" for none
+        self.note_index = None  # Built on the first search, see note_search.py
+        self.note_index_queue = None  # Set while the note index is being built
+        self.note_index_stale = False  # Notes changed while it was being built
+
+        # Export state
+        self.export_progress_var = DoubleVar(value=0.0)
+        self.export_queue = None  # Set while an export is running
+        self.export_cancel = threading.Event()
+
+        # Background loading state
+        self.load_progress_var = DoubleVar(value=0.0)
+        self.load_queue = None  # Set while a background load is running
+        self.pending_transactions = []  # Saved while loading, added afterwards
+        self.import_queue = None  # Set while a statement import is running
+
+        # Redraws are coalesced into one pass per idle cycle (see
+        # ui_scheduler.py); regions flush in this order
+        self.ui = UpdateScheduler(self.root)
+        self.ui.register("language", self.show_language_labels)
+        self.ui.register("categories", self.show_category_values)
+        self.ui.register("totals", self.show_totals)
+        self.ui.register("table", self.refresh_transaction_table)
 
         #################### Execute ####################
         self.create_widget()
 
-        # Load existing transactions from CSV file
-        if os.path.exists(CSV_FILE):
-            self.load_transactions()
+        # Load existing transactions without blocking the window
+        if self.storage.exists():
+            self.start_background_load()
 
     #################### Create widgets ####################
     # Create main widgets
@@ -137,7 +235,7 @@ class BudgetTracker:
         display_panel.grid_propagate(False)
 
         # Configure grid layout for display panel
-        display_panel_grid_rows_weight = [1, 2, 10]
+        display_panel_grid_rows_weight = [1, 2, 10, 1]
         display_panel_grid_columns_weight = [1, 1, 1]
         for i, w in enumerate(display_panel_grid_rows_weight):
             display_panel.grid_rowconfigure(i, weight=w)
@@ -147,6 +245,7 @@ class BudgetTracker:
         self.create_title_lang_panel(display_panel)
         self.create_summary_panel(display_panel)
         self.create_transaction_list_panel(display_panel)
+        self.create_process_panel(display_panel)
 
     ## Create title and language toggle button panel
     def create_title_lang_panel(self, parent):
@@ -155,6 +254,15 @@ class BudgetTracker:
             textvariable=self.title_label,
             bg="#ff0000",
         ).grid(row=0, column=0, columnspan=2, sticky="w", padx=PADDING)
+        # In its own row under the process panel, shown while loading or
+        # importing
+        self.load_progress_bar = ttk.Progressbar(
+            parent, variable=self.load_progress_var, maximum=1.0
+        )
+        self.load_progress_bar.grid(
+            row=4, column=0, columnspan=3, sticky="ew", padx=PADDING
+        )
+        self.load_progress_bar.grid_remove()
         lang_button = Button(
             parent, text="EN | TH", bg="#00ff00", command=self.toggle_language
         )
@@ -203,7 +311,10 @@ class BudgetTracker:
 
         columns_name = ("date", "category", "type", "amount", "note")
         self.transaction_table = ttk.Treeview(
-            table_frame, columns=columns_name, show="headings"
+            table_frame,
+            columns=columns_name,
+            show="headings",
+            height=TABLE_VISIBLE_ROWS,
         )
 
         self.transaction_table.heading("date", text=self.heading_date_label.get())
@@ -220,35 +331,185 @@ class BudgetTracker:
         self.transaction_table.column("amount", width=100, anchor="e")
         self.transaction_table.column("note", width=200)
 
-        scrollbar = ttk.Scrollbar(
-            table_frame, orient="vertical", command=self.transaction_table.yview
+        # The scrollbar follows the virtual offset over all transactions,
+        # not the few rows actually held by the Treeview
+        self.table_scrollbar = ttk.Scrollbar(
+            table_frame, orient="vertical", command=self.scroll_transaction_table
         )
-        self.transaction_table.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side="right", fill="y")
+        self.table_scrollbar.pack(side="right", fill="y")
         self.transaction_table.pack(fill="both", expand=True)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.transaction_table.bind(sequence, self.on_table_mousewheel)
+
+        # Virtual table state
+        self.table_offset = 0  # Index of the first visible transaction
+        self.table_window_start = 0  # Index of the first materialized transaction
+        self.table_items = []  # Treeview items reused for the materialized rows
+        self.table_item_ids = {}  # Transaction ID -> Treeview item showing it
 
         # เรียกรีเฟรชตอนสร้างครั้งแรก
         self.refresh_transaction_table()
 
+    # Fill the row pool with the transactions around the current offset
+    @profiled("table.refresh")
     def refresh_transaction_table(self):
-        # ลบข้อมูลเก่า
-        for row in self.transaction_table.get_children():
-            self.transaction_table.delete(row)
-
-        # ใส่ข้อมูลใหม่
-        for data in self.loaded_transactions:
-            self.transaction_table.insert(
-                "",
-                "end",
-                values=(
-                    data["Date"],
-                    data["Category"],
-                    data["Type"],
-                    data["Amount"],
-                    data["Note"],
-                ),
+        total = self.table_row_count()
+        self.table_offset = max(0, min(self.table_offset, total - TABLE_VISIBLE_ROWS))
+        end = min(
+            total, max(0, self.table_offset - TABLE_BUFFER_ROWS) + TABLE_POOL_ROWS
+        )
+        start = max(0, end - TABLE_POOL_ROWS)
+
+        # Grow or shrink the pool to the window size, then reuse its items
+        while len(self.table_items) < end - start:
+            self.table_items.append(self.transaction_table.insert("", "end"))
+        while len(self.table_items) > end - start:
+            self.transaction_table.delete(self.table_items.pop())
+        self.table_item_ids = {}
+        for item, index in zip(self.table_items, range(start, end)):
+            position = self.table_position(index)
+            self.transaction_table.item(item, values=self.get_store_row(position))
+            self.table_item_ids[self.transactions.ids[position]] = item
+
+        self.table_window_start = start
+        self.show_table_offset()
+
+    # Set the store positions the table shows, None for every live one
+    def set_table_rows(self, rows):
+        self.table_rows = rows
+        if rows is None and self.transactions.deleted_count:
+            self.table_hidden = self.transactions.deleted_positions()
+        else:
+            self.table_hidden = array("L")
+
+    # Get the number of transactions the table shows
+    def table_row_count(self):
+        if self.table_rows is None:
+            total = len(self.transactions)
+        else:
+            total = len(self.table_rows)
+        return total - len(self.table_hidden)
+
+    # Get the index into table_rows of the transaction at table index, by
+    # counting the hidden rows before it
+    def table_base_index(self, index):
+        hidden = self.table_hidden
+        lo, hi = 0, len(hidden)
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if hidden[middle] - middle <= index:
+                lo = middle + 1
+            else:
+                hi = middle
+        return index + lo
+
+    # Get the store position of the transaction at table index
+    def table_position(self, index):
+        index = self.table_base_index(index)
+        if self.table_rows is not None:
+            return self.table_rows[index]
+        return index
+
+    # Get the table values of the transaction at a store position, with the
+    # category ID shown as its label in the current language
+    def get_store_row(self, position):
+        date, category, transaction_type, amount, note = self.transactions.row(position)
+        category = self.categories.label(category, self.lang_var.get())
+        return date, category, transaction_type, amount, note
+
+    # Move the table to show transactions from offset onwards
+    def set_table_offset(self, offset):
+        total = self.table_row_count()
+        offset = max(0, min(offset, total - TABLE_VISIBLE_ROWS))
+        if offset == self.table_offset:
+            return
+        self.table_offset = offset
+
+        # Inside the buffered window only the view moves, otherwise refill
+        window_end = self.table_window_start + len(self.table_items)
+        if (
+            self.table_window_start <= offset
+            and offset + TABLE_VISIBLE_ROWS <= window_end
+        ):
+            self.show_table_offset()
+        else:
+            self.refresh_transaction_table()
+
+    # Scroll the row pool so the first visible transaction is on top
+    def show_table_offset(self):
+        if self.table_items:
+            # A quarter row past the boundary lands on the right row whether
+            # Tk truncates or rounds the fraction
+            position = self.table_offset - self.table_window_start + 0.25
+            self.transaction_table.yview_moveto(position / len(self.table_items))
+        self.update_table_scrollbar()
+
+    # Update the scrollbar from the virtual offset
+    def update_table_scrollbar(self):
+        total = self.table_row_count()
+        if total <= TABLE_VISIBLE_ROWS:
+            self.table_scrollbar.set(0, 1)
+        else:
+            self.table_scrollbar.set(
+                self.table_offset / total,
+                (self.table_offset + TABLE_VISIBLE_ROWS) / total,
             )
 
+    # Scrollbar command ("moveto fraction" or "scroll n units|pages")
+    def scroll_transaction_table(self, action, value, unit=None):
+        if action == "moveto":
+            offset = int(float(value) * self.table_row_count())
+        elif unit == "pages":
+            offset = self.table_offset + int(value) * TABLE_VISIBLE_ROWS
+        else:
+            offset = self.table_offset + int(value)
+        self.set_table_offset(offset)
+
+    # Mouse wheel scrolling over the table
+    def on_table_mousewheel(self, event):
+        if event.num == 5 or event.delta < 0:
+            self.set_table_offset(self.table_offset + TABLE_WHEEL_ROWS)
+        else:
+            self.set_table_offset(self.table_offset - TABLE_WHEEL_ROWS)
+        return "break"
+
+    # Show a newly appended transaction if it falls inside the row pool
+    def show_appended_transaction(self):
+        if len(self.table_items) < TABLE_POOL_ROWS:
+            self.ui.invalidate("table")
+        else:
+            self.update_table_scrollbar()
+
+    ## Create edit and delete buttons for the selected transaction
+    def create_process_panel(self, parent):
+        process_panel = Frame(parent, bg=DISPLAY_BG_COLOR)
+        process_panel.grid(row=3, column=0, columnspan=3)
+
+        Label(
+            process_panel,
+            textvariable=self.process_label,
+            bg=DISPLAY_BG_COLOR,
+            fg=FG_COLOR,
+        ).pack(side="left", padx=PADDING)
+        self.create_button_widgets(
+            process_panel,
+            self.process_edit_button_label,
+            "#00ffff",
+            10,
+            self.edit_transaction,
+            side="left",
+            padx=PADDING,
+        )
+        self.create_button_widgets(
+            process_panel,
+            self.process_delete_button_label,
+            "#00ffff",
+            10,
+            self.delete_transaction,
+            side="left",
+            padx=PADDING,
+        )
+
     # Create control panel widgets
     def create_control_panel_widgets(self, parent):
         control_panel = Frame(
@@ -265,7 +526,13 @@ class BudgetTracker:
         self.create_input_panel_widgets(self.control_panel_tabs)
 
         # Create filter panel inside control panel
-        # self.create_filter_panel_widgets(self.control_panel_tabs)
+        self.create_filter_panel_widgets(self.control_panel_tabs)
+
+        # Create performance stats panel inside control panel
+        self.stats_panel = StatsPanel(
+            self.control_panel_tabs, CONTROL_BG_COLOR, FG_COLOR
+        )
+        self.control_panel_tabs.add(self.stats_panel, text=self.stats_label.get())
 
     ## Create input panel widgets
     def create_input_panel_widgets(self, parent):
@@ -298,6 +565,12 @@ class BudgetTracker:
     ### Create date input widgets
     def create_date_input_widgets(self, parent):
         Label(parent, textvariable=self.date_label).pack()
+        self.create_date_combobox_widgets(
+            parent, self.day_var, self.month_var, self.year_var
+        )
+
+    ### Create day, month and year comboboxes
+    def create_date_combobox_widgets(self, parent, day_var, month_var, year_var):
         date_input_panel = Frame(parent, bg="#0000ff")
         date_input_panel.pack()
         date_input_panel.grid_rowconfigure(0, weight=1)
@@ -310,21 +583,21 @@ class BudgetTracker:
 
         ttk.Combobox(
             date_input_panel,
-            textvariable=self.day_var,
+            textvariable=day_var,
             values=days,
             width=5,
             state="readonly",
         ).grid(row=0, column=0)
         ttk.Combobox(
             date_input_panel,
-            textvariable=self.month_var,
+            textvariable=month_var,
             values=months,
             width=5,
             state="readonly",
         ).grid(row=0, column=1)
         ttk.Combobox(
             date_input_panel,
-            textvariable=self.year_var,
+            textvariable=year_var,
             values=years,
             width=5,
             state="readonly",
@@ -412,11 +685,117 @@ class BudgetTracker:
             padx=PADDING,
         )
 
+        # Bank statement import button
+        self.create_button_widgets(
+            button_panel,
+            self.import_button_label,
+            "#00ffff",
+            10,
+            self.import_statement_file,
+            pack_or_grid="grid",
+            row=1,
+            column=0,
+            columnspan=2,
+            pady=PADDING,
+        )
+
     ## Create filter panel widgets
-    # def create_filter_panel_widgets(self, parent):
-    #     self.filter_panel = Frame(parent, bg="#ff0000")
-    #     self.filter_panel.pack(fill="both", expand=True)
-    #     parent.add(self.filter_panel, text="Filter")
+    def create_filter_panel_widgets(self, parent):
+        self.filter_panel = Frame(parent, bg="#ff0000")
+        self.filter_panel.pack(fill="both", expand=True)
+        parent.add(self.filter_panel, text=self.filter_label.get())
+
+        # Note search, applied as the text changes
+        Label(self.filter_panel, textvariable=self.search_note_label).pack()
+        Entry(self.filter_panel, textvariable=self.search_var).pack()
+        self.search_var.trace_add("write", self.on_search_changed)
+
+        # Date range
+        Label(self.filter_panel, textvariable=self.start_date_filter_label).pack()
+        self.create_date_combobox_widgets(
+            self.filter_panel,
+            self.start_day_var,
+            self.start_month_var,
+            self.start_year_var,
+        )
+        Label(self.filter_panel, textvariable=self.end_date_filter_label).pack()
+        self.create_date_combobox_widgets(
+            self.filter_panel, self.end_day_var, self.end_month_var, self.end_year_var
+        )
+
+        # Category, "All" or one category of either type
+        Label(self.filter_panel, textvariable=self.category_label).pack()
+        self.category_filter_option = ttk.Combobox(self.filter_panel, state="readonly")
+        self.get_category_filter_values()
+        self.category_filter_option.pack()
+
+        # Apply and clear buttons
+        button_panel = Frame(self.filter_panel, bg="#ffff00")
+        button_panel.pack(pady=PADDING)
+        self.create_button_widgets(
+            button_panel,
+            self.apply_filter_button_label,
+            "#00ffff",
+            10,
+            self.apply_filter,
+            pack_or_grid="grid",
+            row=0,
+            column=0,
+            padx=PADDING,
+        )
+        self.create_button_widgets(
+            button_panel,
+            self.clear_filter_button_label,
+            "#00ffff",
+            10,
+            self.clear_filter,
+            pack_or_grid="grid",
+            row=0,
+            column=1,
+            padx=PADDING,
+        )
+
+        # Export buttons, writing the rows the table shows
+        export_panel = Frame(self.filter_panel, bg="#ffff00")
+        export_panel.pack(pady=PADDING)
+        self.create_button_widgets(
+            export_panel,
+            self.export_csv_button_label,
+            "#00ffff",
+            10,
+            self.export_csv_file,
+            pack_or_grid="grid",
+            row=0,
+            column=0,
+            padx=PADDING,
+        )
+        self.create_button_widgets(
+            export_panel,
+            self.export_pdf_button_label,
+            "#00ffff",
+            10,
+            self.export_pdf_file,
+            pack_or_grid="grid",
+            row=0,
+            column=1,
+            padx=PADDING,
+        )
+
+        # Export progress and cancel button, shown while an export runs
+        self.export_progress_bar = ttk.Progressbar(
+            export_panel, variable=self.export_progress_var, maximum=1.0, length=150
+        )
+        self.export_progress_bar.grid(row=1, column=0, pady=PADDING)
+        self.cancel_export_button = Button(
+            export_panel,
+            textvariable=self.cancel_export_button_label,
+            bg="#00ffff",
+            width=10,
+            command=self.export_cancel.set,
+        )
+        self.cancel_export_button.grid(row=1, column=1, pady=PADDING)
+        self.export_progress_bar.grid_remove()
+        self.cancel_export_button.grid_remove()
 
     ### Create button widgets
     def create_button_widgets(
@@ -440,7 +819,8 @@ class BudgetTracker:
 
     #################### Helper functions ####################
 
-    # Toggle language function
+    # Toggle language function; the labels, comboboxes and the rows on
+    # screen are redrawn together on the next idle pass
     def toggle_language(self):
 
         # Toggle between "th" and "en"
@@ -448,8 +828,11 @@ class BudgetTracker:
             self.lang_var.set("en")
         else:
             self.lang_var.set("th")
+        self.ui.invalidate("language", "categories", "table")
 
-        # Update all labels based on the selected language
+    # Update all labels based on the selected language
+    @profiled("ui.language")
+    def show_language_labels(self):
         ## Display panel
         ### Summary panel
         self.total_income_label.set(self.get_label("รายรับทั้งหมด", "Total Income"))
@@ -481,24 +864,33 @@ class BudgetTracker:
         )
         self.amount_label.set(self.get_label("จำนวนเงิน", "Amount"))
         self.note_label.set(self.get_label("หมายเหตุ (ไม่จำเป็น)", "Note (Optional)"))
-        self.save_button_label.set(self.get_label("บันทึก", "Save"))
+        self.show_save_label()
         self.reset_button_label.set(self.get_label("ล้างข้อมูล", "Reset"))
+        self.import_button_label.set(self.get_label("นำเข้า CSV", "Import CSV"))
 
         ### Filter panel
-        # self.filter_label.set(self.get_label("ตัวกรอง", "Filter"))
-        # self.start_date_filter_label.set(self.get_label("วันที่เริ่มต้น", "Start Date"))
-        # self.end_date_filter_label.set(self.get_label("วันที่สิ้นสุด", "End Date"))
-        # self.category_filter_option_label.set(self.get_label("ทั้งหมด", "All"))
-        # self.apply_filter_button_label.set(self.get_label("ใช้ตัวกรอง", "Apply Filter"))
-        # self.clear_filter_button_label.set(self.get_label("ล้างตัวกรอง", "Clear Filter"))
-        # self.export_csv_button_label.set(self.get_label("ส่งออก CSV", "Export CSV"))
-        # self.export_pdf_button_label.set(self.get_label("ส่งออก PDF", "Export PDF"))
+        self.filter_label.set(self.get_label("ตัวกรอง", "Filter"))
+        self.search_note_label.set(self.get_label("ค้นหาหมายเหตุ", "Search Notes"))
+        self.start_date_filter_label.set(self.get_label("วันที่เริ่มต้น", "Start Date"))
+        self.end_date_filter_label.set(self.get_label("วันที่สิ้นสุด", "End Date"))
+        self.category_filter_option_label.set(self.get_label("ทั้งหมด", "All"))
+        self.apply_filter_button_label.set(self.get_label("ใช้ตัวกรอง", "Apply Filter"))
+        self.clear_filter_button_label.set(
+            self.get_label("ล้างตัวกรอง", "Clear Filter")
+        )
+        self.export_csv_button_label.set(self.get_label("ส่งออก CSV", "Export CSV"))
+        self.export_pdf_button_label.set(self.get_label("ส่งออก PDF", "Export PDF"))
+        self.cancel_export_button_label.set(self.get_label("ยกเลิก", "Cancel"))
         # self.delete_all_button_label.set(self.get_label("ลบทั้งหมด", "Delete All"))
 
+        ### Stats panel
+        self.stats_label.set(self.get_label("สถิติ", "Stats"))
+
         self.control_panel_tabs.tab(
             self.input_panel, text=self.add_transaction_label.get()
         )
-        # self.control_panel_tabs.tab(self.filter_panel, text=self.filter_label.get())
+        self.control_panel_tabs.tab(self.filter_panel, text=self.filter_label.get())
+        self.control_panel_tabs.tab(self.stats_panel, text=self.stats_label.get())
 
         self.transaction_table.heading("date", text=self.date_label.get())
         self.transaction_table.heading("category", text=self.category_label.get())
@@ -506,27 +898,39 @@ class BudgetTracker:
         self.transaction_table.heading("amount", text=self.amount_label.get())
         self.transaction_table.heading("note", text=self.note_label.get())
 
-        # Update category values in combobox
+    # Update category values in both comboboxes; neither depends on the
+    # number of transactions
+    def show_category_values(self):
         self.get_category_values()
+        self.get_category_filter_values()
 
     # Helper function to get label based on language
     def get_label(self, th_label, en_label):
         return th_label if self.lang_var.get() == "th" else en_label
 
+    # Label the save button for a new transaction or for saving an edit
+    def show_save_label(self):
+        if self.editing_id is None:
+            self.save_button_label.set(self.get_label("บันทึก", "Save"))
+        else:
+            self.save_button_label.set(self.get_label("บันทึกการแก้ไข", "Save Changes"))
+
     # Get category values based on transaction type and language
     def get_category_values(self):
-        if self.transaction_type_var.get() == "income":
-            self.categorie_option["values"] = [
-                category["th"] if self.lang_var.get() == "th" else category["en"]
-                for category in self.categories["income"]
-            ]
-        else:
-            self.categorie_option["values"] = [
-                category["th"] if self.lang_var.get() == "th" else category["en"]
-                for category in self.categories["expense"]
-            ]
+        self.categorie_option["values"] = self.categories.type_labels(
+            self.transaction_type_var.get(), self.lang_var.get()
+        )
         self.categorie_option.current(0)
 
+    # Get category filter values, "All" first, keeping the selected category
+    def get_category_filter_values(self):
+        selected = max(self.category_filter_option.current(), 0)
+        self.category_filter_option["values"] = (
+            self.category_filter_option_label.get(),
+            *self.categories.all_labels[self.lang_var.get()],
+        )
+        self.category_filter_option.current(selected)
+
     # Amount validation
     def validate_amount(self, amount):
         if amount == "":
@@ -538,32 +942,256 @@ class BudgetTracker:
             return False
 
     # Save transaction
+    @profiled("transaction.save")
     def save_transaction(self):
         date = datetime(
             int(self.year_var.get()), int(self.month_var.get()), int(self.day_var.get())
-        ).strftime("%d-%m-%Y")
-        transaction_type = self.transaction_type_var.get()
-        category = self.category_var.get()
+        ).toordinal()
+        transaction_type = parse_type(self.transaction_type_var.get())
+        category = self.categories.ids[self.transaction_type_var.get()][
+            self.categorie_option.current()
+        ]
         amount = self.amount_var.get()
         note = self.note_var.get("1.0", "end").strip()
 
-        if not amount:
+        try:
+            amount = parse_amount(amount)
+        except ValueError:
             messagebox.showerror(
                 self.get_label("ข้อผิดพลาด", "Error"),
                 self.get_label("กรุณาใส่จำนวนเงิน", "Please enter an amount"),
             )
             return
 
-        # Save to CSV file
-        file_exists = os.path.isfile(CSV_FILE)
-        with open(CSV_FILE, mode="a", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            if not file_exists:
-                writer.writerow(["Date", "Category", "Type", "Amount", "Note"])
-            writer.writerow([date, category, transaction_type, float(amount), note])
+        record = (date, category, transaction_type, amount, note)
+        if self.editing_id is not None:
+            self.update_transaction(self.editing_id, record)
+            self.reset_fields()
+            return
 
+        transaction_id = self.storage.append(*record)
+        self.root.after(COMMIT_INTERVAL_MS, self.flush_storage)
         self.reset_fields()
-        self.load_transactions()
+
+        # Only the new row is added; use load_transactions() for a full reload
+        self.append_transaction(record, transaction_id)
+
+    # Add one saved transaction to memory, totals and table without a reload
+    # (record is (date ordinal, category, type, amount, note))
+    def append_transaction(self, record, transaction_id):
+        # Rows saved during a background load come after the loaded ones
+        if self.load_queue is not None:
+            self.pending_transactions.append((record, transaction_id))
+            return
+
+        index = self.transactions.append(*record, transaction_id)
+        if self.date_index is not None:
+            self.date_index.add(index)
+        if self.category_index is not None:
+            self.category_index.add(index)
+        if self.note_index is not None:
+            self.note_index.add(index)
+        self.update_totals(index)
+        if not self.is_filtered():
+            self.show_appended_transaction()
+        else:
+            self.refresh_filter()
+
+    # Get the table index of the selected row, or None; rows are not edited
+    # while the ledger is still loading or before the table shows its latest
+    # rows
+    def selected_index(self):
+        selection = self.transaction_table.selection()
+        if not selection or self.load_queue is not None or self.ui.is_dirty("table"):
+            return None
+        return self.table_window_start + self.table_items.index(selection[0])
+
+    # Get the store position of the selected table row, or None
+    def selected_position(self):
+        index = self.selected_index()
+        if index is None:
+            return None
+        return self.table_position(index)
+
+    # Load the selected transaction into the form; saving it writes an edit
+    def edit_transaction(self):
+        position = self.selected_position()
+        if position is None:
+            return
+        date, category, transaction_type, amount, note = self.transactions.record(
+            position
+        )
+        day = datetime.fromordinal(date)
+        self.day_var.set(day.day)
+        self.month_var.set(day.month)
+        self.year_var.set(day.year)
+        type_name = TRANSACTION_TYPES[transaction_type]
+        self.transaction_type_var.set(type_name)
+        self.get_category_values()
+        if category in self.categories.ids[type_name]:
+            self.categorie_option.current(
+                self.categories.ids[type_name].index(category)
+            )
+        self.amount_var.set(format_decimal(amount))
+        self.note_var.delete("1.0", "end")
+        self.note_var.insert("1.0", note)
+
+        self.editing_id = self.transactions.ids[position]
+        self.show_save_label()
+        self.control_panel_tabs.select(self.input_panel)
+
+    # Write an edit and update memory, totals and the one table row showing
+    # the transaction
+    @profiled("transaction.update")
+    def update_transaction(self, transaction_id, record):
+        position = self.transactions.position(transaction_id)
+        if position is None or self.transactions.deleted[position]:
+            return
+        old_record = self.transactions.record(position)
+        new_id = self.storage.update(transaction_id, old_record, record)
+        self.root.after(COMMIT_INTERVAL_MS, self.flush_storage)
+        if new_id != transaction_id:
+            # Moved to another partition under a new ID
+            self.remove_transaction(position)
+            self.append_transaction(record, new_id)
+            self.maybe_compact()
+            return
+
+        self.aggregates.remove(*old_record[:4])
+        self.transactions.update(position, record)
+        self.aggregates.add_index(self.transactions, position)
+        new_record = self.transactions.record(position)
+        if self.date_index is not None and (
+            old_record[0] != new_record[0] or old_record[2:4] != new_record[2:4]
+        ):
+            self.date_index.remove(position, old_record[0], *old_record[2:4])
+            self.date_index.add(position)
+        if self.category_index is not None and old_record[1] != new_record[1]:
+            self.category_index.update(position, old_record[1])
+        if old_record[4] != new_record[4]:
+            if self.note_index is not None:
+                self.note_index.update(position, old_record[4])
+            self.note_index_stale = self.note_index_queue is not None
+
+        if self.is_filtered():
+            self.refresh_filter()
+        else:
+            item = self.table_item_ids.get(transaction_id)
+            if item is not None:
+                self.transaction_table.item(item, values=self.get_store_row(position))
+            self.ui.invalidate("totals")
+        self.maybe_compact()
+
+    # Delete the selected transaction after confirmation
+    @profiled("transaction.delete")
+    def delete_transaction(self):
+        index = self.selected_index()
+        if index is None:
+            return
+        position = self.table_position(index)
+        if not messagebox.askyesno(
+            self.get_label("ลบ", "Delete"),
+            self.get_label("ลบรายการนี้หรือไม่?", "Delete this transaction?"),
+        ):
+            return
+        self.storage.delete(
+            self.transactions.ids[position], self.transactions.record(position)
+        )
+        self.root.after(COMMIT_INTERVAL_MS, self.flush_storage)
+        self.remove_transaction(position, index)
+        self.maybe_compact()
+
+    # Drop a deleted transaction from memory, totals and the table; index is
+    # its table index, if known
+    def remove_transaction(self, position, index=None):
+        if self.editing_id == self.transactions.ids[position]:
+            self.reset_fields()
+        record = self.transactions.record(position)
+        self.aggregates.remove(*record[:4])
+        self.transactions.delete(position)
+        if self.date_index is not None:
+            self.date_index.remove(position, record[0], *record[2:4])
+
+        # The table skips the row instead of rebuilding its list of positions
+        if self.table_rows is None:
+            insort(self.table_hidden, position)
+        elif index is not None:
+            insort(self.table_hidden, self.table_base_index(index))
+        else:
+            self.refresh_filter()
+        self.ui.invalidate("totals", "table")
+
+    # Compact the ledger on a worker thread once rows left behind by edits
+    # and deletes make up enough of it (see compaction.py)
+    def maybe_compact(self):
+        store = self.transactions
+        if (
+            self.compact_queue is not None
+            or self.load_queue is not None
+            or store.garbage < COMPACT_MIN_GARBAGE
+            or store.garbage_ratio() < COMPACT_GARBAGE_RATIO
+        ):
+            return
+        self.compactor = self.storage.compactor()
+        if self.compactor is None:
+            return
+        self.compact_queue = queue.Queue()
+        threading.Thread(
+            target=self.run_compactor,
+            args=(self.compactor, self.compact_queue),
+            daemon=True,
+        ).start()
+        self.root.after(LOAD_POLL_MS, self.poll_compactor, store.garbage)
+
+    # Worker thread: rewrite the ledger (no Tk calls here)
+    def run_compactor(self, compactor, compact_queue):
+        try:
+            compactor.run()
+            compact_queue.put(None)
+        except Exception as error:
+            compact_queue.put(error)
+
+    # Main thread: swap in the compacted ledger once it is written; garbage
+    # is what the ledger held when compaction started
+    def poll_compactor(self, garbage):
+        try:
+            error = self.compact_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(LOAD_POLL_MS, self.poll_compactor, garbage)
+            return
+
+        self.compact_queue = None
+        compactor, self.compactor = self.compactor, None
+        try:
+            if error is not None:
+                raise error
+            with span("ledger.compact"):
+                compactor.finish()
+        except Exception:
+            compactor.cancel()  # Housekeeping only, the next edit retries
+            return
+        self.transactions.garbage = max(self.transactions.garbage - garbage, 0)
+
+    # Write buffered rows once they are due, checking again for as long as
+    # any are still buffered; rows that failed to write stay buffered for
+    # the next save or close
+    def flush_storage(self):
+        try:
+            delay = self.storage.flush_due()
+        except Exception as error:
+            messagebox.showerror(self.get_label("ข้อผิดพลาด", "Error"), str(error))
+            return
+        if delay is not None:
+            self.root.after(delay, self.flush_storage)
+
+    # Write buffered transactions and close the window
+    def close(self):
+        self.export_cancel.set()
+        if self.compactor is not None:
+            self.compactor.cancel()
+        self.ui.cancel()
+        self.storage.close()
+        self.root.destroy()
 
     # Reset input fields
     def reset_fields(self):
@@ -574,37 +1202,438 @@ class BudgetTracker:
         self.get_category_values()
         self.amount_var.set("")
         self.note_var.delete("1.0", "end")
+        self.editing_id = None
+        self.show_save_label()
 
-    # Load transactions from CSV file
+    # Load transactions from the ledger
+    @profiled("ledger.load")
     def load_transactions(self):
-        with open(CSV_FILE, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            self.loaded_transactions = list(reader)
-        self.get_totals()
-        self.refresh_transaction_table()
+        # The snapshot cache means only rows appended since the last run
+        # are parsed
+        self.transactions, self.aggregates = self.storage.load()
+        self.reset_indexes()
+        self.refresh_filter()
+
+    # Load transactions on a worker thread, filling the window as chunks arrive
+    def start_background_load(self):
+        self.transactions = TransactionStore()
+        self.aggregates = AggregateEngine()
+        self.load_queue = queue.Queue()
+        self.load_progress_var.set(0.0)
+        self.load_progress_bar.grid()
+
+        loader = self.storage.loader()
+        threading.Thread(
+            target=self.run_loader, args=(loader, self.load_queue), daemon=True
+        ).start()
+        self.root.after(LOAD_POLL_MS, self.poll_loader, loader)
+
+    # Worker thread: parse chunks and queue them (no Tk calls here)
+    def run_loader(self, loader, load_queue):
+        try:
+            for chunk in loader.chunks():
+                load_queue.put(chunk)
+            load_queue.put(None)
+        except Exception as error:
+            load_queue.put(error)
+
+    # Main thread: merge the chunks parsed so far and update the window
+    def poll_loader(self, loader):
+        for _ in range(LOAD_CHUNKS_PER_POLL):
+            try:
+                item = self.load_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None:
+                loader.save_snapshot(self.transactions, self.aggregates)
+                self.finish_background_load()
+                return
+            if isinstance(item, Exception):
+                self.finish_background_load()
+                messagebox.showerror(self.get_label("ข้อผิดพลาด", "Error"), str(item))
+                return
+
+            chunk, chunk_aggregates, progress = item
+            with span("loader.merge"):
+                self.transactions, self.aggregates = merge_chunk(
+                    self.transactions, self.aggregates, chunk, chunk_aggregates
+                )
+            self.reset_indexes()
+            self.load_progress_var.set(progress)
+
+        # Filtered views are refreshed once the whole ledger is in
+        if not self.is_filtered():
+            self.set_table_rows(None)
+            self.ui.invalidate("totals", "table")
+        self.root.after(LOAD_POLL_MS, self.poll_loader, loader)
+
+    # Hide the progress bar and add rows saved while loading
+    def finish_background_load(self):
+        self.load_queue = None
+        self.load_progress_bar.grid_remove()
+        self.refresh_filter()
+
+        pending, self.pending_transactions = self.pending_transactions, []
+        for record, transaction_id in pending:
+            self.append_transaction(record, transaction_id)
+
+    # Import a bank statement CSV, parsed on a worker thread
+    def import_statement_file(self):
+        if self.load_queue is not None or self.import_queue is not None:
+            return
+        path = filedialog.askopenfilename(filetypes=[("CSV", "*.csv")])
+        if not path:
+            return
+
+        self.import_queue = queue.Queue()
+        self.load_progress_var.set(0.0)
+        self.load_progress_bar.grid()
+        threading.Thread(
+            target=self.run_import,
+            args=(path, self.transactions, self.import_queue),
+            daemon=True,
+        ).start()
+        self.root.after(LOAD_POLL_MS, self.poll_import)
+
+    # Worker thread: parse and dedupe the statement (no Tk calls here)
+    def run_import(self, path, existing, import_queue):
+        try:
+            result = import_statement(
+                path,
+                self.categories,
+                existing,
+                progress=lambda progress: import_queue.put(("progress", progress)),
+            )
+            import_queue.put(("done", result))
+        except Exception as error:
+            import_queue.put(("error", error))
+
+    # Main thread: show import progress and add the rows once parsed
+    def poll_import(self):
+        while True:
+            try:
+                kind, value = self.import_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "progress":
+                self.load_progress_var.set(value)
+                continue
+            self.import_queue = None
+            self.load_progress_bar.grid_remove()
+            if kind == "error":
+                messagebox.showerror(self.get_label("ข้อผิดพลาด", "Error"), str(value))
+            else:
+                self.finish_import(*value)
+            return
+
+        self.root.after(LOAD_POLL_MS, self.poll_import)
+
+    # Write imported rows in one transaction, then add them to memory
+    def finish_import(self, imported, duplicates, invalid):
+        try:
+            imported.set_ids(self.storage.import_records(imported))
+        except OSError as error:
+            messagebox.showerror(self.get_label("ข้อผิดพลาด", "Error"), str(error))
+            return
+
+        self.transactions, self.aggregates = merge_chunk(
+            self.transactions,
+            self.aggregates,
+            imported,
+            AggregateEngine.from_store(imported),
+        )
+        self.reset_indexes()
+        self.refresh_filter()
+        messagebox.showinfo(
+            self.get_label("นำเข้า", "Import"),
+            self.get_label(
+                f"นำเข้า {len(imported)} รายการ, ซ้ำ {duplicates}, ไม่ถูกต้อง {invalid}",
+                f"Imported {len(imported)}, duplicates {duplicates}, "
+                f"invalid {invalid}",
+            ),
+        )
+
+    # Show only the transactions within the selected date range
+    def apply_filter(self):
+        try:
+            start = datetime(
+                int(self.start_year_var.get()),
+                int(self.start_month_var.get()),
+                int(self.start_day_var.get()),
+            ).toordinal()
+            end = datetime(
+                int(self.end_year_var.get()),
+                int(self.end_month_var.get()),
+                int(self.end_day_var.get()),
+            ).toordinal()
+        except ValueError:
+            messagebox.showerror(
+                self.get_label("ข้อผิดพลาด", "Error"),
+                self.get_label("วันที่ไม่ถูกต้อง", "Invalid date"),
+            )
+            return
+
+        self.filter_range = (min(start, end), max(start, end))
+        selected = self.category_filter_option.current()
+        self.filter_category = (
+            self.categories.all_ids[selected - 1] if selected > 0 else None
+        )
+        self.table_offset = 0
+        self.refresh_filter()
+
+    # Drop the indexes of a store that was replaced or merged into; a note
+    # index being built is rebuilt once it is done
+    def reset_indexes(self):
+        self.date_index = None
+        self.category_index = None
+        self.note_index = None
+        self.note_index_stale = self.note_index_queue is not None
+
+    # Build the note index on a worker thread; the table is narrowed to the
+    # search once it is done
+    def start_note_index(self):
+        if self.note_index_queue is not None:
+            return
+        self.note_index_queue = queue.Queue()
+        self.note_index_stale = False
+        store = self.transactions
+        threading.Thread(
+            target=self.run_note_index,
+            args=(store, self.note_index_queue),
+            daemon=True,
+        ).start()
+        self.root.after(LOAD_POLL_MS, self.poll_note_index, store)
+
+    # Worker thread: index every note (no Tk calls here)
+    def run_note_index(self, store, note_index_queue):
+        try:
+            note_index_queue.put(NoteIndex(store))
+        except Exception as error:
+            note_index_queue.put(error)
+
+    # Main thread: keep the built index unless notes changed meanwhile, and
+    # add the rows appended since it started
+    def poll_note_index(self, store):
+        try:
+            note_index = self.note_index_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(LOAD_POLL_MS, self.poll_note_index, store)
+            return
+
+        self.note_index_queue = None
+        if isinstance(note_index, Exception):
+            messagebox.showerror(self.get_label("ข้อผิดพลาด", "Error"), str(note_index))
+            return
+        if self.note_index_stale or store is not self.transactions:
+            if self.search_query:
+                self.start_note_index()
+            return
+        for index in range(note_index.size, len(store)):
+            note_index.add(index)
+        self.note_index = note_index
+        if self.search_query:
+            self.refresh_filter()
+
+    # Narrow the table to the notes containing the search text, on every
+    # keystroke
+    def on_search_changed(self, *args):
+        self.search_query = self.search_var.get().strip()
+        self.table_offset = 0
+        self.refresh_filter()
+
+    # Is a filter or a note search narrowing the table
+    def is_filtered(self):
+        return self.filter_range is not None or bool(self.search_query)
+
+    # Get the store positions within the filter, from the date index or the
+    # posting list of the filtered category; None when no filter is applied
+    def get_filter_rows(self):
+        if self.filter_range is None:
+            return None
+        if self.filter_category is None:
+            if self.date_index is None:
+                self.date_index = DateIndex(self.transactions)
+            return self.date_index.rows(*self.filter_range)
+
+        if self.category_index is None:
+            self.category_index = CategoryIndex(self.transactions)
+        start, end = self.filter_range
+        dates = self.transactions.dates
+        deleted = self.transactions.deleted
+        return sorted(
+            (
+                index
+                for index in self.category_index.rows(self.filter_category)
+                if start <= dates[index] <= end and not deleted[index]
+            ),
+            key=dates.__getitem__,
+        )
+
+    # Show the filtered rows, keeping only the notes matching the search
+    @profiled("filter.refresh")
+    def refresh_filter(self):
+        rows = self.get_filter_rows()
+        if self.search_query:
+            if self.note_index is None:
+                self.start_note_index()  # Refreshes again once it is built
+                return
+            hits = self.note_index.search(self.search_query)
+            if rows is None:
+                rows = hits
+            else:
+                hits = set(hits)
+                rows = [index for index in rows if index in hits]
+
+        self.set_table_rows(rows)
+        self.ui.invalidate("totals", "table")
+
+    # Get (income, expense, balance) of the filtered rows
+    def get_filter_totals(self):
+        if self.table_rows is None:
+            # A search waiting for the note index still shows every row
+            return self.aggregates.totals()
+        if self.filter_category is None and not self.search_query:
+            return self.date_index.totals(*self.filter_range)
+        sums = [0, 0]
+        deleted = self.transactions.deleted
+        for index in self.table_rows:
+            if not deleted[index]:
+                sums[self.transactions.types[index]] += self.transactions.amounts[index]
+        income, expense = sums
+        return income, expense, income - expense
+
+    # Show every transaction again
+    def clear_filter(self):
+        self.filter_range = None
+        self.filter_category = None
+        self.category_filter_option.current(0)
+        self.refresh_filter()
+
+    # Export the rows the table shows as CSV
+    def export_csv_file(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".csv", filetypes=[("CSV", "*.csv")]
+        )
+        if path:
+            self.start_export(export_csv, path)
+
+    # Export the rows the table shows as PDF
+    def export_pdf_file(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".pdf", filetypes=[("PDF", "*.pdf")]
+        )
+        if path:
+            headings = (
+                self.heading_date_label.get(),
+                self.heading_category_label.get(),
+                self.heading_type_label.get(),
+                self.heading_amount_label.get(),
+                self.heading_note_label.get(),
+            )
+            self.start_export(export_pdf, path, headings)
+
+    # Run an export writer on a worker thread over the rows the table shows
+    def start_export(self, writer, path, *options):
+        if self.export_queue is not None:
+            return
+
+        # The worker keeps its own references, so reloads and new filters do
+        # not change what it is writing
+        store = self.transactions
+        rows = self.table_rows
+        if rows is not None and self.table_hidden:
+            rows = [index for index in rows if not store.deleted[index]]
+        total = self.table_row_count()
+        language = self.lang_var.get()
+        catalog = self.categories
+        arguments = (
+            path,
+            iter_records(store, rows),
+            total,
+            lambda category: catalog.label(category, language),
+            *options,
+        )
+
+        self.export_queue = queue.Queue()
+        self.export_cancel.clear()
+        self.export_progress_var.set(0.0)
+        self.export_progress_bar.grid()
+        self.cancel_export_button.grid()
+        threading.Thread(
+            target=self.run_export,
+            args=(writer, arguments, self.export_queue),
+            daemon=True,
+        ).start()
+        self.root.after(LOAD_POLL_MS, self.poll_export)
+
+    # Worker thread: write the export and queue progress (no Tk calls here)
+    def run_export(self, writer, arguments, export_queue):
+        try:
+            completed = writer(
+                *arguments,
+                lambda progress: export_queue.put(("progress", progress)),
+                self.export_cancel.is_set,
+            )
+            export_queue.put(("done", completed))
+        except Exception as error:
+            export_queue.put(("error", error))
+
+    # Main thread: show export progress and the result once it finishes
+    def poll_export(self):
+        while True:
+            try:
+                kind, value = self.export_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "progress":
+                self.export_progress_var.set(value)
+                continue
+            self.export_queue = None
+            self.export_progress_bar.grid_remove()
+            self.cancel_export_button.grid_remove()
+            if kind == "error":
+                messagebox.showerror(self.get_label("ข้อผิดพลาด", "Error"), str(value))
+            elif value:
+                messagebox.showinfo(
+                    self.get_label("ส่งออก", "Export"),
+                    self.get_label("ส่งออกเรียบร้อย", "Export complete"),
+                )
+            return
+
+        self.root.after(LOAD_POLL_MS, self.poll_export)
 
     # Get total income, expense, and balance
     def get_totals(self):
-        # Calculate total income
-        total_income = sum(
-            float(trans["Amount"])
-            for trans in self.loaded_transactions
-            if trans["Type"] == "income"
-        )
-        # Calculate total expense
-        total_expense = sum(
-            float(trans["Amount"])
-            for trans in self.loaded_transactions
-            if trans["Type"] == "expense"
-        )
-
-        # Calculate total balance
-        total_balance = total_income - total_expense
-
-        # Update variables
-        self.total_income_var.set(f"{total_income:,.2f}")
-        self.total_expense_var.set(f"{total_expense:,.2f}")
-        self.total_balance_var.set(f"{total_balance:,.2f}")
+        self.aggregates = AggregateEngine.from_store(self.transactions)
+        self.show_totals()
+
+    # Add a single transaction to the running totals
+    def update_totals(self, index):
+        self.aggregates.add_index(self.transactions, index)
+        self.ui.invalidate("totals")
+
+    # Show total income, expense, and balance in the summary panel
+    def show_totals(self):
+        if VERIFY_AGGREGATES:
+            self.verify_aggregates()
+
+        # A filter or search shows the totals of its rows
+        if not self.is_filtered():
+            total_income, total_expense, total_balance = self.aggregates.totals()
+        else:
+            total_income, total_expense, total_balance = self.get_filter_totals()
+        self.total_income_var.set(format_amount(total_income))
+        self.total_expense_var.set(format_amount(total_expense))
+        self.total_balance_var.set(format_amount(total_balance))
+
+    # Cross-check the running aggregates against a full recompute
+    def verify_aggregates(self):
+        mismatches = self.aggregates.verify(self.transactions)
+        if mismatches:
+            raise RuntimeError(f"Aggregates out of sync: {mismatches[:5]}")
 
 
 if __name__ == "__main__":
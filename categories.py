@@ -0,0 +1,117 @@
+"""
+Category catalog and per-category index for Budget Tracker
+
+categories.json is compiled once at startup into stable category IDs with
+prebuilt label tuples per language and type, plus dict lookups in both
+directions. Ledgers store the ID ("groceries"), never the label, so the same
+category is saved the same way whatever the UI language; labels are looked
+up only for the rows on screen.
+
+Rows written before IDs existed hold a Thai or English label. The catalog
+maps every label back to its ID (per type, since a label such as
+"Gifts/Donations" exists for both); the catalog is passed to the code that
+converts such rows (migrate_ledger() and SqliteStorage.recover()).
+
+CategoryIndex keeps a posting list of store positions per category, so the
+rows of one category are found without scanning the ledger.
+"""
+
+from array import array
+from bisect import bisect_left, insort
+import json, os
+
+from transaction_store import TRANSACTION_TYPES
+
+CATEGORIES_FILE = "categories.json"
+LANGUAGES = ("th", "en")
+# Category IDs of rows no other category fits, per type code
+FALLBACK_CATEGORIES = ("miscellaneous_income", "miscellaneous_expenses")
+
+
+class CategoryCatalog:
+    #################### Initiation ####################
+    # Compile parsed categories.json data ({"income": [{"id", "th", "en"}]})
+    def __init__(self, data):
+        self.ids = {}  # type -> (category ID, ...) in display order
+        self.labels = {language: {} for language in LANGUAGES}  # type -> labels
+        self.label_by_id = {language: {} for language in LANGUAGES}
+        self.id_by_label = {}  # (type code, label in any language) -> ID
+
+        for transaction_type, type_name in enumerate(TRANSACTION_TYPES):
+            entries = data.get(type_name, [])
+            self.ids[type_name] = tuple(entry["id"] for entry in entries)
+            for language in LANGUAGES:
+                labels = tuple(entry[language] for entry in entries)
+                self.labels[language][type_name] = labels
+                self.label_by_id[language].update(zip(self.ids[type_name], labels))
+                for category_id, label in zip(self.ids[type_name], labels):
+                    self.id_by_label[(transaction_type, label)] = category_id
+
+        # Every category of both types, as used by the category filter
+        self.all_ids = sum(self.ids.values(), ())
+        self.all_labels = {
+            language: sum(self.labels[language].values(), ()) for language in LANGUAGES
+        }
+
+    #################### Lookup ####################
+    # Get the label of a category ID; unknown categories are shown as stored
+    def label(self, category_id, language):
+        return self.label_by_id[language].get(category_id, category_id)
+
+    # Get the category ID of a label of the given type code
+    def category_id(self, transaction_type, label):
+        return self.id_by_label.get((transaction_type, label), label)
+
+    # Get the labels of a type ("income" or "expense") in display order
+    def type_labels(self, type_name, language):
+        return self.labels[language][type_name]
+
+
+# Load categories.json into a catalog
+def load_categories(path=CATEGORIES_FILE):
+    data = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+    return CategoryCatalog(data)
+
+
+#################### Index ####################
+class CategoryIndex:
+    def __init__(self, store):
+        self.store = store
+        self.rebuild()
+
+    # Collect the store positions of every interned category in one pass,
+    # leaving out deleted rows
+    def rebuild(self):
+        self.postings = [array("L") for _ in self.store.categories]
+        category_ids = self.store.category_ids
+        for index in self.store.live_positions():
+            self.postings[category_ids[index]].append(index)
+
+    # Add the store row at index
+    def add(self, index):
+        category = self.store.category_ids[index]
+        while len(self.postings) <= category:
+            self.postings.append(array("L"))
+        self.postings[category].append(index)
+
+    # Move the store row at index from the posting list of old_category_id
+    # to the one of its current category
+    def update(self, index, old_category_id):
+        old_posting = self.rows(old_category_id)
+        position = bisect_left(old_posting, index)
+        if position < len(old_posting) and old_posting[position] == index:
+            del old_posting[position]
+        category = self.store.category_ids[index]
+        while len(self.postings) <= category:
+            self.postings.append(array("L"))
+        insort(self.postings[category], index)
+
+    # Get the store positions of a category ID in insertion order
+    def rows(self, category_id):
+        category = self.store.category_lookup.get(category_id)
+        if category is None:
+            return array("L")
+        return self.postings[category]
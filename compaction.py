@@ -0,0 +1,141 @@
+"""
+Compaction of CSV ledgers with edits and deletes
+
+Edits and deletes are appended to a ledger as change rows (see
+ledger_format.py), so the rows they replace stay in the file until it is
+compacted. compact_ledger() rewrites a ledger with every change applied in
+two streaming passes: the first collects the changes by transaction ID, the
+second writes each surviving row with its latest values. Runs of deleted
+rows become one #skip row, so every transaction keeps its ID.
+
+LedgerCompactor splits the work for the GUIs: run() does both passes on a
+worker thread while rows are still being appended, and finish() copies what
+was appended meanwhile and swaps the files on the main thread.
+"""
+
+import csv, io, os, shutil
+
+from ledger_format import (
+    CHANGE_DELETE,
+    CHANGE_SKIP,
+    CHANGE_UPDATE,
+    LEDGER_HEADER,
+    encode_record,
+    parse_change,
+    parse_record,
+    read_header,
+)
+from mapped_ledger import row_index_path
+from snapshot import ChecksumReader, snapshot_path
+
+COMPACT_SUFFIX = ".compact"  # Temporary file a ledger is compacted into
+COMPACT_GARBAGE_RATIO = 0.25  # Share of dead rows that makes compaction worth it
+COMPACT_MIN_GARBAGE = 1000  # Dead rows below which a ledger is never compacted
+
+
+# Yield (marker, file ID, record, skipped IDs) for the first end bytes of a
+# canonical ledger: marker is None for a row, with the ID it was given, and
+# the change marker for a change row
+def ledger_entries(file, end):
+    file.seek(0)
+    text = io.TextIOWrapper(
+        io.BufferedReader(ChecksumReader(file, end)), encoding="utf-8", newline=""
+    )
+    if not read_header(text):
+        return
+    next_id = 0
+    for row in csv.reader(text):
+        try:
+            record = parse_record(row)
+        except (KeyError, ValueError):
+            change = parse_change(row) if row else None
+            if change is not None:
+                yield change
+                next_id += change[3]
+            continue
+        yield None, next_id, record, 0
+        next_id += 1
+
+
+# Write the first end bytes of a canonical ledger to target with every change
+# applied; returns the number of rows and change rows dropped
+def compact_ledger(path, end, target):
+    with open(path, "rb") as file:
+        # Latest record of every changed ID, None once deleted
+        changes = {}
+        for marker, transaction_id, record, _ in ledger_entries(file, end):
+            if marker == CHANGE_DELETE:
+                changes[transaction_id] = None
+            elif marker == CHANGE_UPDATE and changes.get(transaction_id, 0) is not None:
+                changes[transaction_id] = record
+
+        read = written = skipped = 0
+        with open(target, "w", encoding="utf-8", newline="") as output:
+            output.write(LEDGER_HEADER)
+            writer = csv.writer(output)
+            for marker, transaction_id, record, skipped_ids in ledger_entries(
+                file, end
+            ):
+                if marker == CHANGE_SKIP:
+                    skipped += skipped_ids
+                    continue
+                read += 1
+                if marker is not None:
+                    continue
+                if transaction_id in changes:
+                    record = changes[transaction_id]
+                    if record is None:
+                        skipped += 1
+                        continue
+                if skipped:
+                    writer.writerow((CHANGE_SKIP, skipped))
+                    skipped = 0
+                writer.writerow(encode_record(record))
+                written += 1
+            # Trailing deletes still use up their IDs
+            if skipped:
+                writer.writerow((CHANGE_SKIP, skipped))
+            output.flush()
+            os.fsync(output.fileno())
+    return read - written
+
+
+# Compacts one CSV ledger: run() on a worker thread, then finish() on the
+# thread that appends to the ledger. flush writes buffered appends before
+# the rows appended since run() started are copied over.
+class LedgerCompactor:
+    def __init__(self, path, flush=None):
+        self.path = path
+        self.flush = flush
+        self.end = os.path.getsize(path)
+        self.temp_path = path + COMPACT_SUFFIX
+        self.dropped = None  # Rows dropped, once run() is done
+
+    def run(self):
+        self.dropped = compact_ledger(self.path, self.end, self.temp_path)
+
+    # Append the rows written since run() started and replace the ledger; its
+    # snapshot and row index no longer match and are removed. Returns the
+    # number of rows dropped.
+    def finish(self):
+        if self.flush is not None:
+            self.flush()
+        with open(self.path, "rb") as source, open(self.temp_path, "ab") as output:
+            source.seek(self.end)
+            shutil.copyfileobj(source, output)
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(self.temp_path, self.path)
+        for cache_path in (snapshot_path(self.path), row_index_path(self.path)):
+            try:
+                os.remove(cache_path)
+            except FileNotFoundError:
+                pass
+        return self.dropped
+
+    # Remove the partly written file of a compaction that will not finish
+    def cancel(self):
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
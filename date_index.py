@@ -0,0 +1,124 @@
+"""
+Date-range index over a TransactionStore
+
+Store positions are kept sorted by date next to prefix sums of income and
+expense in that order, so the rows of a date range are found by binary
+search and the range totals are two subtractions, without scanning the
+ledger.
+
+Rows appended in date order extend the sorted arrays in O(1). Rows added out
+of order and rows removed by edits and deletes are held beside them, in
+added and removed, and applied to each query; once OVERLAY_LIMIT of them
+pile up the arrays are rebuilt on the next query.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from transaction_store import EXPENSE, INCOME
+
+OVERLAY_LIMIT = 1024  # Added and removed rows held before a rebuild
+
+
+class DateIndex:
+    #################### Initiation ####################
+    def __init__(self, store):
+        self.store = store
+        self.rebuild()
+
+    # Sort every live store position by date and recompute the prefix sums
+    def rebuild(self):
+        store = self.store
+        self.order = array(
+            "L", sorted(store.live_positions(), key=store.dates.__getitem__)
+        )
+        self.sorted_dates = array("l", (store.dates[i] for i in self.order))
+        self.prefix_sums = [
+            array(
+                "q",
+                accumulate(
+                    (
+                        store.amounts[i] if store.types[i] == transaction_type else 0
+                        for i in self.order
+                    ),
+                    initial=0,
+                ),
+            )
+            for transaction_type in (INCOME, EXPENSE)
+        ]
+        self.added = {}  # Store position -> (date ordinal, type, amount)
+        self.removed = {}  # Store position -> (date ordinal, type, amount)
+        self.stale = False
+
+    # Add the store row at index; rows dated on or after the latest one are
+    # appended in O(1), anything else is held in added
+    def add(self, index):
+        if self.stale:
+            return
+        store = self.store
+        date_ordinal = store.dates[index]
+        if index in self.removed or (
+            self.sorted_dates and date_ordinal < self.sorted_dates[-1]
+        ):
+            self.added[index] = (date_ordinal, store.types[index], store.amounts[index])
+            self.check_overlay()
+            return
+        self.order.append(index)
+        self.sorted_dates.append(date_ordinal)
+        for transaction_type, prefix in zip((INCOME, EXPENSE), self.prefix_sums):
+            amount = store.amounts[index]
+            if store.types[index] != transaction_type:
+                amount = 0
+            prefix.append(prefix[-1] + amount)
+
+    # Remove the store row at index, given the date, type and amount it was
+    # indexed with (an edit has already replaced them in the store)
+    def remove(self, index, date_ordinal, transaction_type, amount):
+        if self.stale:
+            return
+        if self.added.pop(index, None) is None:
+            self.removed[index] = (date_ordinal, transaction_type, amount)
+            self.check_overlay()
+
+    # Mark the index for a rebuild once too many rows are held beside it
+    def check_overlay(self):
+        if len(self.added) + len(self.removed) > OVERLAY_LIMIT:
+            self.stale = True
+
+    #################### Queries ####################
+    # Get the [lo, hi) span of the sorted order covering start..end inclusive
+    def span(self, start_ordinal, end_ordinal):
+        if self.stale:
+            self.rebuild()
+        lo = bisect_left(self.sorted_dates, start_ordinal)
+        hi = bisect_right(self.sorted_dates, end_ordinal)
+        return lo, max(lo, hi)
+
+    # Get store positions dated start..end inclusive, in date order
+    def rows(self, start_ordinal, end_ordinal):
+        lo, hi = self.span(start_ordinal, end_ordinal)
+        rows = self.order[lo:hi]
+        if self.removed:
+            removed = self.removed
+            rows = array("L", (index for index in rows if index not in removed))
+        added = [
+            index
+            for index, (date_ordinal, _, _) in self.added.items()
+            if start_ordinal <= date_ordinal <= end_ordinal
+        ]
+        if added:
+            dates = self.store.dates
+            rows = sorted([*rows, *added], key=lambda index: (dates[index], index))
+        return rows
+
+    # Get (income, expense, balance) of start..end inclusive in minor units
+    def totals(self, start_ordinal, end_ordinal):
+        lo, hi = self.span(start_ordinal, end_ordinal)
+        sums = [prefix[hi] - prefix[lo] for prefix in self.prefix_sums]
+        for held, sign in ((self.removed, -1), (self.added, 1)):
+            for date_ordinal, transaction_type, amount in held.values():
+                if start_ordinal <= date_ordinal <= end_ordinal:
+                    sums[transaction_type] += sign * amount
+        income, expense = sums
+        return income, expense, income - expense
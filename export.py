@@ -0,0 +1,167 @@
+"""
+Streaming CSV and PDF export for Budget Tracker
+
+An export is a generator pipeline: store positions (all rows, or the rows of
+the active filter) -> store records -> formatted rows -> bounded batches.
+Only one batch (or one PDF page) is held at a time, so memory stays flat
+whatever the size of the export.
+
+The writers take progress(fraction) and cancelled() callables and touch no
+Tk objects, so the GUI runs them on a worker thread. Output goes to a
+temporary file that replaces the target only once the export completes.
+
+matplotlib is imported only when a PDF is exported.
+"""
+
+from itertools import islice
+import csv, os
+
+from transaction_store import (
+    EXPENSE,
+    INCOME,
+    TRANSACTION_TYPES,
+    format_amount,
+    format_date,
+    format_decimal,
+)
+
+EXPORT_FIELDNAMES = ["Date", "Category", "Type", "Amount", "Note"]
+EXPORT_BATCH_ROWS = 5000  # Rows formatted and written per CSV batch
+PDF_ROWS_PER_PAGE = 40
+PDF_PAGE_SIZE = (8.27, 11.69)  # A4 portrait, inches
+PDF_NOTE_CHARS = 40  # Longer notes are cut to fit the page
+# Fallback list so Thai labels render whichever of these fonts is installed
+PDF_FONT_FAMILIES = ["Tahoma", "Noto Sans Thai", "Garuda", "DejaVu Sans"]
+
+
+#################### Pipeline ####################
+# Yield the store records (date, category, type, amount, note) at rows,
+# or of the whole store when rows is None
+def iter_records(store, rows=None):
+    if rows is None:
+        rows = store.live_positions()
+    for index in rows:
+        yield store.record(index)
+
+
+# Yield lists of up to size items
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+#################### CSV ####################
+# Write records as a ledger-style CSV; returns False if cancelled
+def export_csv(path, records, total, category_label, progress, cancelled):
+    temp_path = path + ".tmp"
+    written = 0
+    try:
+        with open(temp_path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(EXPORT_FIELDNAMES)
+            for batch in batched(records, EXPORT_BATCH_ROWS):
+                if cancelled():
+                    return False
+                writer.writerows(
+                    (
+                        format_date(date_ordinal),
+                        category_label(category),
+                        TRANSACTION_TYPES[transaction_type],
+                        format_decimal(amount),
+                        note,
+                    )
+                    for date_ordinal, category, transaction_type, amount, note in batch
+                )
+                written += len(batch)
+                progress(written / max(total, 1))
+        os.replace(temp_path, path)
+        return True
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+#################### PDF ####################
+def import_pdf():
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    return Figure, PdfPages
+
+
+# Get the first of PDF_FONT_FAMILIES that is installed, looked up once per
+# export instead of once per cell
+def pdf_font_family():
+    from matplotlib import font_manager
+
+    installed = {font.name for font in font_manager.fontManager.ttflist}
+    for family in PDF_FONT_FAMILIES:
+        if family in installed:
+            return family
+    return PDF_FONT_FAMILIES[-1]
+
+
+# Write records as a paged PDF table; each page ends with its own income and
+# expense and the running totals up to that page. Returns False if cancelled.
+def export_pdf(path, records, total, category_label, headings, progress, cancelled):
+    Figure, PdfPages = import_pdf()
+    font_family = pdf_font_family()
+    temp_path = path + ".tmp"
+    written = 0
+    running = [0, 0]
+    try:
+        with PdfPages(temp_path) as pdf:
+            pages = batched(records, PDF_ROWS_PER_PAGE)
+            for page_number, page in enumerate(pages, start=1):
+                if cancelled():
+                    return False
+                page_sums = [0, 0]
+                cells = []
+                for date_ordinal, category, transaction_type, amount, note in page:
+                    page_sums[transaction_type] += amount
+                    cells.append(
+                        [
+                            format_date(date_ordinal),
+                            category_label(category),
+                            TRANSACTION_TYPES[transaction_type],
+                            format_amount(amount),
+                            note[:PDF_NOTE_CHARS],
+                        ]
+                    )
+                running[INCOME] += page_sums[INCOME]
+                running[EXPENSE] += page_sums[EXPENSE]
+
+                figure = Figure(figsize=PDF_PAGE_SIZE)
+                axes = figure.add_axes([0.05, 0.1, 0.9, 0.85])
+                axes.axis("off")
+                table = axes.table(
+                    cellText=cells, colLabels=headings, loc="upper center"
+                )
+                table.auto_set_font_size(False)
+                table.set_fontsize(7)
+                for cell in table.get_celld().values():
+                    cell.get_text().set_fontfamily(font_family)
+                figure.text(
+                    0.05,
+                    0.05,
+                    f"Page {page_number}   "
+                    f"Income {format_amount(page_sums[INCOME])}   "
+                    f"Expense {format_amount(page_sums[EXPENSE])}   "
+                    f"Running income {format_amount(running[INCOME])}   "
+                    f"Running expense {format_amount(running[EXPENSE])}   "
+                    f"Balance {format_amount(running[INCOME] - running[EXPENSE])}",
+                    fontsize=8,
+                )
+                pdf.savefig(figure)
+
+                written += len(cells)
+                progress(written / max(total, 1))
+        os.replace(temp_path, path)
+        return True
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,265 @@
+"""
+Bulk import of bank-statement CSV files
+
+A statement is read in batches of IMPORT_BATCH_ROWS rows and turned into a
+TransactionStore of new rows:
+
+- columns are found by header name (English or Thai, see COLUMN_NAMES) unless
+  a mapping is given; amounts come from one signed column or from separate
+  debit/credit columns, as credit minus debit with blank cells counted as 0
+- the date format (DD-MM-YYYY or YYYY-MM-DD, with "-", "/" or "." between
+  parts) is detected once from a sample instead of tried row by row
+- categories are mapped to category IDs from the category column, or from
+  keywords of the category labels found in the description, falling back to
+  the miscellaneous category of the type
+- rows whose content (date, type, amount, note) already exists in the ledger
+  are skipped as duplicates, as many times as the ledger holds them
+
+Statements repeat the same dates, amounts and descriptions over and over, so
+every parsed value is memoized by its text and most rows cost a few dict
+lookups. The caller writes the result with storage.import_records(), which
+adds every row in one transaction.
+"""
+
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+import csv, os
+
+from categories import FALLBACK_CATEGORIES
+from transaction_store import (
+    DATE_FORMATS,
+    EXPENSE,
+    INCOME,
+    TRANSACTION_TYPES,
+    TransactionStore,
+    parse_amount,
+)
+
+IMPORT_BATCH_ROWS = 50000
+DATE_SAMPLE_ROWS = 1000  # Rows used to detect the date format
+# Header names of each field, compared casefolded
+COLUMN_NAMES = {
+    "date": ("date", "transaction date", "posting date", "วันที่", "วันที่ทำรายการ"),
+    "amount": ("amount", "จำนวนเงิน", "จำนวน"),
+    "debit": ("debit", "withdrawal", "withdraw", "ถอน", "ถอนเงิน", "เดบิต"),
+    "credit": ("credit", "deposit", "ฝาก", "ฝากเงิน", "เครดิต"),
+    "type": ("type", "ประเภท"),
+    "category": ("category", "หมวดหมู่"),
+    "note": ("note", "description", "details", "memo", "หมายเหตุ", "รายละเอียด"),
+}
+# Type column values, compared casefolded
+TYPE_NAMES = {
+    "income": INCOME,
+    "expense": EXPENSE,
+    "รายรับ": INCOME,
+    "รายจ่าย": EXPENSE,
+}
+KEYWORD_MIN_CHARS = 3  # Shorter label parts are too vague to match on
+
+
+#################### Columns and dates ####################
+# Map fields to column indexes of a statement header
+def detect_columns(header):
+    names = [name.strip().casefold() for name in header]
+    columns = {}
+    for field, aliases in COLUMN_NAMES.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    if "date" not in columns:
+        raise ValueError("No date column found")
+    if "amount" not in columns and not ("debit" in columns or "credit" in columns):
+        raise ValueError("No amount, debit or credit column found")
+    return columns
+
+
+# Get the date format of sample date strings with separators normalized to "-"
+def detect_date_format(values):
+    values = [value for value in values if value]
+    for date_format in DATE_FORMATS:
+        try:
+            for value in values:
+                datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        return date_format
+    raise ValueError("Dates are neither DD-MM-YYYY nor YYYY-MM-DD")
+
+
+# Normalize "31/01/2024" and "2024.01.31" to "-" separators
+def normalize_date(text):
+    return text.strip().replace("/", "-").replace(".", "-")
+
+
+#################### Categories ####################
+# Maps a statement category or description to a category ID
+class CategoryMatcher:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.cache = {}  # (type, category, note) -> ID
+        # Label casefolded in any language -> ID, per type
+        self.labels = [{}, {}]
+        # (keyword, ID) pairs per type, longest keywords first
+        self.keywords = [[], []]
+        for transaction_type, type_name in enumerate(TRANSACTION_TYPES):
+            ids = catalog.ids.get(type_name, ())
+            for category_id in ids:
+                self.labels[transaction_type][category_id.casefold()] = category_id
+            for labels in catalog.labels.values():
+                for category_id, label in zip(ids, labels.get(type_name, ())):
+                    self.labels[transaction_type][label.casefold()] = category_id
+                    for keyword in label.split(" (")[0].split("/"):
+                        keyword = keyword.strip().casefold()
+                        if len(keyword) >= KEYWORD_MIN_CHARS:
+                            self.keywords[transaction_type].append(
+                                (keyword, category_id)
+                            )
+            self.keywords[transaction_type].sort(key=lambda pair: -len(pair[0]))
+
+    def match(self, transaction_type, category, note):
+        key = (transaction_type, category, note)
+        category_id = self.cache.get(key)
+        if category_id is None:
+            category_id = self.labels[transaction_type].get(category.casefold())
+            if category_id is None:
+                text = note.casefold()
+                category_id = next(
+                    (
+                        keyword_id
+                        for keyword, keyword_id in self.keywords[transaction_type]
+                        if keyword in text
+                    ),
+                    FALLBACK_CATEGORIES[transaction_type],
+                )
+            self.cache[key] = category_id
+        return category_id
+
+
+#################### Import ####################
+# Get the content key of a row; the tuple itself, so rows whose hashes
+# collide are not taken for duplicates
+def content_key(date_ordinal, transaction_type, amount, note):
+    return date_ordinal, transaction_type, amount, note
+
+
+# Parse the amount in a debit or credit cell, memoized by its text in
+# amounts; a blank cell or a missing column is 0
+def parse_cell_amount(row, column, amounts):
+    if column is None:
+        return 0
+    text = row[column]
+    amount = amounts.get(text)
+    if amount is None:
+        amount = amounts[text] = parse_amount(text) if text.strip() else 0
+    return amount
+
+
+# Get a Counter of the content keys of every row of a store
+def content_keys(store):
+    return Counter(
+        content_key(
+            store.dates[index],
+            store.types[index],
+            store.amounts[index],
+            store.note(index),
+        )
+        for index in store.live_positions()
+    )
+
+
+# Parse a bank statement into a store of new rows; returns
+# (store, duplicates, invalid) where invalid counts rows that failed to parse.
+# progress(fraction) is called after every batch.
+def import_statement(
+    path, catalog, existing=None, columns=None, date_format=None, progress=None
+):
+    matcher = CategoryMatcher(catalog)
+    seen = content_keys(existing) if existing is not None else Counter()
+    store = TransactionStore()
+    duplicates = invalid = 0
+    dates, amounts = {}, {}  # Memoized parses by text
+
+    size = os.path.getsize(path)
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return store, 0, 0
+        if columns is None:
+            columns = detect_columns(header)
+        date_column = columns["date"]
+        amount_column = columns.get("amount")
+        debit_column = columns.get("debit")
+        credit_column = columns.get("credit")
+        type_column = columns.get("type")
+        category_column = columns.get("category")
+        note_column = columns.get("note")
+
+        while True:
+            batch = list(islice(reader, IMPORT_BATCH_ROWS))
+            if not batch:
+                break
+            if date_format is None:
+                date_format = detect_date_format(
+                    normalize_date(row[date_column])
+                    for row in batch[:DATE_SAMPLE_ROWS]
+                    if len(row) > date_column
+                )
+
+            for row in batch:
+                try:
+                    text = row[date_column]
+                    date_ordinal = dates.get(text)
+                    if date_ordinal is None:
+                        date_ordinal = datetime.strptime(
+                            normalize_date(text), date_format
+                        ).toordinal()
+                        dates[text] = date_ordinal
+
+                    # One signed amount column, or debit and credit columns;
+                    # debits are taken as withdrawals whatever their sign
+                    if amount_column is not None:
+                        text = row[amount_column]
+                        amount = amounts.get(text)
+                        if amount is None:
+                            amount = amounts[text] = parse_amount(text)
+                    else:
+                        debit = parse_cell_amount(row, debit_column, amounts)
+                        credit = parse_cell_amount(row, credit_column, amounts)
+                        amount = credit - abs(debit)
+
+                    if type_column is not None:
+                        transaction_type = TYPE_NAMES[
+                            row[type_column].strip().casefold()
+                        ]
+                    else:
+                        transaction_type = EXPENSE if amount < 0 else INCOME
+                    amount = abs(amount)
+
+                    note = row[note_column].strip() if note_column is not None else ""
+                    category = (
+                        row[category_column] if category_column is not None else ""
+                    )
+                except (IndexError, KeyError, TypeError, ValueError):
+                    invalid += 1
+                    continue
+
+                key = content_key(date_ordinal, transaction_type, amount, note)
+                if seen[key]:
+                    seen[key] -= 1
+                    duplicates += 1
+                    continue
+                store.append(
+                    date_ordinal,
+                    matcher.match(transaction_type, category.strip(), note),
+                    transaction_type,
+                    amount,
+                    note,
+                )
+
+            if progress is not None:
+                progress(file.buffer.tell() / max(size, 1))
+
+    return store, duplicates, invalid
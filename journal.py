@@ -0,0 +1,206 @@
+"""
+Group-commit writes and crash recovery for Budget Tracker ledgers
+
+GroupCommitWriter buffers appended records and hands them to the storage
+backend in batches, so a burst of saves or a bulk import costs one write and
+one fsync per batch instead of an open/write/close per row. How long records
+may sit in the buffer is the durability setting:
+
+- DURABILITY_ROW: every append is written and synced immediately
+- DURABILITY_INTERVAL: appends are coalesced and written once the oldest has
+  waited COMMIT_INTERVAL_MS (checked on the next append or flush_due())
+- DURABILITY_EXIT: appends are written on flush()/close(), or when the
+  buffer is full
+
+The writer starts no threads; GUIs call flush_due() from a Tk timer and
+call it again after the delay it returns while records are still buffered.
+
+recover_csv() truncates a torn final record left by a crash in the middle of
+a write, so the next parse never sees half a row; a final record that parses
+whole is kept and only gets its newline, and legacy ledgers (without the
+format marker) are left to the migrator untouched. It reads only the tail of
+the file: the quote parity at the start of the tail is the one that splits
+the tail into valid ledger rows, and only a tail that fits both parities (or
+neither, as in a legacy ledger) is resolved by counting quotes from the
+start of the file.
+"""
+
+import csv, math, os, re, time
+
+from ledger_format import FORMAT_VERSION, parse_change, parse_marker, parse_record
+
+DURABILITY_ROW = "row"
+DURABILITY_INTERVAL = "interval"
+DURABILITY_EXIT = "exit"
+
+COMMIT_INTERVAL_MS = 200  # Longest wait of a buffered record in interval mode
+MAX_PENDING_ROWS = 10000  # Buffered records that force a write in any mode
+RECOVERY_TAIL_BYTES = 1 << 16  # Bytes scanned for the last record boundary
+QUOTE_OR_NEWLINE = re.compile(rb'["\n]')
+
+
+class GroupCommitWriter:
+    def __init__(
+        self,
+        write_batch,
+        durability=DURABILITY_INTERVAL,
+        interval_ms=COMMIT_INTERVAL_MS,
+        max_pending=MAX_PENDING_ROWS,
+    ):
+        self.write_batch = write_batch  # Writes and syncs a list of records
+        self.durability = durability
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        self.pending = []
+        self.first_pending_at = None
+
+    # Buffer a record, writing the batch if the durability setting asks for it
+    def append(self, record):
+        self.pending.append(record)
+        if self.first_pending_at is None:
+            self.first_pending_at = time.monotonic()
+        if self.durability == DURABILITY_ROW or len(self.pending) >= self.max_pending:
+            self.flush()
+        else:
+            self.flush_due()
+
+    # Write the buffer if its oldest record has waited a full interval;
+    # returns the milliseconds until records still buffered are due, or None
+    # when no timer is needed
+    def flush_due(self):
+        if not self.pending or self.durability != DURABILITY_INTERVAL:
+            return None
+        remaining = self.first_pending_at + self.interval - time.monotonic()
+        if remaining > 0:
+            return max(1, math.ceil(remaining * 1000))
+        self.flush()
+        return None
+
+    # Write every buffered record as one batch; if the write fails the
+    # records stay buffered for the next flush
+    def flush(self):
+        if not self.pending:
+            return
+        self.write_batch(self.pending)
+        self.pending = []
+        self.first_pending_at = None
+
+
+#################### CSV ####################
+# Append data to a file with a single write followed by fsync; if the write
+# fails the file is truncated back, so a retry does not follow half a record
+def append_synced(path, data):
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        start = os.lseek(fd, 0, os.SEEK_END)
+        view = memoryview(data)
+        try:
+            while view:
+                view = view[os.write(fd, view) :]
+            os.fsync(fd)
+        except OSError:
+            os.ftruncate(fd, start)
+            raise
+    finally:
+        os.close(fd)
+
+
+# Get the offsets just past every newline of data that ends a record, given
+# the number of quotes before data. A newline ends a record only outside
+# quotes, i.e. after an even number of '"'.
+def record_ends(data, quotes=0):
+    ends = []
+    for match in QUOTE_OR_NEWLINE.finditer(data):
+        if match.group() == b'"':
+            quotes += 1
+        elif quotes % 2 == 0:
+            ends.append(match.end())
+    return ends
+
+
+# Whether data is exactly one canonical ledger row or change row
+def is_ledger_row(data):
+    try:
+        rows = list(csv.reader([data.decode("utf-8")], strict=True))
+        if len(rows) != 1:
+            return False
+        if not rows[0][0].startswith("#"):
+            parse_record(rows[0])
+        elif parse_change(rows[0]) is None:
+            return False
+    except (csv.Error, IndexError, KeyError, UnicodeDecodeError, ValueError):
+        return False
+    return True
+
+
+# Whether every complete record of a tail (between the first and the last
+# of ends) is one canonical ledger row or change row
+def valid_records(tail, ends):
+    if len(ends) < 2:
+        return False
+    return all(is_ledger_row(tail[start:end]) for start, end in zip(ends, ends[1:]))
+
+
+# Get the offset just past the last complete CSV record of a file, reading
+# only its tail unless the quote parity there is ambiguous
+def last_record_end(file, size):
+    tail_start = max(0, size - RECOVERY_TAIL_BYTES)
+    if tail_start == 0:
+        return scan_record_end(file, size)
+    file.seek(tail_start)
+    tail = file.read(size - tail_start)
+    candidates = [
+        ends
+        for ends in (record_ends(tail, 0), record_ends(tail, 1))
+        if valid_records(tail, ends)
+    ]
+    if len(candidates) == 1:
+        return tail_start + candidates[0][-1]
+    return scan_record_end(file, size)
+
+
+# Find the last record end by counting quotes from the start of the file,
+# widening the tail until it holds a record boundary
+def scan_record_end(file, size):
+    tail_start = max(0, size - RECOVERY_TAIL_BYTES)
+    while True:
+        # Quote parity of everything before the tail, counted in C
+        file.seek(0)
+        quotes = 0
+        remaining = tail_start
+        while remaining:
+            chunk = file.read(min(RECOVERY_TAIL_BYTES, remaining))
+            quotes += chunk.count(b'"')
+            remaining -= len(chunk)
+
+        ends = record_ends(file.read(size - tail_start), quotes)
+        if ends or tail_start == 0:
+            return tail_start + ends[-1] if ends else 0
+        tail_start = max(0, tail_start - RECOVERY_TAIL_BYTES)
+
+
+# Truncate a torn final record of a canonical ledger; a final record that
+# parses whole only gets its missing newline. Returns the number of bytes
+# removed.
+def recover_csv(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r+b") as file:
+        # Legacy ledgers are migrated as they are, never cut
+        if parse_marker(file.readline().decode("utf-8", "replace")) != FORMAT_VERSION:
+            return 0
+        size = os.fstat(file.fileno()).st_size
+        end = last_record_end(file, size)
+        if end == size:
+            return 0
+        file.seek(end)
+        if is_ledger_row(file.read(size - end)):
+            file.seek(size)
+            file.write(b"\n")
+            removed = 0
+        else:
+            file.truncate(end)
+            removed = size - end
+        file.flush()
+        os.fsync(file.fileno())
+    return removed
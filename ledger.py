@@ -0,0 +1,381 @@
+"""
+Headless Budget Tracker core and command-line interface
+
+Everything here works on ledger files through the storage backends and
+never imports tkinter, so it runs on a server without a display. Reports
+over several ledgers run in a process pool, one ledger per task; a report
+over a single large ledger parses it with --jobs processes instead (see
+parallel_parse.py).
+
+Usage:
+  python ledger.py summary LEDGER [LEDGER ...] [--jobs N] [--json]
+  python ledger.py monthly LEDGER [LEDGER ...] [--jobs N] [--json]
+  python ledger.py yearly LEDGER [LEDGER ...] [--jobs N] [--json]
+  python ledger.py categories LEDGER [LEDGER ...] [--language en] [--json]
+  python ledger.py import LEDGER STATEMENT.csv [--date-format %d-%m-%Y]
+  python ledger.py export LEDGER OUTPUT.csv|OUTPUT.pdf [--start YYYY-MM-DD]
+      [--end YYYY-MM-DD] [--category ID] [--search TEXT] [--language en]
+  python ledger.py migrate LEDGER [--output OUTPUT.csv]
+  python ledger.py compact LEDGER
+
+LEDGER is a .csv file, a .db SQLite file or a partitioned ledger directory.
+Amounts are printed as plain decimals ("1234.56").
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import argparse, json, os, sys
+
+from categories import CATEGORIES_FILE, CategoryIndex, load_categories
+from date_index import DateIndex
+from export import export_csv, export_pdf, iter_records
+from importer import import_statement
+from journal import DURABILITY_EXIT
+from ledger_format import LEGACY_FORMAT, detect_format, migrate_ledger
+from note_search import NoteIndex
+from parallel_parse import set_parse_jobs
+from storage import CsvStorage, open_storage
+from transaction_store import TransactionStore, format_decimal, parse_date
+
+
+#################### Core ####################
+# Open a ledger for batch work, returning (storage, catalog). Appends are
+# written once, on close. Only a writable ledger is recovered (a torn tail
+# truncated, a legacy ledger migrated); reports read the files as they are,
+# so they never race a GUI appending to the same ledger, and refuse a legacy
+# one.
+def open_ledger(
+    path, categories_path=CATEGORIES_FILE, durability=DURABILITY_EXIT, writable=False
+):
+    catalog = load_categories(categories_path)
+    storage = open_storage(path, durability)
+    if writable:
+        storage.recover(catalog)
+    elif isinstance(storage, CsvStorage) and detect_format(path) == LEGACY_FORMAT:
+        raise ValueError(
+            f"{path} is a legacy ledger, migrate it first (python ledger.py migrate)"
+        )
+    return storage, catalog
+
+
+# Get total income, expense and balance of a ledger
+def summary(path, categories_path=CATEGORIES_FILE):
+    storage, _ = open_ledger(path, categories_path)
+    try:
+        income, expense, balance = storage.totals()
+    finally:
+        storage.close()
+    return {
+        "ledger": path,
+        "income": format_decimal(income),
+        "expense": format_decimal(expense),
+        "balance": format_decimal(balance),
+    }
+
+
+# Get income, expense and balance of every month of a ledger
+def monthly(path, categories_path=CATEGORIES_FILE):
+    storage, _ = open_ledger(path, categories_path)
+    try:
+        months = storage.month_totals()
+    finally:
+        storage.close()
+    return {
+        "ledger": path,
+        "months": [
+            {
+                "month": month,
+                "income": format_decimal(income),
+                "expense": format_decimal(expense),
+                "balance": format_decimal(income - expense),
+            }
+            for month, income, expense in months
+        ],
+    }
+
+
+# Get income, expense and balance of every year of a ledger; a partitioned
+# ledger answers from its manifest alone
+def yearly(path, categories_path=CATEGORIES_FILE):
+    storage, _ = open_ledger(path, categories_path)
+    try:
+        years = storage.year_totals()
+    finally:
+        storage.close()
+    return {
+        "ledger": path,
+        "years": [
+            {
+                "year": year,
+                "income": format_decimal(income),
+                "expense": format_decimal(expense),
+                "balance": format_decimal(income - expense),
+            }
+            for year, income, expense in years
+        ],
+    }
+
+
+# Get income and expense of every category of a ledger, labelled in language
+def category_breakdown(path, categories_path=CATEGORIES_FILE, language="en"):
+    storage, catalog = open_ledger(path, categories_path)
+    try:
+        aggregates = storage.load()[1] if storage.exists() else None
+    finally:
+        storage.close()
+    buckets = aggregates.by_category.items() if aggregates is not None else ()
+    return {
+        "ledger": path,
+        "categories": [
+            {
+                "category": category,
+                "label": catalog.label(category, language),
+                "income": format_decimal(income),
+                "expense": format_decimal(expense),
+                "count": count,
+            }
+            for category, (income, expense, count) in sorted(buckets)
+        ],
+    }
+
+
+# Get the store positions matching a date range, category ID and note text,
+# in date order; None selects every row in ledger order
+def select_rows(store, start=None, end=None, category=None, query=None):
+    rows = None
+    dated = start is not None or end is not None
+    if dated:
+        start = start if start is not None else min(store.dates, default=0)
+        end = end if end is not None else max(store.dates, default=0)
+        rows = DateIndex(store).rows(start, end)
+    if category is not None:
+        posting = CategoryIndex(store).rows(category)
+        if rows is None:
+            rows = posting
+        else:
+            posting = set(posting)
+            rows = [index for index in rows if index in posting]
+    if query:
+        hits = NoteIndex(store).search(query)
+        if rows is None:
+            rows = hits
+        else:
+            hits = set(hits)
+            rows = [index for index in rows if index in hits]
+    # Postings and search hits are in ledger order; a stable sort keeps it
+    # among rows of the same day
+    if rows is not None and not dated:
+        rows = sorted(rows, key=store.dates.__getitem__)
+    return rows
+
+
+# Import a bank statement into a ledger in one transaction; returns
+# (imported, duplicates, invalid)
+def import_file(path, statement_path, categories_path=CATEGORIES_FILE, **options):
+    storage, catalog = open_ledger(path, categories_path, writable=True)
+    try:
+        existing = storage.load()[0] if storage.exists() else None
+        imported, duplicates, invalid = import_statement(
+            statement_path, catalog, existing, **options
+        )
+        storage.import_records(imported)
+    finally:
+        storage.close()
+    return len(imported), duplicates, invalid
+
+
+# Export the selected rows of a ledger as CSV, or PDF if output ends in .pdf;
+# returns the number of rows written
+def export_file(
+    path,
+    output_path,
+    categories_path=CATEGORIES_FILE,
+    language="en",
+    **selection,
+):
+    storage, catalog = open_ledger(path, categories_path)
+    try:
+        # A date range reads only the rows (or partitions) it covers
+        start, end = selection.get("start"), selection.get("end")
+        if start is None and end is None:
+            store = storage.load()[0]
+        else:
+            store = TransactionStore()
+            store.extend(
+                storage.transactions_between(
+                    start if start is not None else date.min.toordinal(),
+                    end if end is not None else date.max.toordinal(),
+                )
+            )
+    finally:
+        storage.close()
+    rows = select_rows(store, **selection)
+    total = len(store) - store.deleted_count if rows is None else len(rows)
+    arguments = (
+        output_path,
+        iter_records(store, rows),
+        total,
+        lambda category: catalog.label(category, language),
+    )
+    if output_path.lower().endswith(".pdf"):
+        headings = ("Date", "Category", "Type", "Amount", "Note")
+        export_pdf(*arguments, headings, lambda progress: None, lambda: False)
+    else:
+        export_csv(*arguments, lambda progress: None, lambda: False)
+    return total
+
+
+# Convert a legacy CSV ledger to the canonical format, in place unless
+# output_path is given; returns (migrated, skipped)
+def migrate_file(path, output_path=None, categories_path=CATEGORIES_FILE):
+    return migrate_ledger(path, load_categories(categories_path), output_path)
+
+
+# Drop the rows edits and deletes left behind in a ledger; returns the number
+# of rows dropped
+def compact_file(path, categories_path=CATEGORIES_FILE):
+    storage, _ = open_ledger(path, categories_path, writable=True)
+    try:
+        compactor = storage.compactor()
+        if compactor is None:
+            return 0
+        compactor.run()
+        return compactor.finish()
+    finally:
+        storage.close()
+
+
+#################### CLI ####################
+# Run a report over every ledger, in parallel when more than one job is allowed.
+# Ledgers run one at a time get the jobs for parsing; pooled ones parse alone.
+def run_reports(report, paths, jobs, *options):
+    if jobs == 1 or len(paths) == 1:
+        set_parse_jobs(jobs)
+        return [report(path, *options) for path in paths]
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=set_parse_jobs, initargs=(1,)
+    ) as pool:
+        return list(
+            pool.map(report, paths, *([option] * len(paths) for option in options))
+        )
+
+
+# Print report results as JSON lines or as aligned text
+def print_reports(results, as_json):
+    for result in results:
+        if as_json:
+            print(json.dumps(result, ensure_ascii=False))
+            continue
+        print(result["ledger"])
+        if "months" in result or "years" in result:
+            for period in result.get("months", result.get("years")):
+                print(
+                    f"  {period.get('month', period.get('year')):<7}"
+                    f"  {period['income']:>14}  {period['expense']:>14}"
+                    f"  {period['balance']:>14}"
+                )
+        elif "categories" in result:
+            for category in result["categories"]:
+                print(
+                    f"  {category['label']:<40}  {category['income']:>14}"
+                    f"  {category['expense']:>14}  {category['count']:>8}"
+                )
+        else:
+            print(
+                f"  income {result['income']}  expense {result['expense']}"
+                f"  balance {result['balance']}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("summary", "monthly", "yearly", "categories"):
+        report = commands.add_parser(name)
+        report.add_argument("ledgers", nargs="+")
+        report.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+        report.add_argument("--json", action="store_true")
+        report.add_argument("--categories", default=CATEGORIES_FILE)
+        if name == "categories":
+            report.add_argument("--language", default="en", choices=("th", "en"))
+
+    import_command = commands.add_parser("import")
+    import_command.add_argument("ledger")
+    import_command.add_argument("statement")
+    import_command.add_argument("--categories", default=CATEGORIES_FILE)
+    import_command.add_argument("--date-format", choices=("%d-%m-%Y", "%Y-%m-%d"))
+
+    export_command = commands.add_parser("export")
+    export_command.add_argument("ledger")
+    export_command.add_argument("output")
+    export_command.add_argument("--categories", default=CATEGORIES_FILE)
+    export_command.add_argument("--language", default="en", choices=("th", "en"))
+    export_command.add_argument("--start", type=parse_date)
+    export_command.add_argument("--end", type=parse_date)
+    export_command.add_argument("--category")
+    export_command.add_argument("--search")
+
+    migrate_command = commands.add_parser("migrate")
+    migrate_command.add_argument("ledger")
+    migrate_command.add_argument("--output")
+    migrate_command.add_argument("--categories", default=CATEGORIES_FILE)
+
+    compact_command = commands.add_parser("compact")
+    compact_command.add_argument("ledger")
+    compact_command.add_argument("--categories", default=CATEGORIES_FILE)
+
+    args = parser.parse_args(argv)
+    # A legacy, missing or unreadable ledger is reported without a traceback
+    try:
+        return run_command(args)
+    except (OSError, ValueError) as error:
+        return str(error)
+
+
+# Run the command parsed from the command line
+def run_command(args):
+    if args.command == "summary":
+        results = run_reports(summary, args.ledgers, args.jobs, args.categories)
+        print_reports(results, args.json)
+    elif args.command == "monthly":
+        results = run_reports(monthly, args.ledgers, args.jobs, args.categories)
+        print_reports(results, args.json)
+    elif args.command == "yearly":
+        results = run_reports(yearly, args.ledgers, args.jobs, args.categories)
+        print_reports(results, args.json)
+    elif args.command == "categories":
+        results = run_reports(
+            category_breakdown, args.ledgers, args.jobs, args.categories, args.language
+        )
+        print_reports(results, args.json)
+    elif args.command == "import":
+        imported, duplicates, invalid = import_file(
+            args.ledger,
+            args.statement,
+            args.categories,
+            date_format=args.date_format,
+        )
+        print(f"Imported {imported}, duplicates {duplicates}, invalid {invalid}")
+    elif args.command == "export":
+        written = export_file(
+            args.ledger,
+            args.output,
+            args.categories,
+            args.language,
+            start=args.start,
+            end=args.end,
+            category=args.category,
+            query=args.search,
+        )
+        print(f"Exported {written} transactions to {args.output}")
+    elif args.command == "migrate":
+        migrated, skipped = migrate_file(args.ledger, args.output, args.categories)
+        print(f"Migrated {migrated} transactions, skipped {skipped} invalid rows")
+    elif args.command == "compact":
+        dropped = compact_file(args.ledger, args.categories)
+        print(f"Dropped {dropped} rows")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""
+Canonical on-disk format of CSV ledgers, and a migrator for legacy files
+
+Format 2, written by every backend since it was introduced:
+
+    #budget-ledger:2
+    date,category,type,amount,note
+    2024-05-01,food,expense,12550,ข้าวมันไก่
+
+- date: ISO 8601 (YYYY-MM-DD), so rows sort and range-scan as plain text
+- category: stable category ID (see categories.py)
+- type: income or expense
+- amount: integer minor units (satang), without separators
+- note: free text
+
+Every row gets a stable transaction ID: its position among the rows of the
+file, counting from 0. Edits and deletes never rewrite a row in place; they
+are appended as change rows that readers apply on load:
+
+    #update,<id>,2024-05-02,food,expense,13000,ข้าวมันไก่
+    #delete,<id>
+    #skip,<n>
+
+Compaction (see compaction.py) writes the surviving rows with the changes
+applied, and a #skip row for every run of deleted ones, so IDs hold across
+compactions. Readers of older versions skip change rows as malformed.
+
+Legacy ledgers (format 1) hold two schemas, often mixed in one file because
+both GUIs appended to the same transactions.csv:
+
+- budget_tracker.py: header Date,Category,Type,Amount,Note, DD-MM-YYYY
+  dates, localized category labels and decimal amounts
+- preview.py: headerless date,category,note,amount rows with YYYY-MM-DD
+  dates and decimal amounts; the category is one of the preview's own four
+  Thai labels (see LEGACY_PREVIEW_CATEGORIES), where "รายรับ" marks income
+
+migrate_ledger() converts a legacy file in one streaming pass, so memory
+stays flat at any size. Labels are mapped to category IDs through the
+category catalog it is given (see categories.py).
+"""
+
+from datetime import date
+from functools import lru_cache
+from itertools import islice
+import csv, io, os, shutil
+
+from transaction_store import (
+    EXPENSE,
+    INCOME,
+    TRANSACTION_TYPES,
+    parse_amount,
+    parse_date,
+    parse_type,
+)
+
+FORMAT_VERSION = 2
+LEGACY_FORMAT = 1
+FORMAT_MARKER = "#budget-ledger:"
+LEDGER_FIELDNAMES = ("date", "category", "type", "amount", "note")
+LEDGER_HEADER = (
+    f"{FORMAT_MARKER}{FORMAT_VERSION}\r\n" + ",".join(LEDGER_FIELDNAMES) + "\r\n"
+)
+LEGACY_FIELDNAMES = ["Date", "Category", "Type", "Amount", "Note"]
+# Category labels of preview.py rows -> (type code, category ID); any other
+# label is an expense
+LEGACY_PREVIEW_CATEGORIES = {
+    "อาหาร": (EXPENSE, "dining_out_restaurants"),
+    "การเดินทาง": (EXPENSE, "public_transportation_fare"),
+    "รายรับ": (INCOME, "miscellaneous_income"),
+    "อื่นๆ": (EXPENSE, "miscellaneous_expenses"),
+}
+LEGACY_SUFFIX = ".legacy"  # Migrated ledgers keep their original here
+MIGRATE_BATCH_ROWS = 50000  # Rows converted per write while migrating
+TYPE_CODES = {name: code for code, name in enumerate(TRANSACTION_TYPES)}
+
+# Change rows, see the module docstring
+CHANGE_UPDATE = "#update"
+CHANGE_DELETE = "#delete"
+CHANGE_SKIP = "#skip"
+# Ledger rows a change leaves behind for compaction to drop: an update leaves
+# its change row, a delete the deleted row and its tombstone
+CHANGE_GARBAGE = {CHANGE_UPDATE: 1, CHANGE_DELETE: 2}
+
+
+#################### Detection ####################
+# Get the format of a ledger from its first line: FORMAT_VERSION, LEGACY_FORMAT,
+# or None if the file is missing or empty
+def detect_format(path):
+    try:
+        with open(path, "rb") as file:
+            first_line = file.readline()
+    except FileNotFoundError:
+        return None
+    return parse_marker(first_line.decode("utf-8", "replace"))
+
+
+# Get the format a first line announces; raises ValueError for a format
+# newer than this version understands
+def parse_marker(line):
+    if not line:
+        return None
+    if not line.startswith(FORMAT_MARKER):
+        return LEGACY_FORMAT
+    try:
+        version = int(line[len(FORMAT_MARKER) :].strip())
+    except ValueError:
+        raise ValueError(f"Invalid ledger format line: {line.strip()!r}")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Ledger format {version} is newer than this version")
+    return version
+
+
+# Read the marker and header lines of a text ledger, leaving the file at the
+# first row; returns False for an empty file
+def read_header(text):
+    version = parse_marker(text.readline())
+    if version is None:
+        return False
+    if version != FORMAT_VERSION:
+        raise ValueError("Legacy ledger, migrate it first (python ledger.py migrate)")
+    text.readline()
+    return True
+
+
+#################### Rows ####################
+# Parse an ISO date into a day ordinal; ledgers repeat the same few thousand
+# days, so results are cached
+@lru_cache(maxsize=None)
+def parse_iso_date(text):
+    return date.fromisoformat(text).toordinal()
+
+
+# Format a day ordinal as an ISO date
+@lru_cache(maxsize=None)
+def format_iso_date(ordinal):
+    return date.fromordinal(ordinal).isoformat()
+
+
+# Parse a legacy DD-MM-YYYY or YYYY-MM-DD date, cached like parse_iso_date
+@lru_cache(maxsize=None)
+def parse_legacy_date(text):
+    return parse_date(text)
+
+
+# Whether a buffered write item is a change, (marker, transaction ID, new
+# record or None, old record), rather than a record to append
+def is_change(item):
+    return isinstance(item[0], str)
+
+
+# Get the CSV fields of a (date ordinal, category, type, amount, note) record,
+# or of a change item; change IDs are written relative to id_base
+def encode_record(record, id_base=0):
+    if is_change(record):
+        marker, transaction_id, new_record, _ = record
+        if new_record is None:
+            return marker, transaction_id - id_base
+        return (marker, transaction_id - id_base, *encode_record(new_record))
+    date_ordinal, category, transaction_type, amount, note = record
+    return (
+        format_iso_date(date_ordinal),
+        category,
+        TRANSACTION_TYPES[transaction_type],
+        amount,
+        note,
+    )
+
+
+# Encode records and change items as canonical CSV rows, optionally preceded
+# by the header
+def encode_records(records, header=False, id_base=0):
+    buffer = io.StringIO(newline="")
+    if header:
+        buffer.write(LEDGER_HEADER)
+    csv.writer(buffer).writerows(encode_record(record, id_base) for record in records)
+    return buffer.getvalue().encode("utf-8")
+
+
+# Get the record of a canonical CSV row; raises KeyError or ValueError for a
+# malformed row (change rows included)
+def parse_record(row):
+    date_text, category, type_name, amount, note = row
+    return (
+        parse_iso_date(date_text),
+        category,
+        TYPE_CODES[type_name],
+        int(amount),
+        note,
+    )
+
+
+# Yield the records of canonical CSV rows, skipping malformed and change rows
+def parse_rows(rows):
+    for row in rows:
+        try:
+            yield parse_record(row)
+        except (KeyError, ValueError):
+            continue
+
+
+# Get a change row as (marker, file ID, record or None, skipped IDs), or
+# None for a malformed row
+def parse_change(row):
+    try:
+        if row[0] == CHANGE_SKIP and len(row) == 2:
+            return CHANGE_SKIP, None, None, int(row[1])
+        if row[0] == CHANGE_DELETE and len(row) == 2:
+            return CHANGE_DELETE, int(row[1]), None, 0
+        if row[0] == CHANGE_UPDATE and len(row) == 7:
+            return CHANGE_UPDATE, int(row[1]), parse_record(row[2:]), 0
+    except (KeyError, ValueError):
+        pass
+    return None
+
+
+# Append the records of canonical CSV rows to store, skipping malformed ones.
+# Rows take their IDs from store.next_id; changes are collected in
+# store.changes as (transaction ID, record or None for a delete), with the
+# IDs in the file offset by id_base, for merge_chunk() to apply.
+def parse_into(store, rows, id_base=0):
+    append = store.append
+    for row in rows:
+        try:
+            date_text, category, type_name, amount, note = row
+            append(
+                parse_iso_date(date_text),
+                category,
+                TYPE_CODES[type_name],
+                int(amount),
+                note,
+            )
+        except (KeyError, ValueError):
+            if row and row[0].startswith("#"):
+                change = parse_change(row)
+                if change is None:
+                    continue
+                marker, transaction_id, record, skipped = change
+                if marker == CHANGE_SKIP:
+                    store.next_id += skipped
+                else:
+                    store.changes.append((id_base + transaction_id, record))
+
+
+# Get the next free transaction ID of a canonical ledger, counting its rows
+# in one streaming pass
+def count_ledger_ids(path):
+    count = 0
+    try:
+        text = open(path, encoding="utf-8", newline="")
+    except FileNotFoundError:
+        return 0
+    with text:
+        if not read_header(text):
+            return 0
+        for row in csv.reader(text):
+            try:
+                parse_record(row)
+                count += 1
+            except (KeyError, ValueError):
+                change = parse_change(row) if row else None
+                if change is not None:
+                    count += change[3]
+    return count
+
+
+# Get the record of a legacy row of either schema, with category labels
+# mapped to IDs through catalog, or None for a header row; raises ValueError
+# for rows that fit neither
+def parse_legacy_row(row, catalog):
+    if len(row) == 5:
+        if row == LEGACY_FIELDNAMES:
+            return None
+        transaction_type = parse_type(row[2])
+        category = catalog.category_id(transaction_type, row[1].strip())
+        return (
+            parse_legacy_date(row[0]),
+            category,
+            transaction_type,
+            parse_amount(row[3]),
+            row[4],
+        )
+    if len(row) == 4:
+        label = row[1].strip()
+        transaction_type, category = LEGACY_PREVIEW_CATEGORIES.get(
+            label, (EXPENSE, None)
+        )
+        if category is None:
+            category = catalog.category_id(EXPENSE, label)
+        return (
+            parse_legacy_date(row[0]),
+            category,
+            transaction_type,
+            parse_amount(row[3]),
+            row[2],
+        )
+    raise ValueError(f"Unexpected row of {len(row)} columns")
+
+
+#################### Migration ####################
+# Keep a copy of a legacy ledger at path + LEGACY_SUFFIX, as a hard link
+# where the file system allows one
+def keep_legacy(path):
+    legacy_path = path + LEGACY_SUFFIX
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+    try:
+        os.link(path, legacy_path)
+    except OSError:
+        shutil.copy2(path, legacy_path)
+
+
+# Convert a legacy ledger to the canonical format in one streaming pass,
+# mapping category labels through catalog; returns (migrated, skipped).
+# Without a target the file is migrated in place and the original kept as
+# path + LEGACY_SUFFIX; the original stays at path until the migrated file
+# replaces it, so a crash never leaves the ledger missing.
+def migrate_ledger(path, catalog, target=None, progress=None):
+    size = max(os.path.getsize(path), 1)
+    temp_path = (target or path) + ".tmp"
+    migrated = skipped = 0
+    try:
+        with open(path, encoding="utf-8", newline="") as source, open(
+            temp_path, "wb"
+        ) as output:
+            if parse_marker(source.readline()) != LEGACY_FORMAT:
+                raise ValueError(f"{path} is not a legacy ledger")
+            source.seek(0)
+            rows = csv.reader(source)
+            output.write(LEDGER_HEADER.encode("utf-8"))
+            while True:
+                batch = list(islice(rows, MIGRATE_BATCH_ROWS))
+                if not batch:
+                    break
+                records = []
+                for row in batch:
+                    try:
+                        record = parse_legacy_row(row, catalog)
+                    except ValueError:
+                        skipped += 1
+                        continue
+                    if record is not None:
+                        records.append(record)
+                output.write(encode_records(records))
+                migrated += len(records)
+                if progress is not None:
+                    progress(source.buffer.tell() / size)
+            output.flush()
+            os.fsync(output.fileno())
+        if target is None:
+            keep_legacy(path)
+            target = path
+        os.replace(temp_path, target)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return migrated, skipped
@@ -0,0 +1,290 @@
+"""
+Memory-mapped reader for CSV ledgers with a persisted row-offset index
+
+MappedLedger maps a canonical CSV ledger (see ledger_format.py) read-only
+and keeps the byte offset of every row in an array, saved next to the CSV
+(transactions.csv.rowindex). Fields are decoded lazily, only for the columns
+asked for, straight from the mapped bytes:
+
+- row(n) / field(n, column): random access to one row
+- scan(columns): a projected scan yielding just those columns, so totals
+  read ("type", "amount") and never decode a category or a note
+
+The index is keyed like the snapshot cache: by the size and mtime of the CSV
+and a CRC-32 of the prefix it covers, so after an append only the new rows
+are indexed. Only the bytes present when the ledger was mapped are visible;
+open it again to see later appends.
+
+Rows are file rows: change rows (edits and deletes, see ledger_format.py)
+are skipped by scans, not applied. The index counts them, and a ledger with
+any (changes > 0) has to be loaded instead.
+"""
+
+from array import array
+from functools import lru_cache
+import csv, json, mmap, os, re, sys, zlib
+
+from ledger_format import (
+    FORMAT_VERSION,
+    LEDGER_FIELDNAMES,
+    parse_iso_date,
+    parse_marker,
+)
+from transaction_store import EXPENSE, INCOME
+
+ROW_INDEX_SUFFIX = ".rowindex"
+ROW_INDEX_MAGIC = b"BTROWIX2"  # 2: counts change rows
+
+# One record: unquoted runs and quoted strings (which may hold newlines)
+# up to the newline that ends it
+RECORD = re.compile(rb'[^"\n]*(?:"[^"]*"[^"\n]*)*\n')
+# The unquoted date, category, type and amount fields at the start of a row
+LEADING_FIELDS = re.compile(rb'([^,"\r\n]*),([^,"\r\n]*),([^,"\r\n]*),([^,"\r\n]*),')
+COLUMN_INDEX = {name: index for index, name in enumerate(LEDGER_FIELDNAMES)}
+COLUMN_INDEX["month"] = COLUMN_INDEX["date"]
+TYPE_BYTES = {b"income": INCOME, b"expense": EXPENSE}
+
+
+# Get the row index path of a CSV file
+def row_index_path(csv_path):
+    return csv_path + ROW_INDEX_SUFFIX
+
+
+#################### Fields ####################
+# Parse an ISO date field into a day ordinal
+@lru_cache(maxsize=None)
+def parse_date_field(data):
+    return parse_iso_date(data.decode("ascii"))
+
+
+# Get the "YYYY-MM" month of an ISO date field
+@lru_cache(maxsize=None)
+def parse_month_field(data):
+    return data[:7].decode("ascii")
+
+
+def decode_field(data):
+    return data.decode("utf-8")
+
+
+# Converters from raw field bytes to the values TransactionStore holds;
+# "month" is the "YYYY-MM" key of the date, as used by the aggregates
+FIELD_CONVERTERS = {
+    "date": parse_date_field,
+    "month": parse_month_field,
+    "category": decode_field,
+    "type": TYPE_BYTES.__getitem__,
+    "amount": int,
+    "note": decode_field,
+}
+
+
+# Get the bytes of the last field of a row, without its line end and quotes
+def unquote_field(data):
+    data = data.rstrip(b"\r\n")
+    if data.startswith(b'"'):
+        data = data[1:-1].replace(b'""', b'"')
+    return data
+
+
+#################### Index ####################
+# Append the end offset of every complete record between start and end of
+# data to offsets; returns the offset after the last one
+def index_records(data, start, end, offsets):
+    position = start
+    for match in RECORD.finditer(data, start, end):
+        if match.start() != position:
+            break  # An unbalanced quote; the rest is not complete records
+        position = match.end()
+        offsets.append(position)
+    return position
+
+
+# Count the change rows starting between start (after the header, so never
+# 0) and end of data; a note line starting with "#" is counted too, which
+# only costs a load
+def count_changes(data, start, end):
+    changes = 0
+    position = data.find(b"\n#", start - 1, end)
+    while position >= 0:
+        changes += 1
+        position = data.find(b"\n#", position + 2, end)
+    return changes
+
+
+# Read a saved row index, returning (header, offsets) or None if unusable
+def read_row_index(path):
+    try:
+        with open(path, "rb") as file:
+            if file.read(len(ROW_INDEX_MAGIC)) != ROW_INDEX_MAGIC:
+                return None
+            header_length = int.from_bytes(file.read(8), "little")
+            header = json.loads(file.read(header_length).decode("utf-8"))
+            if header["byteorder"] != sys.byteorder:
+                return None
+            offsets = array("Q")
+            offsets.frombytes(file.read())
+    except (OSError, ValueError, KeyError):
+        return None
+    if len(offsets) != header["rows"] + 1:
+        return None
+    return header, offsets
+
+
+# Write a row index covering the bytes up to offsets[-1] of the CSV
+def write_row_index(path, offsets, size, mtime, checksum, changes):
+    header = {
+        "size": size,
+        "mtime": mtime,
+        "end": offsets[-1],
+        "checksum": checksum,
+        "byteorder": sys.byteorder,
+        "rows": len(offsets) - 1,
+        "changes": changes,
+    }
+    encoded_header = json.dumps(header).encode("utf-8")
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(ROW_INDEX_MAGIC)
+        file.write(len(encoded_header).to_bytes(8, "little"))
+        file.write(encoded_header)
+        offsets.tofile(file)
+    os.replace(temp_path, path)
+
+
+class MappedLedger:
+    #################### Initiation ####################
+    # Map a CSV ledger and load, extend or build its row index
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.file = open(csv_path, "rb")
+        stat = os.fstat(self.file.fileno())
+        self.size = stat.st_size
+        self.map = None
+        self.offsets = array("Q", [0])
+        self.changes = 0  # Change rows in the ledger
+        if self.size:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.load_index(stat.st_mtime)
+
+    # Start from the saved index when it covers a prefix of this file, and
+    # index only the rows after it
+    def load_index(self, mtime):
+        path = row_index_path(self.csv_path)
+        saved = read_row_index(path)
+        start = None
+        if saved is not None:
+            header, offsets = saved
+            if header["size"] == self.size and header["mtime"] == mtime:
+                self.offsets = offsets
+                self.changes = header["changes"]
+                return
+            if header["end"] <= self.size and (
+                zlib.crc32(memoryview(self.map)[: header["end"]]) == header["checksum"]
+            ):
+                self.offsets = offsets
+                self.changes = header["changes"]
+                start = header["end"]
+        if start is None:
+            # The rows start after the format marker and header lines
+            first_line = self.map.readline().decode("utf-8", "replace")
+            if parse_marker(first_line) != FORMAT_VERSION:
+                raise ValueError(
+                    "Legacy ledger, migrate it first (python ledger.py migrate)"
+                )
+            self.map.readline()
+            start = self.map.tell()
+            self.offsets = array("Q", [start])
+
+        end = index_records(self.map, start, self.size, self.offsets)
+        self.changes += count_changes(self.map, start, end)
+        try:
+            write_row_index(
+                path,
+                self.offsets,
+                self.size,
+                mtime,
+                zlib.crc32(memoryview(self.map)[: self.offsets[-1]]),
+                self.changes,
+            )
+        except OSError:
+            pass  # The index is only a cache
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    #################### Access ####################
+    # Get the raw field bytes of row n; the note is only cut out when asked for
+    def raw_fields(self, n, note=True):
+        start = self.offsets[n]
+        end = self.offsets[n + 1]
+        match = LEADING_FIELDS.match(self.map, start, end)
+        if match is None:  # A quoted leading field, left to the csv module
+            row = next(csv.reader([self.map[start:end].decode("utf-8")]))
+            return [field.encode("utf-8") for field in row]
+        if not note:
+            return match.groups()
+        return (*match.groups(), unquote_field(self.map[match.end() : end]))
+
+    # Get one column of row n
+    def field(self, n, column):
+        return FIELD_CONVERTERS[column](
+            self.raw_fields(n, column == "note")[COLUMN_INDEX[column]]
+        )
+
+    # Get row n as (date ordinal, category, type, amount, note), the same
+    # values TransactionStore.append() takes
+    def row(self, n):
+        return tuple(
+            FIELD_CONVERTERS[column](field)
+            for column, field in zip(LEDGER_FIELDNAMES, self.raw_fields(n))
+        )
+
+    # Yield tuples of the given columns for rows start..stop, skipping
+    # malformed rows like parse_rows() does
+    def scan(self, columns, start=0, stop=None):
+        stop = len(self) if stop is None else stop
+        picks = [(COLUMN_INDEX[column], FIELD_CONVERTERS[column]) for column in columns]
+        note = "note" in columns
+        match = LEADING_FIELDS.match
+        offsets = self.offsets
+        for n, row_start, row_end in zip(
+            range(start, stop), offsets[start:stop], offsets[start + 1 : stop + 1]
+        ):
+            # Without the note the leading fields come straight from the match
+            found = None if note else match(self.map, row_start, row_end)
+            fields = self.raw_fields(n, note) if found is None else found.groups()
+            try:
+                yield tuple([convert(fields[index]) for index, convert in picks])
+            except (IndexError, KeyError, ValueError):
+                continue
+
+    #################### Totals ####################
+    # Get (income, expense, balance) in minor units
+    def totals(self):
+        sums = [0, 0]
+        for transaction_type, amount in self.scan(("type", "amount")):
+            sums[transaction_type] += amount
+        return sums[INCOME], sums[EXPENSE], sums[INCOME] - sums[EXPENSE]
+
+    # Get [(month, income, expense), ...] sorted by month
+    def month_totals(self):
+        months = {}
+        for month, transaction_type, amount in self.scan(("month", "type", "amount")):
+            bucket = months.get(month)
+            if bucket is None:
+                bucket = months[month] = [0, 0]
+            bucket[transaction_type] += amount
+        return [(month, *bucket) for month, bucket in sorted(months.items())]
@@ -0,0 +1,97 @@
+"""
+Full-text search over transaction notes
+
+Notes are indexed by character n-grams instead of words, since Thai is
+written without spaces between words. Every substring of one to NGRAM_SIZE
+characters of a casefolded note maps to a posting list of store positions:
+
+- a query of up to NGRAM_SIZE characters is answered by its own posting list,
+  so the first keystrokes of a search are one lookup
+- a longer query takes the shortest posting list of its n-grams as
+  candidates and confirms each one with a substring check, so only a few
+  notes are read per keystroke
+
+Building the index reads every note, so the GUI builds it on a worker
+thread; size is the number of store rows it covered.
+"""
+
+from array import array
+from bisect import bisect_left, insort
+
+NGRAM_SIZE = 3
+
+
+# Get the distinct substrings of one to NGRAM_SIZE characters of casefolded
+# text
+def note_grams(text):
+    return {
+        text[i : i + size]
+        for size in range(1, NGRAM_SIZE + 1)
+        for i in range(len(text) - size + 1)
+    }
+
+
+class NoteIndex:
+    #################### Initiation ####################
+    def __init__(self, store):
+        self.store = store
+        self.postings = {}  # n-gram -> array of store positions, ascending
+        self.size = len(store)  # Rows appended later are add()ed by the caller
+        deleted = store.deleted
+        for index in range(self.size):
+            if not deleted[index]:
+                self.add(index)
+
+    # Add the note of the store row at index
+    def add(self, index):
+        for gram in note_grams(self.store.note(index).casefold()):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array("L")
+            posting.append(index)
+
+    # Move the store row at index from the postings of old_note to the ones
+    # of its current note
+    def update(self, index, old_note):
+        old_grams = note_grams(old_note.casefold())
+        new_grams = note_grams(self.store.note(index).casefold())
+        for gram in old_grams - new_grams:
+            posting = self.postings[gram]
+            del posting[bisect_left(posting, index)]
+            if not posting:
+                del self.postings[gram]
+        for gram in new_grams - old_grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array("L")
+            insort(posting, index)
+
+    #################### Queries ####################
+    # Get the store positions, ascending, of live notes containing query;
+    # postings keep deleted rows, which are skipped here
+    def search(self, query):
+        query = query.strip().casefold()
+        if not query:
+            return []
+        if len(query) <= NGRAM_SIZE:
+            # The posting list of a single n-gram is the exact answer
+            candidates = self.postings.get(query, ())
+            if not self.store.deleted_count:
+                return list(candidates)
+            deleted = self.store.deleted
+            return [index for index in candidates if not deleted[index]]
+        postings = [
+            self.postings.get(query[i : i + NGRAM_SIZE], ())
+            for i in range(len(query) - NGRAM_SIZE + 1)
+        ]
+        return self.verified(min(postings, key=len), query)
+
+    # Keep the candidates that are live and whose note contains query
+    def verified(self, candidates, query):
+        note = self.store.note
+        deleted = self.store.deleted
+        return [
+            index
+            for index in candidates
+            if not deleted[index] and query in note(index).casefold()
+        ]
@@ -0,0 +1,126 @@
+"""
+Parallel parsing of large CSV ledgers
+
+A ledger with more than PARALLEL_MIN_BYTES left to parse is cut into byte
+ranges of about RANGE_BYTES that start and end on record boundaries. Each
+range is parsed in a process pool into its own TransactionStore with partial
+aggregates (per type, month and category), and the loader merges the results
+in file order, just as it merges sequential chunks (see snapshot.py).
+
+The main process finds the boundaries and the CRC-32 for the snapshot in one
+pass over the raw bytes, handing each range to the pool as soon as it is
+found, so a full rebuild scales with the number of cores. At most two ranges
+per worker are in flight, which keeps memory flat on multi-GB archives.
+
+Workers are spawned rather than forked, because the GUIs load from a thread
+running next to Tk.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import csv, io, multiprocessing, os, zlib
+
+from aggregates import AggregateEngine
+from ledger_format import parse_into, read_header
+from transaction_store import TransactionStore
+
+PARALLEL_MIN_BYTES = 64 << 20  # Smaller ledgers parse faster in one process
+RANGE_BYTES = 16 << 20  # Bytes parsed per task
+SCAN_BLOCK = 1 << 20  # Bytes read at a time while finding boundaries
+PARSE_JOBS = os.cpu_count() or 1  # Worker processes, 1 parses sequentially
+
+
+# Set the number of worker processes used to parse a ledger
+def set_parse_jobs(jobs):
+    global PARSE_JOBS
+    PARSE_JOBS = max(1, jobs)
+
+
+# Whether the remaining bytes of a ledger are worth a process pool
+def use_parallel(remaining, jobs=None):
+    return (jobs or PARSE_JOBS) > 1 and remaining >= PARALLEL_MIN_BYTES
+
+
+#################### Worker ####################
+# Parse the bytes start..end of a CSV ledger into (store, aggregates); the
+# range at offset 0 also holds the format marker and header. Row IDs count
+# from 0 within the range (the loader rebases them), change IDs from id_base.
+def parse_range(path, start, end, id_base=0):
+    with open(path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    text = io.StringIO(data.decode("utf-8"), newline="")
+    del data
+    store = TransactionStore()
+    if start or read_header(text):
+        parse_into(store, csv.reader(text), id_base)
+    return store, AggregateEngine.from_store(store)
+
+
+#################### Boundaries ####################
+# Yield (start, end) ranges of about range_bytes covering the bytes start..end
+# of a binary file, each ending right after a record. A newline only ends a
+# record outside quotes, so the quote count is carried across the scan; start
+# must itself be a record boundary. Calls checksum_update with every block
+# read, in order.
+def record_ranges(file, start, end, range_bytes, checksum_update):
+    file.seek(start)
+    position = range_start = start
+    quotes = 0  # Quotes between range_start's record boundary and position
+    while position < end:
+        block = file.read(min(SCAN_BLOCK, end - position))
+        if not block:
+            break
+        checksum_update(block)
+        search = max(range_start + range_bytes - position, 0)
+        while search < len(block):
+            newline = block.find(b"\n", search)
+            if newline < 0:
+                break
+            if (quotes + block.count(b'"', 0, newline)) % 2:
+                search = newline + 1  # Inside a quoted note
+                continue
+            boundary = position + newline + 1
+            yield range_start, boundary
+            quotes = -block.count(b'"', 0, newline + 1)
+            range_start = boundary
+            search = max(range_start + range_bytes - position, newline + 1)
+        quotes += block.count(b'"')
+        position += len(block)
+    if range_start < position:
+        yield range_start, position
+
+
+#################### Load ####################
+# Yield (store, aggregates, end offset) for every range of the bytes
+# start..end of a CSV ledger, parsed by jobs processes, in file order.
+# checksum is the CRC-32 of the bytes before start; the generator returns
+# the CRC-32 of the bytes before end.
+def parallel_chunks(path, file, start, end, checksum, jobs=None, id_base=0):
+    jobs = jobs or PARSE_JOBS
+    crc = [checksum]
+
+    def update(block):
+        crc[0] = zlib.crc32(block, crc[0])
+
+    pending = deque()
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        for range_start, range_end in record_ranges(
+            file, start, end, RANGE_BYTES, update
+        ):
+            pending.append(
+                (
+                    pool.submit(parse_range, path, range_start, range_end, id_base),
+                    range_end,
+                )
+            )
+            if len(pending) >= jobs * 2:
+                future, range_end = pending.popleft()
+                yield (*future.result(), range_end)
+        while pending:
+            future, range_end = pending.popleft()
+            yield (*future.result(), range_end)
+    return crc[0]
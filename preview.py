@@ -8,10 +8,25 @@ from tkinter import Tk, Frame, Label, Button, Entry, StringVar, messagebox
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
-
-import csv, os
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
+import math, queue, threading, time
+
+from aggregates import month_key
+from categories import load_categories
+from journal import COMMIT_INTERVAL_MS, DURABILITY_INTERVAL
+from profiling import profiled
+from snapshot import load_chunks
+from stats_panel import StatsPanel
+from storage import open_storage
+from transaction_store import (
+    EXPENSE,
+    INCOME,
+    MINOR_UNITS,
+    TransactionStore,
+    format_amount,
+    parse_amount,
+    parse_date,
+)
+from ui_scheduler import UpdateScheduler
 
 # Constants for the application
 APP_TITLE = "Budget Tracker"
@@ -19,7 +34,63 @@ APP_WIDTH = 1000
 APP_HEIGHT = 600
 BG_COLOR = "#212121"
 FG_COLOR = "#faf9f6"
-CSV_FILE = "transactions.csv"
+LEDGER_FILE = "transactions.csv"  # .csv, .db/.sqlite, or a directory/ (partitioned)
+LEDGER_DURABILITY = DURABILITY_INTERVAL  # When saved rows are synced, see journal.py
+DEFAULT_CATEGORY = "dining_out_restaurants"  # Selected on the transaction page
+LOAD_POLL_MS = 50  # Delay between checks for ledgers loading in the background
+
+# Pie chart geometry (matplotlib defaults), needed to move labels in place
+PIE_START_ANGLE = 90
+PIE_LABEL_DISTANCE = 1.1
+PIE_PCT_DISTANCE = 0.6
+
+
+# Report views of the ReportPage, in selector order
+REPORT_PIVOT = "รายจ่ายรายเดือนตามหมวดหมู่"
+REPORT_YEAR_OVER_YEAR = "เทียบรายปี"
+REPORT_TOP_CATEGORIES = "หมวดหมู่รายจ่ายสูงสุด"
+REPORT_PERCENTILES = "เปอร์เซ็นไทล์การใช้จ่าย"
+REPORT_NAMES = (
+    REPORT_PIVOT,
+    REPORT_YEAR_OVER_YEAR,
+    REPORT_TOP_CATEGORIES,
+    REPORT_PERCENTILES,
+)
+REPORT_COLUMN_WIDTH = 110
+MONTH_NAMES = (
+    "ม.ค.",
+    "ก.พ.",
+    "มี.ค.",
+    "เม.ย.",
+    "พ.ค.",
+    "มิ.ย.",
+    "ก.ค.",
+    "ส.ค.",
+    "ก.ย.",
+    "ต.ค.",
+    "พ.ย.",
+    "ธ.ค.",
+)
+
+
+# Import matplotlib on first use; it dominates startup time otherwise
+def import_matplotlib():
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.figure import Figure
+
+    return Figure, FigureCanvasTkAgg
+
+
+# Import the NumPy report engine on first use, for the same reason
+def import_reports():
+    import reports
+
+    return reports
+
+
+# Format a change fraction as "+12.3%", or "-" when there is nothing to compare
+def format_change(change):
+    return "-" if math.isnan(change) else f"{change * 100:+.1f}%"
 
 
 class App(tk.Tk):
@@ -29,6 +100,19 @@ class App(tk.Tk):
         self.geometry(f"{APP_WIDTH}x{APP_HEIGHT}")
         self.configure(bg=BG_COLOR)
 
+        # Category labels are mapped to IDs on save and when a legacy ledger
+        # is migrated
+        self.categories = load_categories()
+
+        # Ledger storage shared by all pages
+        self.storage = open_storage(LEDGER_FILE, LEDGER_DURABILITY)
+        self.storage.recover(self.categories)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        # Pages register their redraws here, so a burst of saved transactions
+        # redraws each page once per idle cycle (see ui_scheduler.py)
+        self.ui = UpdateScheduler(self)
+
         # Nav bar
         self.nav_frame = tk.Frame(self, bg="#181818", width=70, height=APP_HEIGHT)
         self.nav_frame.pack(side="left", fill="y")
@@ -40,12 +124,12 @@ class App(tk.Tk):
         container.grid_rowconfigure(0, weight=1)
         container.grid_columnconfigure(0, weight=1)
 
+        # Pages are built the first time they are shown
+        self.container = container
+        self.pages = {
+            F.__name__: F for F in (HomePage, TransactionPage, ReportPage, SettingPage)
+        }
         self.frames = {}
-        for F in (HomePage, TransactionPage, ReportPage, SettingPage):
-            page_name = F.__name__
-            frame = F(parent=container, controller=self)
-            self.frames[page_name] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
 
         # Nav buttons
         nav_buttons = [
@@ -72,13 +156,45 @@ class App(tk.Tk):
         self.show_frame("HomePage")
 
     def show_frame(self, page_name):
-        frame = self.frames[page_name]
+        frame = self.frames.get(page_name)
+        if frame is None:
+            frame = self.pages[page_name](parent=self.container, controller=self)
+            self.frames[page_name] = frame
+            frame.grid(row=0, column=0, sticky="nsew")
         frame.tkraise()
 
+    # Pass a saved transaction to the pages that show running totals
+    def transaction_added(self, record):
+        home = self.frames.get("HomePage")
+        if home is not None:
+            home.add_transaction(*record)
+        report = self.frames.get("ReportPage")
+        if report is not None:
+            report.add_transaction(*record)
+
+    # Write buffered rows once they are due, checking again for as long as
+    # any are still buffered; rows that failed to write stay buffered for
+    # the next save or close
+    def flush_storage(self):
+        try:
+            delay = self.storage.flush_due()
+        except Exception as error:
+            messagebox.showerror("ข้อผิดพลาด", str(error))
+            return
+        if delay is not None:
+            self.after(delay, self.flush_storage)
+
+    # Write buffered transactions and close the window
+    def close(self):
+        self.ui.cancel()
+        self.storage.close()
+        self.destroy()
+
 
 class HomePage(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent, bg=BG_COLOR)
+        self.controller = controller
         label = tk.Label(
             self, text="Dashboard", bg=BG_COLOR, fg=FG_COLOR, font=("Arial", 24, "bold")
         )
@@ -141,100 +257,236 @@ class HomePage(tk.Frame):
             font=("Arial", 18, "bold"),
         ).pack()
 
-        # Chart Frame
-        chart_frame = tk.Frame(self, bg=BG_COLOR)
-        chart_frame.pack(pady=10, fill="both", expand=True)
-
-        # Pie Chart (รายรับ vs รายจ่าย)
-        pie_fig, pie_ax = plt.subplots(figsize=(3, 3), dpi=90)
-        self.pie_canvas = FigureCanvasTkAgg(pie_fig, master=chart_frame)
+        # Chart Frame, filled once the page has been painted
+        self.chart_frame = tk.Frame(self, bg=BG_COLOR)
+        self.chart_frame.pack(pady=10, fill="both", expand=True)
+        self.pie_ax = None
+        self.bar_ax = None
+        self.bind("<Expose>", self.on_first_expose)
+
+        # Month buckets ("YYYY-MM" -> [income, expense]) are read from storage
+        # on a worker thread, after the empty dashboard is painted, and then
+        # kept up to date as transactions are added
+        self.month_buckets = {}
+        self.load_queue = None  # Set while the month buckets are loading
+        self.pending_transactions = []  # Saved while loading, added afterwards
+        controller.ui.register("dashboard", self.update_dashboard)
+        self.reload_dashboard()
+
+    def on_first_expose(self, event):
+        self.unbind("<Expose>")
+        self.after_idle(self.create_charts)
+
+    @profiled("charts.create")
+    def create_charts(self):
+        Figure, FigureCanvasTkAgg = import_matplotlib()
+
+        # Pie Chart (รายรับ vs รายจ่าย); its artists are created once and
+        # updated in place
+        pie_fig = Figure(figsize=(3, 3), dpi=90)
+        self.pie_canvas = FigureCanvasTkAgg(pie_fig, master=self.chart_frame)
         self.pie_canvas.get_tk_widget().pack(side="left", padx=30)
-        self.pie_ax = pie_ax
+        self.pie_ax = pie_fig.add_subplot()
         self.pie_fig = pie_fig
+        self.pie_artists = self.pie_ax.pie(
+            [1, 1],
+            labels=["รายรับ", "รายจ่าย"],
+            autopct="%1.1f%%",
+            colors=["#43a047", "#e53935"],
+            startangle=PIE_START_ANGLE,
+            labeldistance=PIE_LABEL_DISTANCE,
+            pctdistance=PIE_PCT_DISTANCE,
+        )
+        self.pie_no_data = self.pie_ax.text(
+            0.5,
+            0.5,
+            "No Data",
+            ha="center",
+            va="center",
+            fontsize=14,
+            transform=self.pie_ax.transAxes,
+        )
+        self.pie_ax.set_title("สัดส่วนรายรับ/รายจ่าย")
+        self.pie_fig.tight_layout()
 
         # Bar Chart (รายรับ/รายจ่ายรายเดือน)
-        bar_fig, bar_ax = plt.subplots(figsize=(4.5, 3), dpi=90)
-        self.bar_canvas = FigureCanvasTkAgg(bar_fig, master=chart_frame)
+        bar_fig = Figure(figsize=(4.5, 3), dpi=90)
+        self.bar_canvas = FigureCanvasTkAgg(bar_fig, master=self.chart_frame)
         self.bar_canvas.get_tk_widget().pack(side="left", padx=30)
-        self.bar_ax = bar_ax
+        self.bar_ax = bar_fig.add_subplot()
         self.bar_fig = bar_fig
+        self.bar_months = None  # Months the current bars were built for
+
+        # Renders happen later, from draw_idle, so they get their own span
+        for canvas in (self.pie_canvas, self.bar_canvas):
+            canvas.draw = profiled("charts.render")(canvas.draw)
 
         self.update_dashboard()
+        self.event_generate("<<ChartsReady>>")
 
-    def update_dashboard(self):
-        income = 0.0
-        expense = 0.0
-        # For bar chart
-        month_income = {}
-        month_expense = {}
-        if os.path.exists(CSV_FILE):
-            with open(CSV_FILE, "r", encoding="utf-8") as f:
-                reader = csv.reader(f)
-                for row in reader:
-                    if len(row) == 4:
-                        try:
-                            amt = float(row[3])
-                        except ValueError:
-                            continue
-                        # Month key
-                        try:
-                            month = row[0][:7]  # YYYY-MM
-                        except Exception:
-                            month = "Unknown"
-                        if row[1] == "รายรับ":
-                            income += amt
-                            month_income[month] = month_income.get(month, 0) + amt
-                        else:
-                            expense += amt
-                            month_expense[month] = month_expense.get(month, 0) + amt
-        balance = income - expense
-        self.balance_var.set(f"{balance:,.2f}")
-        self.income_var.set(f"{income:,.2f}")
-        self.expense_var.set(f"{expense:,.2f}")
-
-        # --- Pie Chart ---
-        self.pie_ax.clear()
-        pie_labels = ["รายรับ", "รายจ่าย"]
-        pie_values = [income, expense]
-        colors = ["#43a047", "#e53935"]
-        if income == 0 and expense == 0:
-            self.pie_ax.text(0.5, 0.5, "No Data", ha="center", va="center", fontsize=14)
-        else:
-            self.pie_ax.pie(
-                pie_values,
-                labels=pie_labels,
-                autopct="%1.1f%%",
-                colors=colors,
-                startangle=90,
+    # Read the month buckets from storage again on a worker thread; the
+    # charts are rebuilt once they are in
+    def reload_dashboard(self):
+        storage = self.controller.storage
+        if self.load_queue is not None or not storage.exists():
+            return
+        self.load_queue = queue.Queue()
+        threading.Thread(
+            target=self.run_loader,
+            args=(storage.loader(), self.load_queue),
+            daemon=True,
+        ).start()
+        self.after(LOAD_POLL_MS, self.poll_loader)
+
+    # Worker thread: read the ledger and queue its month totals (no Tk calls
+    # here)
+    def run_loader(self, loader, load_queue):
+        try:
+            aggregates = load_chunks(loader)[1]
+            load_queue.put(
+                [
+                    (month, *aggregates.month_totals(month))
+                    for month in aggregates.months()
+                ]
             )
-        self.pie_ax.set_title("สัดส่วนรายรับ/รายจ่าย")
-        self.pie_fig.tight_layout()
-        self.pie_canvas.draw()
-
-        # --- Bar Chart ---
-        self.bar_ax.clear()
-        months = sorted(set(list(month_income.keys()) + list(month_expense.keys())))
-        income_vals = [month_income.get(m, 0) for m in months]
-        expense_vals = [month_expense.get(m, 0) for m in months]
-        x = range(len(months))
-        self.bar_ax.bar(
-            x, income_vals, width=0.4, label="รายรับ", color="#43a047", align="center"
-        )
-        self.bar_ax.bar(
-            x, expense_vals, width=0.4, label="รายจ่าย", color="#e53935", align="edge"
+        except Exception as error:
+            load_queue.put(error)
+
+    # Main thread: swap in the loaded month buckets and add the transactions
+    # saved while loading
+    @profiled("dashboard.reload")
+    def poll_loader(self):
+        try:
+            month_totals = self.load_queue.get_nowait()
+        except queue.Empty:
+            self.after(LOAD_POLL_MS, self.poll_loader)
+            return
+
+        self.load_queue = None
+        pending, self.pending_transactions = self.pending_transactions, []
+        if isinstance(month_totals, Exception):
+            messagebox.showerror("ข้อผิดพลาด", str(month_totals))
+            return
+        self.month_buckets = {
+            month: [income, expense] for month, income, expense in month_totals
+        }
+        for record in pending:
+            self.add_transaction(*record)
+        self.bar_months = None
+        self.controller.ui.invalidate("dashboard")
+
+    # Add a saved transaction to the month buckets; the dashboard is redrawn
+    # on the next idle pass
+    def add_transaction(
+        self, date_ordinal, category, transaction_type, amount, note=""
+    ):
+        if self.load_queue is not None:
+            self.pending_transactions.append(
+                (date_ordinal, category, transaction_type, amount, note)
+            )
+            return
+        bucket = self.month_buckets.setdefault(month_key(date_ordinal), [0, 0])
+        bucket[transaction_type] += amount
+        self.controller.ui.invalidate("dashboard")
+
+    def update_dashboard(self):
+        income = sum(bucket[INCOME] for bucket in self.month_buckets.values())
+        expense = sum(bucket[EXPENSE] for bucket in self.month_buckets.values())
+        self.balance_var.set(format_amount(income - expense))
+        self.income_var.set(format_amount(income))
+        self.expense_var.set(format_amount(expense))
+        if self.pie_ax is None:
+            return  # Charts not created yet
+
+        # Charts work in baht
+        self.update_pie_chart(income / MINOR_UNITS, expense / MINOR_UNITS)
+        months = sorted(self.month_buckets)
+        self.update_bar_chart(
+            months,
+            [self.month_buckets[month][INCOME] / MINOR_UNITS for month in months],
+            [self.month_buckets[month][EXPENSE] / MINOR_UNITS for month in months],
         )
-        self.bar_ax.set_xticks(x)
-        self.bar_ax.set_xticklabels(months, rotation=30, ha="right")
-        self.bar_ax.set_ylabel("จำนวนเงิน")
-        self.bar_ax.set_title("รายรับ/รายจ่ายรายเดือน")
-        self.bar_ax.legend()
-        self.bar_fig.tight_layout()
-        self.bar_canvas.draw()
+
+    # Move the existing wedges and labels instead of redrawing the pie
+    @profiled("charts.pie")
+    def update_pie_chart(self, income, expense):
+        wedges, labels, autotexts = self.pie_artists
+        total = income + expense
+        self.pie_no_data.set_visible(total == 0)
+        for artist in (*wedges, *labels, *autotexts):
+            artist.set_visible(total != 0)
+
+        if total != 0:
+            theta = PIE_START_ANGLE
+            for wedge, label, autotext, value in zip(
+                wedges, labels, autotexts, (income, expense)
+            ):
+                sweep = 360 * value / total
+                wedge.set_theta1(theta)
+                wedge.set_theta2(theta + sweep)
+                middle = math.radians(theta + sweep / 2)
+                x, y = math.cos(middle), math.sin(middle)
+                label.set_position((PIE_LABEL_DISTANCE * x, PIE_LABEL_DISTANCE * y))
+                label.set_horizontalalignment("left" if x > 0 else "right")
+                autotext.set_position((PIE_PCT_DISTANCE * x, PIE_PCT_DISTANCE * y))
+                autotext.set_text(f"{100 * value / total:.1f}%")
+                theta += sweep
+        self.pie_canvas.draw_idle()
+
+    # Update bar heights in place; the bars are rebuilt only when the months
+    # change and the layout is redone only when the axis extents change
+    @profiled("charts.bar")
+    def update_bar_chart(self, months, income_vals, expense_vals):
+        layout_changed = False
+        if months != self.bar_months:
+            self.bar_ax.clear()
+            x = range(len(months))
+            self.income_bars = self.bar_ax.bar(
+                x,
+                income_vals,
+                width=0.4,
+                label="รายรับ",
+                color="#43a047",
+                align="center",
+            )
+            self.expense_bars = self.bar_ax.bar(
+                x,
+                expense_vals,
+                width=0.4,
+                label="รายจ่าย",
+                color="#e53935",
+                align="edge",
+            )
+            self.bar_ax.set_xticks(x)
+            self.bar_ax.set_xticklabels(months, rotation=30, ha="right")
+            self.bar_ax.set_ylabel("จำนวนเงิน")
+            self.bar_ax.set_title("รายรับ/รายจ่ายรายเดือน")
+            self.bar_ax.legend()
+            self.bar_months = months
+            layout_changed = True
+        else:
+            for bars, values in (
+                (self.income_bars, income_vals),
+                (self.expense_bars, expense_vals),
+            ):
+                for rect, value in zip(bars, values):
+                    rect.set_height(value)
+
+            # Grow the y axis only when a bar no longer fits
+            if max(income_vals + expense_vals, default=0) > self.bar_ax.get_ylim()[1]:
+                self.bar_ax.relim()
+                self.bar_ax.autoscale_view()
+                layout_changed = True
+
+        if layout_changed:
+            self.bar_fig.tight_layout()
+        self.bar_canvas.draw_idle()
 
 
 class TransactionPage(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent, bg=BG_COLOR)
+        self.controller = controller
         label = tk.Label(
             self, text="บันทึกรายรับ-รายจ่าย", bg=BG_COLOR, fg=FG_COLOR, font=("Arial", 20)
         )
@@ -260,14 +512,17 @@ class TransactionPage(tk.Frame):
         tk.Label(input_frame, text="หมวดหมู่", bg=BG_COLOR, fg=FG_COLOR).grid(
             row=0, column=2, padx=5, sticky="e"
         )
+        # Every category of the catalog; income ones save as income
+        catalog = controller.categories
         self.category_cb = ttk.Combobox(
             input_frame,
             textvariable=self.category_var,
-            values=["อาหาร", "การเดินทาง", "รายรับ", "อื่นๆ"],
-            width=12,
+            values=catalog.all_labels["th"],
+            state="readonly",
+            width=24,
         )
         self.category_cb.grid(row=0, column=3, padx=5)
-        self.category_cb.set("อาหาร")
+        self.category_cb.set(catalog.label(DEFAULT_CATEGORY, "th"))
 
         tk.Label(input_frame, text="คำอธิบาย", bg=BG_COLOR, fg=FG_COLOR).grid(
             row=1, column=0, padx=5, sticky="e"
@@ -297,23 +552,34 @@ class TransactionPage(tk.Frame):
         desc = self.desc_var.get()
         amount = self.amount_var.get()
         try:
-            amount_f = float(amount)
+            amount_minor = parse_amount(amount)
         except ValueError:
             messagebox.showerror("ข้อผิดพลาด", "กรุณากรอกจำนวนเงินเป็นตัวเลข")
             return
         if not date or not category or not desc:
             messagebox.showerror("ข้อผิดพลาด", "กรุณากรอกข้อมูลให้ครบถ้วน")
             return
-        # Save to CSV
-        with open(CSV_FILE, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow([date, category, desc, amount])
+        try:
+            date_ordinal = parse_date(date)
+        except ValueError:
+            messagebox.showerror("ข้อผิดพลาด", "กรุณากรอกวันที่ในรูปแบบ YYYY-MM-DD")
+            return
+        catalog = self.controller.categories
+        category = catalog.all_ids[self.category_cb.current()]
+        if category in catalog.ids["income"]:
+            transaction_type = INCOME
+        else:
+            transaction_type = EXPENSE
+        record = (date_ordinal, category, transaction_type, amount_minor, desc)
+        self.controller.storage.append(*record)
+        self.after(COMMIT_INTERVAL_MS, self.controller.flush_storage)
+        self.controller.transaction_added(record)
         messagebox.showinfo("สำเร็จ", "เพิ่มรายการเรียบร้อยแล้ว")
         self.clear_inputs()
 
     def clear_inputs(self):
         self.date_var.set(datetime.now().strftime("%Y-%m-%d"))
-        self.category_cb.set("อาหาร")
+        self.category_cb.set(self.controller.categories.label(DEFAULT_CATEGORY, "th"))
         self.desc_var.set("")
         self.amount_var.set("")
 
@@ -321,10 +587,220 @@ class TransactionPage(tk.Frame):
 class ReportPage(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent, bg=BG_COLOR)
+        self.controller = controller
         label = tk.Label(
             self, text="Report", bg=BG_COLOR, fg=FG_COLOR, font=("Arial", 20)
         )
-        label.pack(pady=30)
+        label.pack(pady=20)
+
+        # Report selector
+        controls = tk.Frame(self, bg=BG_COLOR)
+        controls.pack(pady=5)
+        self.report_var = tk.StringVar(value=REPORT_NAMES[0])
+        report_cb = ttk.Combobox(
+            controls,
+            textvariable=self.report_var,
+            values=REPORT_NAMES,
+            state="readonly",
+            width=28,
+        )
+        report_cb.pack(side="left", padx=5)
+        report_cb.bind("<<ComboboxSelected>>", lambda event: self.show_report())
+        tk.Button(
+            controls,
+            text="รีเฟรช",
+            command=self.reload_report,
+            bg="#388e3c",
+            fg=FG_COLOR,
+        ).pack(side="left", padx=5)
+        self.status_var = tk.StringVar()
+        tk.Label(controls, textvariable=self.status_var, bg=BG_COLOR, fg=FG_COLOR).pack(
+            side="left", padx=10
+        )
+
+        # Result table; pivots are wide, so it scrolls both ways
+        table_frame = tk.Frame(self, bg=BG_COLOR)
+        table_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        table_frame.grid_rowconfigure(0, weight=1)
+        table_frame.grid_columnconfigure(0, weight=1)
+        self.table = ttk.Treeview(table_frame, show="headings")
+        y_scrollbar = ttk.Scrollbar(
+            table_frame, orient="vertical", command=self.table.yview
+        )
+        x_scrollbar = ttk.Scrollbar(
+            table_frame, orient="horizontal", command=self.table.xview
+        )
+        self.table.configure(
+            yscrollcommand=y_scrollbar.set, xscrollcommand=x_scrollbar.set
+        )
+        self.table.grid(row=0, column=0, sticky="nsew")
+        y_scrollbar.grid(row=0, column=1, sticky="ns")
+        x_scrollbar.grid(row=1, column=0, sticky="ew")
+
+        # The ledger is read once on a worker thread, after the empty report
+        # is shown; reports run over its columns in memory
+        self.reports = import_reports()
+        self.store = TransactionStore()
+        self.report_frame = None
+        self.load_queue = None  # Set while the ledger is loading
+        self.pending_transactions = []  # Saved while loading, added afterwards
+        controller.ui.register("report", self.show_report)
+        self.show_report()
+        self.reload_report()
+
+    # Read the ledger from storage again on a worker thread; the report is
+    # shown again once it is in
+    def reload_report(self):
+        storage = self.controller.storage
+        if self.load_queue is not None or not storage.exists():
+            return
+        self.load_queue = queue.Queue()
+        self.status_var.set("กำลังโหลด...")
+        threading.Thread(
+            target=self.run_loader,
+            args=(storage.loader(), self.load_queue),
+            daemon=True,
+        ).start()
+        self.after(LOAD_POLL_MS, self.poll_loader)
+
+    # Worker thread: read the ledger into a store (no Tk calls here)
+    def run_loader(self, loader, load_queue):
+        try:
+            load_queue.put(load_chunks(loader)[0])
+        except Exception as error:
+            load_queue.put(error)
+
+    # Main thread: swap in the loaded store and add the transactions saved
+    # while loading
+    @profiled("reports.load")
+    def poll_loader(self):
+        try:
+            store = self.load_queue.get_nowait()
+        except queue.Empty:
+            self.after(LOAD_POLL_MS, self.poll_loader)
+            return
+
+        self.load_queue = None
+        pending, self.pending_transactions = self.pending_transactions, []
+        if isinstance(store, Exception):
+            self.status_var.set("")
+            messagebox.showerror("ข้อผิดพลาด", str(store))
+            return
+        self.store = store
+        for record in pending:
+            self.store.append(*record)
+        self.report_frame = None
+        self.controller.ui.invalidate("report")
+
+    # Add a saved transaction; the report is recomputed from the columns on
+    # the next idle pass
+    def add_transaction(
+        self, date_ordinal, category, transaction_type, amount, note=""
+    ):
+        if self.load_queue is not None:
+            self.pending_transactions.append(
+                (date_ordinal, category, transaction_type, amount, note)
+            )
+            return
+        self.store.append(date_ordinal, category, transaction_type, amount, note)
+        self.report_frame = None
+        self.controller.ui.invalidate("report")
+
+    # Compute the selected report and fill the table with it
+    @profiled("reports.compute")
+    def show_report(self):
+        start = time.perf_counter()
+        if self.report_frame is None:
+            self.report_frame = self.reports.ReportFrame(self.store)
+        name = self.report_var.get()
+        if name == REPORT_PIVOT:
+            headings, rows = self.pivot_rows()
+        elif name == REPORT_YEAR_OVER_YEAR:
+            headings, rows = self.year_over_year_rows()
+        elif name == REPORT_TOP_CATEGORIES:
+            headings, rows = self.top_category_rows()
+        else:
+            headings, rows = self.percentile_rows()
+        self.fill_table(headings, rows)
+        self.status_var.set(
+            f"{len(self.report_frame):,} รายการ, "
+            f"{(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+
+    # Get the label of a category ID
+    def category_label(self, category):
+        return self.controller.categories.label(category, "th")
+
+    # Months down, categories across, with a total column
+    def pivot_rows(self):
+        months, categories, table = self.reports.pivot(self.report_frame)
+        headings = ["เดือน", *map(self.category_label, categories), "รวม"]
+        totals = table.sum(axis=1).tolist()
+        rows = [
+            (month, *map(format_amount, values), format_amount(total))
+            for month, values, total in zip(months, table.tolist(), totals)
+        ]
+        return headings, rows
+
+    # One row per year and type, months across, then the yearly total and its
+    # change against the year before
+    def year_over_year_rows(self):
+        report = self.reports.year_over_year(self.report_frame)
+        headings = ["ปี", "ประเภท", *MONTH_NAMES, "รวม", "เปลี่ยนแปลง"]
+        rows = []
+        for index, year in enumerate(report["years"]):
+            for name, label in (("income", "รายรับ"), ("expense", "รายจ่าย")):
+                values = report[name][index].tolist()
+                rows.append(
+                    (
+                        year,
+                        label,
+                        *map(format_amount, values),
+                        format_amount(sum(values)),
+                        format_change(report[name + "_change"][index]),
+                    )
+                )
+        return headings, rows
+
+    def top_category_rows(self):
+        headings = ["อันดับ", "หมวดหมู่", "รายจ่าย", "สัดส่วน"]
+        rows = [
+            (rank, self.category_label(category), format_amount(amount), f"{share:.1%}")
+            for rank, (category, amount, share) in enumerate(
+                self.reports.top_categories(self.report_frame), start=1
+            )
+        ]
+        return headings, rows
+
+    def percentile_rows(self):
+        report = self.reports.spend_percentiles(self.report_frame)
+        headings = ["เปอร์เซ็นไทล์", "ต่อรายการ", "ต่อเดือน"]
+        rows = [
+            (f"P{percentile}", format_amount(single), format_amount(monthly))
+            for (percentile, single), (_, monthly) in zip(
+                report["transaction"], report["monthly"]
+            )
+        ]
+        return headings, rows
+
+    # Replace the table's columns and rows
+    def fill_table(self, headings, rows):
+        self.table.delete(*self.table.get_children())
+        columns = [str(index) for index in range(len(headings))]
+        self.table.configure(columns=columns)
+        for column, heading in zip(columns, headings):
+            self.table.heading(column, text=heading)
+            self.table.column(
+                column,
+                width=REPORT_COLUMN_WIDTH,
+                minwidth=60,
+                stretch=False,
+                anchor="e",
+            )
+        if columns:
+            self.table.column(columns[0], anchor="w")
+        for row in rows:
+            self.table.insert("", "end", values=row)
 
 
 class SettingPage(tk.Frame):
@@ -335,6 +811,9 @@ class SettingPage(tk.Frame):
         )
         label.pack(pady=30)
 
+        # Performance stats of both windows' profiling spans
+        StatsPanel(self, BG_COLOR, FG_COLOR).pack(fill="both", expand=True, padx=30)
+
 
 if __name__ == "__main__":
     app = App()
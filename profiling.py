@@ -0,0 +1,176 @@
+"""
+Named profiling spans for Budget Tracker
+
+Stages worth watching (CSV parsing, aggregation, Treeview inserts, chart
+draws, ...) are wrapped in spans:
+
+    with span("csv.parse"):
+        ...
+
+    @profiled("table.refresh")
+    def refresh_transaction_table(self):
+        ...
+
+While profiling is disabled a span is a shared no-op object and a profiled
+function costs one flag check, so spans can stay in place for good. When
+enabled, every span records its wall time and, if allocation tracking is on,
+the net memory it allocated (through tracemalloc, which slows everything
+down noticeably, so it is a separate switch).
+
+stats() gives per-span totals for the stats panel (see stats_panel.py) and
+export_chrome_trace() writes the recorded spans as a Chrome trace
+(chrome://tracing or https://ui.perfetto.dev). Set BUDGET_PROFILE=1 to
+profile from startup.
+"""
+
+from collections import deque
+import functools, json, os, threading, time, tracemalloc
+
+MAX_EVENTS = 100000  # Spans kept for the trace; older ones are dropped
+
+ENABLED = os.environ.get("BUDGET_PROFILE") == "1"
+TRACK_ALLOCATIONS = False
+
+# (name, start ns, duration ns, thread id, allocated bytes)
+events = deque(maxlen=MAX_EVENTS)
+totals = {}  # name -> [count, total ns, max ns, allocated bytes]
+lock = threading.Lock()
+
+
+#################### Spans ####################
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    __slots__ = ("name", "start", "memory")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.memory = tracemalloc.get_traced_memory()[0] if TRACK_ALLOCATIONS else 0
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter_ns() - self.start
+        allocated = 0
+        if TRACK_ALLOCATIONS:
+            allocated = tracemalloc.get_traced_memory()[0] - self.memory
+        record(self.name, self.start, duration, allocated)
+        return False
+
+
+# Get a span for a with block; a no-op while profiling is disabled
+def span(name):
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(name)
+
+
+# Decorate a function so every call is recorded as a span
+def profiled(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            with Span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+# Store a finished span
+def record(name, start, duration, allocated):
+    with lock:
+        events.append((name, start, duration, threading.get_ident(), allocated))
+        total = totals.get(name)
+        if total is None:
+            total = totals[name] = [0, 0, 0, 0]
+        total[0] += 1
+        total[1] += duration
+        total[2] = max(total[2], duration)
+        total[3] += allocated
+
+
+#################### Control ####################
+# Turn span recording on or off
+def set_enabled(enabled):
+    global ENABLED
+    ENABLED = enabled
+    if not enabled:
+        set_track_allocations(False)
+
+
+# Turn allocation tracking (tracemalloc) on or off
+def set_track_allocations(track):
+    global TRACK_ALLOCATIONS
+    if track and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not track and TRACK_ALLOCATIONS and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    TRACK_ALLOCATIONS = track
+
+
+# Forget every recorded span
+def reset():
+    with lock:
+        events.clear()
+        totals.clear()
+
+
+#################### Reports ####################
+# Get (name, count, total ms, mean ms, max ms, allocated KiB) per span name,
+# slowest total first
+def stats():
+    with lock:
+        rows = [
+            (
+                name,
+                count,
+                total / 1e6,
+                total / count / 1e6,
+                longest / 1e6,
+                allocated / 1024,
+            )
+            for name, (count, total, longest, allocated) in totals.items()
+        ]
+    rows.sort(key=lambda row: -row[2])
+    return rows
+
+
+# Write the recorded spans as a Chrome trace JSON file
+def export_chrome_trace(path):
+    with lock:
+        recorded = list(events)
+    pid = os.getpid()
+    trace = {
+        "traceEvents": [
+            {
+                "name": name,
+                "cat": name.split(".")[0],
+                "ph": "X",
+                "ts": start / 1000,
+                "dur": duration / 1000,
+                "pid": pid,
+                "tid": thread,
+                "args": {"allocated_bytes": allocated},
+            }
+            for name, start, duration, thread, allocated in recorded
+        ],
+        "displayTimeUnit": "ms",
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(trace, file)
+    return len(recorded)
@@ -0,0 +1,165 @@
+"""
+Vectorized report engine for Budget Tracker
+
+Reports run NumPy group-bys over the columns of a TransactionStore (see
+transaction_store.py). Each report is a bincount over a combined group key,
+so no Python code runs per transaction:
+
+- pivot(): month x category sums of one transaction type
+- year_over_year(): income and expense per year and month of year, with the
+  change of each year's total against the year before
+- top_categories(): the categories with the largest expense
+- spend_percentiles(): percentiles of single expenses and of monthly spend
+
+Amounts are integer minor units. Sums go through float64 bincounts, which
+are exact for totals below 2**53 satang. numpy comes with matplotlib; the
+GUIs import this module on first use.
+"""
+
+import numpy as np
+
+from transaction_store import EXPENSE, INCOME
+
+EPOCH_ORDINAL = 719163  # date(1970, 1, 1).toordinal(), day 0 of datetime64
+PERCENTILES = (50, 75, 90, 95, 99)
+TOP_CATEGORIES = 10
+
+
+# Copy a typed array column into a NumPy array. A view would pin the array's
+# buffer and make further appends to the store fail.
+def column_array(column, dtype=None):
+    return np.frombuffer(column, dtype=dtype or column.typecode).copy()
+
+
+# Round float64 bincount sums back to integer minor units
+def exact(sums):
+    return np.rint(sums).astype(np.int64)
+
+
+# Get the "YYYY-MM" label of a month counted from 1970-01
+def month_label(month):
+    return f"{1970 + month // 12:04d}-{month % 12 + 1:02d}"
+
+
+class ReportFrame:
+    # Take the columns of the live rows of a store, keeping only days between
+    # start and end (day ordinals, None for an open end)
+    def __init__(self, store, start_ordinal=None, end_ordinal=None):
+        self.categories = list(store.categories)
+        self.amounts = column_array(store.amounts)
+        self.dates = column_array(store.dates)
+        self.types = column_array(store.types, np.uint8)
+        # Signed, so group keys mixing months and ids stay integers
+        self.category_ids = column_array(store.category_ids).astype(np.int64)
+        if store.deleted_count or start_ordinal is not None or end_ordinal is not None:
+            mask = column_array(store.deleted, np.uint8) == 0
+            if start_ordinal is not None:
+                mask &= self.dates >= start_ordinal
+            if end_ordinal is not None:
+                mask &= self.dates <= end_ordinal
+            self.amounts = self.amounts[mask]
+            self.dates = self.dates[mask]
+            self.types = self.types[mask]
+            self.category_ids = self.category_ids[mask]
+
+        # Months since 1970-01, through datetime64 instead of per-row dates
+        days = (self.dates - EPOCH_ORDINAL).astype("datetime64[D]")
+        self.months = days.astype("datetime64[M]").astype(np.int64)
+
+    def __len__(self):
+        return len(self.amounts)
+
+
+#################### Reports ####################
+# Get (month labels, category names, table) where table[m, c] is the sum of
+# one transaction type in month m and category c; months and categories
+# without any such transaction are left out
+def pivot(frame, transaction_type=EXPENSE):
+    mask = frame.types == transaction_type
+    months = frame.months[mask]
+    first_month = int(months.min()) if len(months) else 0
+    shape = (
+        int(months.max()) - first_month + 1 if len(months) else 0,
+        len(frame.categories),
+    )
+    cells = (months - first_month) * shape[1] + frame.category_ids[mask]
+    counts = np.bincount(cells, minlength=shape[0] * shape[1]).reshape(shape)
+    sums = np.bincount(
+        cells, weights=frame.amounts[mask], minlength=shape[0] * shape[1]
+    )
+    rows = np.flatnonzero(counts.any(axis=1))
+    columns = np.flatnonzero(counts.any(axis=0))
+    return (
+        [month_label(first_month + row) for row in rows.tolist()],
+        [frame.categories[column] for column in columns.tolist()],
+        exact(sums).reshape(shape)[np.ix_(rows, columns)],
+    )
+
+
+# Get income and expense per year and month of year. Returns a dict with
+# "years", "income" and "expense" (years x 12 tables), and "income_change"
+# and "expense_change": each year's total against the year before, as a
+# fraction (NaN for the first year or after a year without any)
+def year_over_year(frame):
+    years = frame.months // 12 + 1970
+    first_year = int(years.min()) if len(years) else 0
+    year_count = int(years.max()) - first_year + 1 if len(years) else 0
+    report = {"years": list(range(first_year, first_year + year_count))}
+    cells = (years - first_year) * 12 + frame.months % 12
+    for name, transaction_type in (("income", INCOME), ("expense", EXPENSE)):
+        mask = frame.types == transaction_type
+        sums = np.bincount(
+            cells[mask], weights=frame.amounts[mask], minlength=year_count * 12
+        )
+        table = exact(sums).reshape(year_count, 12)
+        totals = table.sum(axis=1)
+        change = np.full(year_count, np.nan)
+        if year_count > 1:
+            np.divide(
+                totals[1:] - totals[:-1],
+                totals[:-1],
+                out=change[1:],
+                where=totals[:-1] != 0,
+            )
+        report[name] = table
+        report[name + "_change"] = change
+    return report
+
+
+# Get [(category, expense, share of all expense), ...] for the n categories
+# with the largest expense, largest first
+def top_categories(frame, n=TOP_CATEGORIES):
+    mask = frame.types == EXPENSE
+    sums = exact(
+        np.bincount(
+            frame.category_ids[mask],
+            weights=frame.amounts[mask],
+            minlength=len(frame.categories),
+        )
+    )
+    total = int(sums.sum())
+    order = np.argsort(-sums, kind="stable")[:n]
+    return [
+        (frame.categories[index], int(sums[index]), int(sums[index]) / total)
+        for index in order
+        if sums[index] > 0
+    ]
+
+
+# Get {"transaction": [(percentile, amount), ...], "monthly": [...]} for the
+# amounts of single expenses and the total expense of each month with any
+def spend_percentiles(frame, percentiles=PERCENTILES):
+    mask = frame.types == EXPENSE
+    expenses = frame.amounts[mask]
+    months = frame.months[mask]
+    months = months - (months.min() if len(months) else 0)
+    monthly = exact(np.bincount(months, weights=expenses))
+    monthly = monthly[np.bincount(months) > 0]
+    report = {}
+    for name, values in (("transaction", expenses), ("monthly", monthly)):
+        if not len(values):
+            report[name] = []
+            continue
+        points = exact(np.percentile(values, percentiles))
+        report[name] = list(zip(percentiles, points.tolist()))
+    return report
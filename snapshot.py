@@ -0,0 +1,321 @@
+"""
+Binary snapshot cache for Budget Tracker ledgers
+
+A snapshot sits next to the CSV file (transactions.csv.snapshot) and holds
+the parsed columns and aggregates for a byte prefix of the CSV. It is keyed
+by the size and mtime of the CSV and a CRC-32 of the prefix it covers, so on
+startup only the bytes appended since it was written are parsed. If the
+prefix changed, the ledger is rebuilt from the full CSV.
+
+File layout: magic, 8-byte little-endian header length, JSON header, then
+the raw bytes of each column in SNAPSHOT_COLUMNS order.
+
+Change rows (edits and deletes, see ledger_format.py) are applied as the
+chunks holding them are merged, so a snapshot holds the ledger with every
+change up to its prefix already applied.
+"""
+
+from array import array
+from itertools import islice
+import csv, io, json, os, sys, zlib
+
+from aggregates import AggregateEngine
+from ledger_format import parse_into, read_header
+from parallel_parse import parallel_chunks, use_parallel
+from profiling import span
+from transaction_store import TransactionStore
+
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_MAGIC = b"BTSNAP04"  # 04: transaction IDs and deleted flags
+CHUNK_SIZE = 1 << 20  # Bytes read at a time while checksumming
+LOAD_CHUNK_ROWS = 20000  # Rows parsed per chunk while loading
+SNAPSHOT_COLUMNS = (
+    "amounts",
+    "dates",
+    "types",
+    "category_ids",
+    "note_offsets",
+    "ids",
+    "deleted",
+)
+
+
+# Get the snapshot path of a CSV file
+def snapshot_path(csv_path):
+    return csv_path + SNAPSHOT_SUFFIX
+
+
+# CRC-32 of the first size bytes of a binary file
+def prefix_checksum(file, size):
+    file.seek(0)
+    checksum = 0
+    while size > 0:
+        chunk = file.read(min(CHUNK_SIZE, size))
+        if not chunk:
+            break
+        checksum = zlib.crc32(chunk, checksum)
+        size -= len(chunk)
+    return checksum
+
+
+#################### Write ####################
+# Write a snapshot of store and aggregates covering size bytes of the CSV,
+# whose IDs are counted from id_base
+def write_snapshot(path, store, aggregates, size, mtime, checksum, id_base=0):
+    blobs = [bytes(getattr(store, name)) for name in SNAPSHOT_COLUMNS]
+    blobs.append(bytes(store.note_pool))
+    header = {
+        "size": size,
+        "mtime": mtime,
+        "checksum": checksum,
+        "byteorder": sys.byteorder,
+        "id_base": id_base,
+        "next_id": store.next_id,
+        "ids_ascending": store.ids_ascending,
+        "deleted_count": store.deleted_count,
+        "garbage": store.garbage,
+        "note_overrides": list(store.note_overrides.items()),
+        "categories": store.categories,
+        "typecodes": [
+            getattr(store, name).typecode
+            for name in SNAPSHOT_COLUMNS
+            if isinstance(getattr(store, name), array)
+        ],
+        "lengths": [len(blob) for blob in blobs],
+        "aggregates": aggregates.to_json(),
+    }
+    encoded_header = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    # Write to a temporary file first so a crash never leaves half a snapshot
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(SNAPSHOT_MAGIC)
+        file.write(len(encoded_header).to_bytes(8, "little"))
+        file.write(encoded_header)
+        for blob in blobs:
+            file.write(blob)
+    os.replace(temp_path, path)
+
+
+#################### Read ####################
+# Read a snapshot, returning (header, store, aggregates) or None if unusable
+def read_snapshot(path):
+    try:
+        with open(path, "rb") as file:
+            if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                return None
+            header_length = int.from_bytes(file.read(8), "little")
+            header = json.loads(file.read(header_length).decode("utf-8"))
+            if header["byteorder"] != sys.byteorder:
+                return None
+            blobs = [file.read(length) for length in header["lengths"]]
+    except (OSError, ValueError, KeyError):
+        return None
+    if any(len(blob) != length for blob, length in zip(blobs, header["lengths"])):
+        return None
+
+    store = TransactionStore()
+    typecodes = iter(header["typecodes"])
+    for name, blob in zip(SNAPSHOT_COLUMNS, blobs):
+        column = getattr(store, name)
+        if isinstance(column, array):
+            column = array(next(typecodes))
+            column.frombytes(blob)
+        else:
+            column = bytearray(blob)
+        setattr(store, name, column)
+    store.note_pool = bytearray(blobs[-1])
+    for category in header["categories"]:
+        store.intern_category(category)
+    store.next_id = header["next_id"]
+    store.ids_ascending = header["ids_ascending"]
+    store.deleted_count = header["deleted_count"]
+    store.garbage = header["garbage"]
+    store.note_overrides = dict(header["note_overrides"])
+
+    return header, store, AggregateEngine.from_json(header["aggregates"])
+
+
+#################### Load ####################
+# Binary reader limited to size bytes that keeps a running CRC-32 of what
+# has been read, so parsing and checksumming share one pass over the file
+class ChecksumReader(io.RawIOBase):
+    def __init__(self, file, size, checksum=0):
+        self.file = file
+        self.remaining = size
+        self.bytes_read = 0
+        self.checksum = checksum
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.file.read(min(len(buffer), self.remaining))
+        buffer[: len(data)] = data
+        self.remaining -= len(data)
+        self.bytes_read += len(data)
+        self.checksum = zlib.crc32(data, self.checksum)
+        return len(data)
+
+
+# Reads a CSV ledger in chunks, starting from its snapshot when it is valid.
+# Only the bytes present when the loader was created are read, so rows
+# appended while loading are left for the next load. Transaction IDs are
+# counted from id_base.
+class LedgerLoader:
+    def __init__(self, csv_path, chunk_rows=LOAD_CHUNK_ROWS, jobs=None, id_base=0):
+        self.csv_path = csv_path
+        self.chunk_rows = chunk_rows
+        self.jobs = jobs  # Parse processes, None for PARSE_JOBS
+        self.id_base = id_base
+        stat = os.stat(csv_path)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.snapshot_key = None  # (size, mtime, checksum) once fully read
+        self.next_id = id_base  # Next free ID after the chunks read so far
+        self.finished = False  # Set once every chunk has been read
+
+    # Yield (store, aggregates, progress) chunks; progress goes from 0 to 1
+    def chunks(self):
+        with span("snapshot.read"):
+            cached = read_snapshot(snapshot_path(self.csv_path))
+        with open(self.csv_path, "rb") as file:
+            start = 0
+            checksum = 0
+            if cached is not None:
+                header, store, aggregates = cached
+
+                # Same prefix: start with the snapshot and parse only the tail
+                if (
+                    header["id_base"] == self.id_base
+                    and header["size"] <= self.size
+                    and (
+                        (header["size"] == self.size and header["mtime"] == self.mtime)
+                        or prefix_checksum(file, header["size"]) == header["checksum"]
+                    )
+                ):
+                    start = header["size"]
+                    checksum = header["checksum"]
+                    self.next_id = store.next_id
+                    yield store, aggregates, start / max(self.size, 1)
+
+            # Otherwise the full file is rebuilt, header included; a large
+            # remainder is parsed by a process pool (see parallel_parse.py)
+            if use_parallel(self.size - start, self.jobs):
+                checksum = yield from self.parallel_chunks(file, start, checksum)
+            else:
+                checksum = yield from self.sequential_chunks(file, start, checksum)
+
+            # Only a prefix that ends on a record boundary can be cached, and
+            # an up-to-date snapshot needs no rewrite
+            self.finished = True
+            if start and start == self.size and header["mtime"] == self.mtime:
+                return
+            if self.size:
+                file.seek(self.size - 1)
+                if file.read(1) == b"\n":
+                    self.snapshot_key = (self.size, self.mtime, checksum)
+
+    # Yield the chunks of the bytes after start, parsed in this process;
+    # returns the CRC-32 of the whole file
+    def sequential_chunks(self, file, start, checksum):
+        file.seek(start)
+        reader = ChecksumReader(file, self.size - start, checksum)
+        text = io.TextIOWrapper(io.BufferedReader(reader), encoding="utf-8", newline="")
+        if not start and not read_header(text):
+            return reader.checksum
+        rows = csv.reader(text)
+        while True:
+            with span("csv.parse"):
+                batch = list(islice(rows, self.chunk_rows))
+            if not batch:
+                break
+            store = TransactionStore()
+            store.next_id = self.next_id
+            with span("csv.convert"):
+                parse_into(store, batch, self.id_base)
+            self.next_id = store.next_id
+            progress = (start + reader.bytes_read) / max(self.size, 1)
+            with span("aggregates.build"):
+                aggregates = AggregateEngine.from_store(store)
+            yield store, aggregates, progress
+        return reader.checksum
+
+    # Yield the chunks of the bytes after start, one per range parsed by the
+    # process pool; returns the CRC-32 of the whole file
+    def parallel_chunks(self, file, start, checksum):
+        chunks = parallel_chunks(
+            self.csv_path, file, start, self.size, checksum, self.jobs, self.id_base
+        )
+        while True:
+            with span("csv.parallel"):
+                try:
+                    store, aggregates, end = next(chunks)
+                except StopIteration as stop:
+                    return stop.value
+            # Each range counts its IDs from 0
+            store.rebase_ids(self.next_id)
+            self.next_id = store.next_id
+            yield store, aggregates, end / max(self.size, 1)
+
+    # Write a snapshot for store and aggregates built from every chunk
+    def save_snapshot(self, store, aggregates):
+        if self.snapshot_key is None:
+            return
+        try:
+            write_snapshot(
+                snapshot_path(self.csv_path),
+                store,
+                aggregates,
+                *self.snapshot_key,
+                self.id_base,
+            )
+        except OSError:
+            pass  # The snapshot is only a cache
+
+
+# Merge a loaded chunk into store and aggregates and apply its change rows,
+# returning the merged pair
+def merge_chunk(store, aggregates, chunk, chunk_aggregates):
+    if not len(store):
+        chunk.next_id = max(chunk.next_id, store.next_id)
+        store, aggregates = chunk, chunk_aggregates
+    else:
+        store.extend_store(chunk)
+        aggregates.merge(chunk_aggregates)
+    if chunk.changes:
+        apply_changes(store, aggregates, chunk.changes)
+        chunk.changes = []
+    return store, aggregates
+
+
+# Apply (transaction ID, record or None for a delete) changes to store and
+# aggregates, in order; changes to unknown or deleted IDs only count as
+# garbage
+def apply_changes(store, aggregates, changes):
+    for transaction_id, record in changes:
+        position = store.position(transaction_id)
+        if position is None or store.deleted[position]:
+            store.garbage += 1
+            continue
+        aggregates.remove(*store.record(position)[:4])
+        if record is None:
+            store.delete(position)
+        else:
+            store.update(position, record)
+            aggregates.add_index(store, position)
+
+
+# Load a CSV ledger into (store, aggregates), reusing and refreshing its
+# snapshot so that only bytes appended since the last run are parsed
+def load_ledger(csv_path, id_base=0):
+    return load_chunks(LedgerLoader(csv_path, id_base=id_base))
+
+
+# Merge every chunk of a loader into (store, aggregates) and save its snapshot
+def load_chunks(loader):
+    store, aggregates = TransactionStore(), AggregateEngine()
+    for chunk, chunk_aggregates, _ in loader.chunks():
+        store, aggregates = merge_chunk(store, aggregates, chunk, chunk_aggregates)
+    loader.save_snapshot(store, aggregates)
+    return store, aggregates
@@ -0,0 +1,130 @@
+"""
+Performance stats panel shared by budget_tracker.py and preview.py
+
+A frame with switches for profiling and allocation tracking, a table of
+per-span totals (see profiling.py) refreshed while profiling is on, and
+buttons to reset the numbers or export them as a Chrome trace.
+"""
+
+from tkinter import BooleanVar, Button, Checkbutton, Frame, filedialog, messagebox
+from tkinter import ttk
+
+import profiling
+
+STATS_REFRESH_MS = 1000  # Table refresh interval while profiling is on
+STATS_COLUMNS = (
+    ("span", "Span", 160, "w"),
+    ("count", "Count", 60, "e"),
+    ("total", "Total ms", 80, "e"),
+    ("mean", "Mean ms", 80, "e"),
+    ("max", "Max ms", 80, "e"),
+    ("allocated", "Alloc KiB", 80, "e"),
+)
+
+
+class StatsPanel(Frame):
+    def __init__(self, parent, bg, fg):
+        super().__init__(parent, bg=bg)
+        self.enabled_var = BooleanVar(value=profiling.ENABLED)
+        self.allocations_var = BooleanVar(value=profiling.TRACK_ALLOCATIONS)
+        self.refresh_job = None
+
+        # Switches
+        switches = Frame(self, bg=bg)
+        switches.pack(pady=10)
+        for text, variable, command in (
+            ("Profiling", self.enabled_var, self.toggle_profiling),
+            ("Track allocations", self.allocations_var, self.toggle_allocations),
+        ):
+            Checkbutton(
+                switches,
+                text=text,
+                variable=variable,
+                command=command,
+                bg=bg,
+                fg=fg,
+                selectcolor=bg,
+                activebackground=bg,
+                activeforeground=fg,
+            ).pack(side="left", padx=10)
+
+        # Stats table
+        self.table = ttk.Treeview(
+            self, columns=[column[0] for column in STATS_COLUMNS], show="headings"
+        )
+        for name, heading, width, anchor in STATS_COLUMNS:
+            self.table.heading(name, text=heading)
+            self.table.column(name, width=width, anchor=anchor)
+        self.table.pack(fill="both", expand=True, padx=10)
+
+        # Buttons
+        buttons = Frame(self, bg=bg)
+        buttons.pack(pady=10)
+        Button(buttons, text="Reset", width=10, command=self.reset).pack(
+            side="left", padx=10
+        )
+        Button(buttons, text="Export trace", width=12, command=self.export_trace).pack(
+            side="left", padx=10
+        )
+
+        if profiling.ENABLED:
+            self.schedule_refresh()
+
+    # Turn profiling on or off
+    def toggle_profiling(self):
+        profiling.set_enabled(self.enabled_var.get())
+        if not self.enabled_var.get():
+            self.allocations_var.set(False)
+        self.schedule_refresh()
+
+    # Turn allocation tracking on or off; it needs profiling on
+    def toggle_allocations(self):
+        if self.allocations_var.get() and not self.enabled_var.get():
+            self.enabled_var.set(True)
+            profiling.set_enabled(True)
+        profiling.set_track_allocations(self.allocations_var.get())
+        self.schedule_refresh()
+
+    # Refresh now, and again every STATS_REFRESH_MS while profiling is on
+    def schedule_refresh(self):
+        if self.refresh_job is not None:
+            self.after_cancel(self.refresh_job)
+            self.refresh_job = None
+        self.refresh()
+        if profiling.ENABLED:
+            self.refresh_job = self.after(STATS_REFRESH_MS, self.schedule_refresh)
+
+    # Fill the table with the current per-span totals
+    def refresh(self):
+        self.table.delete(*self.table.get_children())
+        for name, count, total, mean, longest, allocated in profiling.stats():
+            self.table.insert(
+                "",
+                "end",
+                values=(
+                    name,
+                    count,
+                    f"{total:.1f}",
+                    f"{mean:.2f}",
+                    f"{longest:.2f}",
+                    f"{allocated:.0f}",
+                ),
+            )
+
+    def reset(self):
+        profiling.reset()
+        self.refresh()
+
+    # Save the recorded spans as a Chrome trace JSON file
+    def export_trace(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".json", filetypes=[("Chrome trace", "*.json")]
+        )
+        if not path:
+            return
+        try:
+            count = profiling.export_chrome_trace(path)
+        except OSError as error:
+            messagebox.showerror("Error", str(error))
+            return
+        messagebox.showinfo("Export trace", f"{count} spans written to {path}")
@@ -0,0 +1,1021 @@
+"""
+Storage backends for Budget Tracker ledgers
+
+Both GUIs read and write transactions through a storage object instead of
+touching the ledger file directly. open_storage() picks the backend from the
+file name:
+
+- CsvStorage: the flat transactions.csv file in the canonical format of
+  ledger_format.py (with its snapshot cache); before a snapshot exists,
+  totals are a projected scan of the memory-mapped file (see
+  mapped_ledger.py)
+- SqliteStorage: a SQLite database in WAL mode with indexes on date, type,
+  category and month, so totals and groupings are indexed queries
+- PartitionedStorage: a directory (path ending in /) of canonical CSV files,
+  one per month or year, with a manifest of each partition's aggregates, so
+  totals never read a row and appends touch only the current partition
+
+Every backend provides:
+
+- exists()
+- recover(catalog): repair the file after a crash and migrate a legacy
+  ledger, mapping its category labels through catalog (see categories.py),
+  before anything else touches it
+- loader(): object with chunks() yielding (store, aggregates, progress) and
+  save_snapshot(store, aggregates)
+- load(): (store, aggregates) for the whole ledger
+- append(date_ordinal, category, transaction_type, amount, note), buffered
+  and group-committed according to the durability setting (see journal.py);
+  returns the new transaction ID
+- update(transaction_id, old_record, record): edit a transaction; returns its
+  ID, which only changes when a partitioned ledger moves it to another
+  partition
+- delete(transaction_id, old_record): delete a transaction
+- flush_due() / flush(): write buffered writes when due / right away;
+  flush_due() returns the milliseconds until the rest is due, or None
+- import_records(records): add many records in one transaction, all or
+  none; returns their IDs
+- compactor(): a LedgerCompactor-like object (see compaction.py) dropping
+  the rows left behind by edits and deletes, or None if there is nothing to
+  compact
+- totals(): (income, expense, balance) in minor units
+- month_totals(): [(month, income, expense), ...] sorted by month
+- year_totals(): [(year, income, expense), ...] sorted by year
+- transactions_between(start_ordinal, end_ordinal): store records
+  (date_ordinal, category, type, amount, note) in date order
+- close(): flush and release the backend
+
+Run "python storage.py transactions.csv transactions.db" to migrate a CSV
+ledger to SQLite, or "python storage.py transactions.csv ledger/ [month|year]"
+to split it into partitions.
+"""
+
+from itertools import islice
+import json, os, sqlite3, sys
+
+from aggregates import AggregateEngine, month_key
+from categories import load_categories
+from compaction import LedgerCompactor
+from journal import (
+    DURABILITY_EXIT,
+    DURABILITY_INTERVAL,
+    DURABILITY_ROW,
+    GroupCommitWriter,
+    append_synced,
+    recover_csv,
+)
+from ledger_format import (
+    CHANGE_DELETE,
+    CHANGE_GARBAGE,
+    CHANGE_UPDATE,
+    LEGACY_FORMAT,
+    count_ledger_ids,
+    detect_format,
+    encode_records,
+    is_change,
+    migrate_ledger,
+)
+from mapped_ledger import MappedLedger
+from profiling import span
+from snapshot import (
+    LOAD_CHUNK_ROWS,
+    LedgerLoader,
+    load_chunks,
+    merge_chunk,
+    snapshot_path,
+)
+from transaction_store import EXPENSE, INCOME, TransactionStore
+
+WRITE_BATCH_ROWS = 50000  # Rows encoded per write while importing
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+# Open the storage backend for a ledger path
+def open_storage(path, durability=DURABILITY_INTERVAL):
+    if path.lower().endswith(SQLITE_SUFFIXES):
+        return SqliteStorage(path, durability)
+    if path.endswith(("/", os.sep)) or os.path.isdir(path):
+        return PartitionedStorage(path, durability)
+    return CsvStorage(path, durability)
+
+
+# Group [(month, income, expense), ...] into [(year, income, expense), ...]
+def group_years(month_rows):
+    years = {}
+    for month, income, expense in month_rows:
+        bucket = years.setdefault(month[:4], [0, 0])
+        bucket[INCOME] += income
+        bucket[EXPENSE] += expense
+    return [(year, *bucket) for year, bucket in sorted(years.items())]
+
+
+#################### CSV ####################
+class CsvStorage:
+    def __init__(self, path, durability=DURABILITY_INTERVAL):
+        self.path = path
+        self.writer = GroupCommitWriter(self.write_rows, durability)
+        self.next_id = None  # Next free transaction ID, counted on first use
+        self.last_loader = None
+
+    def exists(self):
+        return os.path.exists(self.path) or bool(self.writer.pending)
+
+    # Truncate a torn final record left by a crash, and bring a legacy ledger
+    # to the canonical format (see ledger_format.py)
+    def recover(self, catalog):
+        truncated = recover_csv(self.path)
+        if detect_format(self.path) == LEGACY_FORMAT:
+            migrate_ledger(self.path, catalog)
+        return truncated
+
+    def loader(self):
+        self.flush()
+        self.last_loader = LedgerLoader(self.path)
+        return self.last_loader
+
+    def load(self):
+        return load_chunks(self.loader())
+
+    # Count the IDs in the ledger once; a load that read the file as it is
+    # now already knows them
+    def count_ids(self):
+        if self.next_id is None:
+            self.flush()
+            loader = self.last_loader
+            if (
+                loader is not None
+                and loader.finished
+                and not self.is_empty()
+                and os.path.getsize(self.path) == loader.size
+            ):
+                self.next_id = loader.next_id
+            else:
+                self.next_id = count_ledger_ids(self.path)
+        return self.next_id
+
+    def append(self, date_ordinal, category, transaction_type, amount, note=""):
+        transaction_id = self.count_ids()
+        self.next_id += 1
+        self.writer.append((date_ordinal, category, transaction_type, amount, note))
+        return transaction_id
+
+    # Edits and deletes are appended as change rows (see ledger_format.py)
+    def update(self, transaction_id, old_record, record):
+        self.writer.append((CHANGE_UPDATE, transaction_id, record, old_record))
+        return transaction_id
+
+    def delete(self, transaction_id, old_record):
+        self.writer.append((CHANGE_DELETE, transaction_id, None, old_record))
+
+    def flush_due(self):
+        return self.writer.flush_due()
+
+    def flush(self):
+        self.writer.flush()
+
+    # Write a batch of records and changes as CSV rows with one write and one
+    # fsync
+    def write_rows(self, records):
+        with span("storage.write_rows"):
+            append_synced(self.path, encode_records(records, self.is_empty()))
+
+    def is_empty(self):
+        return not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+
+    # Append records in batches and sync once; if anything fails the file is
+    # truncated back to where it ended, so an import lands whole or not at all
+    def import_records(self, records):
+        self.flush()
+        first_id = self.count_ids()
+        records = iter(records)
+        header = self.is_empty()
+        start = 0 if header else os.path.getsize(self.path)
+        imported = 0
+        try:
+            with open(self.path, "ab") as file:
+                while True:
+                    batch = list(islice(records, WRITE_BATCH_ROWS))
+                    if not batch:
+                        break
+                    file.write(encode_records(batch, header))
+                    header = False
+                    imported += len(batch)
+                file.flush()
+                os.fsync(file.fileno())
+        except BaseException:
+            with open(self.path, "r+b") as file:
+                file.truncate(start)
+            raise
+        self.next_id = first_id + imported
+        return range(first_id, self.next_id)
+
+    # Compaction rewrites the file, keeping every ID
+    def compactor(self):
+        self.flush()
+        if self.is_empty():
+            return None
+        return LedgerCompactor(self.path, self.flush)
+
+    # Map the ledger for random access and projected scans
+    def mapped(self):
+        self.flush()
+        return MappedLedger(self.path)
+
+    # Whether a snapshot can serve queries without parsing the whole ledger
+    def has_snapshot(self):
+        return os.path.exists(snapshot_path(self.path))
+
+    # Queries load the ledger (through the snapshot cache) and read from
+    # memory; without a snapshot, totals of a ledger without edits only scan
+    # the type, amount and date columns of the mapped file
+    def totals(self):
+        if not self.exists():
+            return 0, 0, 0
+        if not self.has_snapshot():
+            with self.mapped() as ledger:
+                if not ledger.changes:
+                    return ledger.totals()
+        return self.load()[1].totals()
+
+    def month_totals(self):
+        if not self.exists():
+            return []
+        if not self.has_snapshot():
+            with self.mapped() as ledger:
+                if not ledger.changes:
+                    return ledger.month_totals()
+        aggregates = self.load()[1]
+        return [
+            (month, *aggregates.month_totals(month)) for month in aggregates.months()
+        ]
+
+    def year_totals(self):
+        return group_years(self.month_totals())
+
+    def transactions_between(self, start_ordinal, end_ordinal):
+        if not self.exists():
+            return []
+        store = self.load()[0]
+        records = [
+            store.record(index)
+            for index in store.live_positions()
+            if start_ordinal <= store.dates[index] <= end_ordinal
+        ]
+        records.sort(key=lambda record: record[0])
+        return records
+
+    def close(self):
+        self.flush()
+
+
+#################### SQLite ####################
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    date INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    type INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    note TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS transactions_type ON transactions (type, amount);
+CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category, type);
+CREATE INDEX IF NOT EXISTS transactions_month
+    ON transactions (month, type, amount);
+"""
+
+SQLITE_CACHE_SIZE = -65536  # Page cache; negative sizes are in KiB (64 MiB)
+
+# Statements are kept as constants so sqlite3 reuses their prepared form
+SQL_INSERT = (
+    "INSERT INTO transactions (id, date, month, category, type, amount, note) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+SQL_UPDATE = (
+    "UPDATE transactions SET date = ?, month = ?, category = ?, type = ?, "
+    "amount = ?, note = ? WHERE id = ?"
+)
+SQL_DELETE = "DELETE FROM transactions WHERE id = ?"
+SQL_MAP_CATEGORY = (
+    "UPDATE transactions SET category = ? WHERE category = ? AND type = ?"
+)
+SQL_SELECT_ALL = (
+    "SELECT date, category, type, amount, note, id FROM transactions ORDER BY id"
+)
+SQL_COUNT = "SELECT COUNT(*) FROM transactions"
+SQL_NEXT_ID = "SELECT COALESCE(MAX(id), 0) + 1 FROM transactions"
+SQL_TOTALS = "SELECT type, SUM(amount) FROM transactions GROUP BY type"
+SQL_MONTH_TOTALS = (
+    "SELECT month, "
+    "SUM(CASE WHEN type = 0 THEN amount ELSE 0 END), "
+    "SUM(CASE WHEN type = 1 THEN amount ELSE 0 END) "
+    "FROM transactions GROUP BY month ORDER BY month"
+)
+SQL_BETWEEN = (
+    "SELECT date, category, type, amount, note FROM transactions "
+    "WHERE date BETWEEN ? AND ? ORDER BY date, id"
+)
+
+
+# Open a SQLite ledger connection in WAL mode with the schema in place. WAL
+# with synchronous=NORMAL can lose the last commits on power loss, so
+# per-row durability syncs every commit with synchronous=FULL.
+def connect_sqlite(path, durability=DURABILITY_INTERVAL):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    if durability == DURABILITY_ROW:
+        connection.execute("PRAGMA synchronous=FULL")
+    else:
+        connection.execute("PRAGMA synchronous=NORMAL")
+    # A larger page cache keeps index pages in memory during bulk imports
+    connection.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    connection.executescript(SQLITE_SCHEMA)
+    return connection
+
+
+# Get the date, month, category, type, amount and note parameters of a
+# transaction
+def sqlite_row(date_ordinal, category, transaction_type, amount, note=""):
+    return (
+        date_ordinal,
+        month_key(date_ordinal),
+        category,
+        transaction_type,
+        amount,
+        note,
+    )
+
+
+# Transaction IDs are the rowids of the table. Edits and deletes are plain
+# UPDATE and DELETE statements, and SQLite reuses the pages they free, so it
+# needs no compaction.
+class SqliteStorage:
+    def __init__(self, path, durability=DURABILITY_INTERVAL):
+        self.path = path
+        self.connection = None
+        self.writer = GroupCommitWriter(self.append_many, durability)
+        self.next_id = None  # Next free rowid, read on first use
+
+    # The connection is opened on first use, on the thread that uses it
+    def connect(self):
+        if self.connection is None:
+            self.connection = connect_sqlite(self.path, self.writer.durability)
+        return self.connection
+
+    def exists(self):
+        return os.path.exists(self.path) or bool(self.writer.pending)
+
+    # SQLite recovers from its own WAL; rows saved before category IDs
+    # existed get the ID of their label, through the (category, type) index
+    def recover(self, catalog):
+        if os.path.exists(self.path):
+            with self.connect() as connection:
+                connection.executemany(
+                    SQL_MAP_CATEGORY,
+                    (
+                        (category_id, label, transaction_type)
+                        for (transaction_type, label), category_id in (
+                            catalog.id_by_label.items()
+                        )
+                        if label != category_id
+                    ),
+                )
+        return 0
+
+    def loader(self):
+        self.flush()
+        return SqliteLoader(self.path)
+
+    def load(self):
+        self.flush()
+        store, aggregates = TransactionStore(), AggregateEngine()
+        for chunk, chunk_aggregates, _ in self.loader().chunks():
+            store, aggregates = merge_chunk(store, aggregates, chunk, chunk_aggregates)
+        return store, aggregates
+
+    # Get a new rowid; buffered rows are inserted with the IDs they were given
+    def allocate_id(self):
+        if self.next_id is None:
+            self.flush()
+            self.next_id = self.connect().execute(SQL_NEXT_ID).fetchone()[0]
+        self.next_id += 1
+        return self.next_id - 1
+
+    def append(self, date_ordinal, category, transaction_type, amount, note=""):
+        transaction_id = self.allocate_id()
+        self.writer.append(
+            (transaction_id, date_ordinal, category, transaction_type, amount, note)
+        )
+        return transaction_id
+
+    def update(self, transaction_id, old_record, record):
+        self.writer.append((CHANGE_UPDATE, transaction_id, record, old_record))
+        return transaction_id
+
+    def delete(self, transaction_id, old_record):
+        self.writer.append((CHANGE_DELETE, transaction_id, None, old_record))
+
+    def flush_due(self):
+        return self.writer.flush_due()
+
+    def flush(self):
+        self.writer.flush()
+
+    # Run buffered (id, date, category, type, amount, note) inserts and
+    # changes in order, in one transaction
+    def append_many(self, items):
+        connection = self.connect()
+        with connection:
+            inserts = []
+            for item in items:
+                if not is_change(item):
+                    inserts.append((item[0], *sqlite_row(*item[1:])))
+                    continue
+                if inserts:
+                    connection.executemany(SQL_INSERT, inserts)
+                    inserts = []
+                _, transaction_id, record, _ = item
+                if record is None:
+                    connection.execute(SQL_DELETE, (transaction_id,))
+                else:
+                    connection.execute(
+                        SQL_UPDATE, (*sqlite_row(*record), transaction_id)
+                    )
+            if inserts:
+                connection.executemany(SQL_INSERT, inserts)
+
+    # One SQLite transaction holds every record
+    def import_records(self, records):
+        self.flush()
+        first_id = self.allocate_id()
+        self.next_id = first_id
+        try:
+            self.append_many((self.allocate_id(), *record) for record in records)
+        except BaseException:
+            self.next_id = first_id
+            raise
+        return range(first_id, self.next_id)
+
+    # SQLite reuses freed pages itself
+    def compactor(self):
+        return None
+
+    def totals(self):
+        self.flush()
+        sums = [0, 0]
+        for transaction_type, total in self.connect().execute(SQL_TOTALS):
+            sums[transaction_type] = total
+        income, expense = sums
+        return income, expense, income - expense
+
+    def month_totals(self):
+        self.flush()
+        return self.connect().execute(SQL_MONTH_TOTALS).fetchall()
+
+    def year_totals(self):
+        return group_years(self.month_totals())
+
+    def transactions_between(self, start_ordinal, end_ordinal):
+        self.flush()
+        cursor = self.connect().execute(SQL_BETWEEN, (start_ordinal, end_ordinal))
+        return cursor.fetchall()
+
+    def close(self):
+        self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+# Reads a SQLite ledger in chunks with its own connection, so it can run on
+# a worker thread
+class SqliteLoader:
+    def __init__(self, path, chunk_rows=LOAD_CHUNK_ROWS):
+        self.path = path
+        self.chunk_rows = chunk_rows
+
+    def chunks(self):
+        connection = connect_sqlite(self.path)
+        try:
+            total = connection.execute(SQL_COUNT).fetchone()[0]
+            cursor = connection.execute(SQL_SELECT_ALL)
+            loaded = 0
+            while True:
+                rows = cursor.fetchmany(self.chunk_rows)
+                if not rows:
+                    break
+                store = TransactionStore()
+                for row in rows:
+                    store.append(*row)  # Rows end with the transaction ID
+                loaded += len(rows)
+                yield store, AggregateEngine.from_store(store), loaded / max(total, 1)
+        finally:
+            connection.close()
+
+    # SQLite needs no snapshot cache
+    def save_snapshot(self, store, aggregates):
+        pass
+
+
+#################### Partitioned ####################
+MANIFEST_FILE = "manifest.json"
+MANIFEST_FORMAT = 1
+PARTITION_BY = "month"  # Span of each partition of a new partitioned ledger
+PARTITION_SUFFIX = ".csv"
+PARTITION_ID_BITS = 32  # Low bits of a transaction ID: its ID in the partition
+
+
+# Get the "YYYY" year key of a day ordinal
+def year_key(date_ordinal):
+    return month_key(date_ordinal)[:4]
+
+
+PARTITION_KEYS = {"month": month_key, "year": year_key}
+
+
+# Get the first transaction ID of a partition: its key as a number
+# (202405 for "2024-05") in the high bits
+def partition_id_base(key):
+    return int(key.replace("-", "")) << PARTITION_ID_BITS
+
+
+# Get the key of the partition holding a transaction ID
+def partition_key(transaction_id, partition_by):
+    number = transaction_id >> PARTITION_ID_BITS
+    if partition_by == "month":
+        return f"{number // 100:04d}-{number % 100:02d}"
+    return f"{number:04d}"
+
+
+# A ledger split into canonical CSV files named after their month or year
+# ("2024-05.csv"), each with its own snapshot cache, and a manifest holding
+# the size, mtime, aggregates, ID count and garbage rows of every partition.
+# The manifest is a cache: recover() rebuilds any entry whose partition no
+# longer matches it. Transaction IDs are partition_id_base() plus the ID of
+# the row within its partition file.
+class PartitionedStorage:
+    def __init__(self, path, durability=DURABILITY_INTERVAL, partition_by=PARTITION_BY):
+        self.path = path
+        self.manifest_path = os.path.join(path, MANIFEST_FILE)
+        self.partition_by = partition_by
+        self.partitions = {}  # key -> {"size", "mtime", "aggregates", "ids", "garbage"}
+        # key -> next ID within the partition, buffered rows included
+        self.next_ids = {}
+        self.writer = GroupCommitWriter(self.write_rows, durability)
+        self.read_manifest()
+
+    def exists(self):
+        return bool(self.partitions) or bool(self.writer.pending)
+
+    def partition_path(self, key):
+        return os.path.join(self.path, key + PARTITION_SUFFIX)
+
+    # Get the keys of the partitions that may hold days between start and end
+    # (None for an open end), in date order
+    def partition_keys(self, start_ordinal=None, end_ordinal=None):
+        key_of = PARTITION_KEYS[self.partition_by]
+        keys = sorted(self.partitions)
+        if start_ordinal is not None:
+            keys = [key for key in keys if key >= key_of(start_ordinal)]
+        if end_ordinal is not None:
+            keys = [key for key in keys if key <= key_of(end_ordinal)]
+        return keys
+
+    # Group records by the key of the partition they belong to, and changes
+    # by the partition of the transaction they change
+    def group_partitions(self, records):
+        key_of = PARTITION_KEYS[self.partition_by]
+        groups = {}
+        for record in records:
+            if is_change(record):
+                key = partition_key(record[1], self.partition_by)
+            else:
+                key = key_of(record[0])
+            groups.setdefault(key, []).append(record)
+        return groups
+
+    # Get a new transaction ID in the partition of key
+    def allocate_id(self, key):
+        local_id = self.next_ids.get(key)
+        if local_id is None:
+            local_id = self.partitions.get(key, {}).get("ids", 0)
+        self.next_ids[key] = local_id + 1
+        return partition_id_base(key) + local_id
+
+    #################### Manifest ####################
+    # Read the manifest; an unreadable one is rebuilt by recover()
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return
+        if manifest["format"] > MANIFEST_FORMAT:
+            raise ValueError(f"{self.manifest_path} is newer than this version")
+        self.partition_by = manifest["partition_by"]
+        # Manifests written before edits existed have no ID counts, and then
+        # every row of a partition is live
+        self.partitions = {
+            key: {
+                "size": entry["size"],
+                "mtime": entry["mtime"],
+                "aggregates": AggregateEngine.from_json(entry["aggregates"]),
+                "ids": entry.get("ids", entry["rows"]),
+                "garbage": entry.get("garbage", 0),
+            }
+            for key, entry in manifest["partitions"].items()
+        }
+
+    # Replace the manifest in one rename; it is not synced, since a stale
+    # entry is detected by its size and mtime and rebuilt
+    def write_manifest(self):
+        manifest = {
+            "format": MANIFEST_FORMAT,
+            "partition_by": self.partition_by,
+            "partitions": {
+                key: {
+                    "rows": entry["aggregates"].count,
+                    "size": entry["size"],
+                    "mtime": entry["mtime"],
+                    "aggregates": entry["aggregates"].to_json(),
+                    "ids": entry["ids"],
+                    "garbage": entry["garbage"],
+                }
+                for key, entry in sorted(self.partitions.items())
+            },
+        }
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, ensure_ascii=False)
+        os.replace(temp_path, self.manifest_path)
+
+    # Add aggregates and garbage of rows just written to a partition and
+    # record its new size, mtime and ID count; no rows of it are buffered
+    def update_partition(self, key, aggregates, garbage=0):
+        stat = os.stat(self.partition_path(key))
+        entry = self.partitions.setdefault(
+            key, {"aggregates": AggregateEngine(), "ids": 0, "garbage": 0}
+        )
+        entry["aggregates"].merge(aggregates)
+        entry["size"] = stat.st_size
+        entry["mtime"] = stat.st_mtime
+        entry["ids"] = self.next_ids.get(key, entry["ids"])
+        entry["garbage"] += garbage
+
+    # Repair partitions changed behind the manifest's back (a crash during a
+    # write or an outside edit): truncate a torn final record and rebuild
+    # their entries. Partitions that still match their entry are untouched;
+    # they were always written with category IDs, so catalog is not needed.
+    def recover(self, catalog):
+        os.makedirs(self.path, exist_ok=True)
+        keys = {
+            name[: -len(PARTITION_SUFFIX)]
+            for name in os.listdir(self.path)
+            if name.endswith(PARTITION_SUFFIX)
+        }
+        truncated = 0
+        changed = False
+        for key in sorted(keys | self.partitions.keys()):
+            path = self.partition_path(key)
+            if key not in keys:
+                del self.partitions[key]
+                changed = True
+                continue
+            stat = os.stat(path)
+            entry = self.partitions.get(key)
+            if entry is not None and (entry["size"], entry["mtime"]) == (
+                stat.st_size,
+                stat.st_mtime,
+            ):
+                continue
+            truncated += recover_csv(path)
+            stat = os.stat(path)
+            loader = LedgerLoader(path, id_base=partition_id_base(key))
+            store, aggregates = load_chunks(loader)
+            self.partitions[key] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "aggregates": aggregates,
+                "ids": loader.next_id - loader.id_base,
+                "garbage": store.garbage,
+            }
+            self.next_ids.pop(key, None)
+            changed = True
+        if changed:
+            self.write_manifest()
+        return truncated
+
+    #################### Read ####################
+    def loader(self):
+        self.flush()
+        return PartitionLoader(
+            [
+                (self.partition_path(key), partition_id_base(key))
+                for key in self.partition_keys()
+            ]
+        )
+
+    def load(self):
+        return load_chunks(self.loader())
+
+    # Totals come from the manifest without reading any partition
+    def totals(self):
+        self.flush()
+        income = expense = 0
+        for entry in self.partitions.values():
+            income += entry["aggregates"].by_type[INCOME]
+            expense += entry["aggregates"].by_type[EXPENSE]
+        return income, expense, income - expense
+
+    def month_totals(self):
+        self.flush()
+        months = AggregateEngine()
+        for entry in self.partitions.values():
+            months.merge(entry["aggregates"])
+        return [(month, *months.month_totals(month)) for month in months.months()]
+
+    def year_totals(self):
+        return group_years(self.month_totals())
+
+    # Only the partitions overlapping the range are read
+    def transactions_between(self, start_ordinal, end_ordinal):
+        self.flush()
+        records = []
+        for key in self.partition_keys(start_ordinal, end_ordinal):
+            loader = LedgerLoader(
+                self.partition_path(key), id_base=partition_id_base(key)
+            )
+            store = load_chunks(loader)[0]
+            records.extend(
+                store.record(index)
+                for index in store.live_positions()
+                if start_ordinal <= store.dates[index] <= end_ordinal
+            )
+        records.sort(key=lambda record: record[0])
+        return records
+
+    #################### Write ####################
+    def append(self, date_ordinal, category, transaction_type, amount, note=""):
+        transaction_id = self.allocate_id(
+            PARTITION_KEYS[self.partition_by](date_ordinal)
+        )
+        self.writer.append((date_ordinal, category, transaction_type, amount, note))
+        return transaction_id
+
+    # A new date in another partition moves the transaction there, under a
+    # new ID
+    def update(self, transaction_id, old_record, record):
+        key = partition_key(transaction_id, self.partition_by)
+        if PARTITION_KEYS[self.partition_by](record[0]) != key:
+            self.delete(transaction_id, old_record)
+            return self.append(*record)
+        self.writer.append((CHANGE_UPDATE, transaction_id, record, old_record))
+        return transaction_id
+
+    def delete(self, transaction_id, old_record):
+        self.writer.append((CHANGE_DELETE, transaction_id, None, old_record))
+
+    def flush_due(self):
+        return self.writer.flush_due()
+
+    def flush(self):
+        self.writer.flush()
+
+    # Write a batch of records and changes with one write and one fsync per
+    # partition touched, then update the manifest; if a write fails the
+    # partitions already written are truncated back, so the batch can be
+    # retried whole
+    def write_rows(self, records):
+        with span("storage.write_rows"):
+            os.makedirs(self.path, exist_ok=True)
+            groups = self.group_partitions(records)
+            starts = {}  # key -> size before the write, None for new partitions
+            try:
+                for key, rows in groups.items():
+                    path = self.partition_path(key)
+                    starts[key] = (
+                        os.path.getsize(path) if os.path.exists(path) else None
+                    )
+                    append_synced(
+                        path,
+                        encode_records(rows, not starts[key], partition_id_base(key)),
+                    )
+            except BaseException:
+                self.truncate_partitions(starts)
+                raise
+            for key, rows in groups.items():
+                self.update_partition(
+                    key,
+                    aggregate_records(rows),
+                    sum(CHANGE_GARBAGE[row[0]] for row in rows if is_change(row)),
+                )
+            self.write_manifest()
+
+    # Append records in batches and sync every partition once; if anything
+    # fails each partition is truncated back (or removed if it is new), so an
+    # import lands whole or not at all
+    def import_records(self, records):
+        self.flush()
+        os.makedirs(self.path, exist_ok=True)
+        records = iter(records)
+        starts = {}  # key -> size before the import, None for new partitions
+        imported = {}  # key -> aggregates of the imported records
+        next_ids = dict(self.next_ids)
+        ids = []
+        key_of = PARTITION_KEYS[self.partition_by]
+        try:
+            while True:
+                batch = list(islice(records, WRITE_BATCH_ROWS))
+                if not batch:
+                    break
+                ids.extend(self.allocate_id(key_of(record[0])) for record in batch)
+                for key, rows in self.group_partitions(batch).items():
+                    path = self.partition_path(key)
+                    if key not in starts:
+                        starts[key] = (
+                            os.path.getsize(path) if os.path.exists(path) else None
+                        )
+                    with open(path, "ab") as file:
+                        file.write(encode_records(rows, not file.tell()))
+                    imported.setdefault(key, AggregateEngine()).merge(
+                        aggregate_records(rows)
+                    )
+            for key in starts:
+                with open(self.partition_path(key), "ab") as file:
+                    os.fsync(file.fileno())
+        except BaseException:
+            self.next_ids = next_ids
+            self.truncate_partitions(starts)
+            raise
+        for key, aggregates in imported.items():
+            self.update_partition(key, aggregates)
+        if imported:
+            self.write_manifest()
+        return ids
+
+    # Cut partitions back to their sizes before a failed write, removing the
+    # ones it created (starts maps key -> size, None for new partitions)
+    def truncate_partitions(self, starts):
+        for key, start in starts.items():
+            path = self.partition_path(key)
+            if start is None:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            with open(path, "r+b") as file:
+                file.truncate(start)
+
+    # Compact the partitions holding rows left behind by edits and deletes
+    def compactor(self):
+        self.flush()
+        keys = [key for key, entry in self.partitions.items() if entry["garbage"]]
+        if not keys:
+            return None
+        return PartitionCompactor(self, keys)
+
+    def close(self):
+        self.flush()
+
+
+# Get the aggregates of a list of (date, category, type, amount, note)
+# records and change items
+def aggregate_records(records):
+    aggregates = AggregateEngine()
+    for record in records:
+        if is_change(record):
+            _, _, new_record, old_record = record
+            aggregates.remove(*old_record[:4])
+            if new_record is not None:
+                aggregates.add(*new_record[:4])
+            continue
+        date_ordinal, category, transaction_type, amount, _ = record
+        aggregates.add(date_ordinal, category, transaction_type, amount)
+    return aggregates
+
+
+# Compacts the given partitions one after another (see compaction.py) and
+# records their new size and mtime in the manifest
+class PartitionCompactor:
+    def __init__(self, storage, keys):
+        self.storage = storage
+        self.compactors = {
+            key: LedgerCompactor(storage.partition_path(key)) for key in keys
+        }
+        # Garbage written after this point survives the compaction
+        self.garbage = {key: storage.partitions[key]["garbage"] for key in keys}
+
+    def run(self):
+        for compactor in self.compactors.values():
+            compactor.run()
+
+    def finish(self):
+        self.storage.flush()
+        dropped = 0
+        for key, compactor in self.compactors.items():
+            dropped += compactor.finish()
+            stat = os.stat(compactor.path)
+            entry = self.storage.partitions[key]
+            entry["size"] = stat.st_size
+            entry["mtime"] = stat.st_mtime
+            entry["garbage"] -= self.garbage[key]
+        self.storage.write_manifest()
+        return dropped
+
+    def cancel(self):
+        for compactor in self.compactors.values():
+            compactor.cancel()
+
+
+# Reads the given (path, first transaction ID) partitions in order, one whole
+# partition per chunk, each through its own snapshot cache. The partition
+# loaders are created up front, so rows appended while loading are left for
+# the next load.
+class PartitionLoader:
+    def __init__(self, partitions):
+        self.loaders = [
+            LedgerLoader(path, id_base=id_base) for path, id_base in partitions
+        ]
+
+    def chunks(self):
+        total = max(sum(loader.size for loader in self.loaders), 1)
+        loaded = 0
+        for loader in self.loaders:
+            store, aggregates = load_chunks(loader)
+            loaded += loader.size
+            yield store, aggregates, loaded / total
+
+    # Every partition saves its own snapshot as it is loaded
+    def save_snapshot(self, store, aggregates):
+        pass
+
+
+#################### Migration ####################
+# Copy every transaction of a CSV ledger into a new SQLite ledger in one
+# transaction, streaming the CSV chunk by chunk; returns the rows copied
+def migrate_csv_to_sqlite(csv_path, db_path, catalog):
+    CsvStorage(csv_path).recover(catalog)
+    storage = SqliteStorage(db_path)
+    connection = storage.connect()
+    if connection.execute(SQL_COUNT).fetchone()[0]:
+        storage.close()
+        raise ValueError(f"{db_path} already contains transactions")
+    # Rows keep their IDs, and the changes of each chunk become updates and
+    # deletes of the rows inserted before them
+    with connection:
+        for chunk, _, _ in LedgerLoader(csv_path).chunks():
+            connection.executemany(
+                SQL_INSERT,
+                (
+                    (chunk.ids[i], *sqlite_row(*chunk.record(i)))
+                    for i in chunk.live_positions()
+                ),
+            )
+            for transaction_id, record in chunk.changes:
+                if record is None:
+                    connection.execute(SQL_DELETE, (transaction_id,))
+                else:
+                    connection.execute(
+                        SQL_UPDATE, (*sqlite_row(*record), transaction_id)
+                    )
+    copied = connection.execute(SQL_COUNT).fetchone()[0]
+    storage.close()
+    return copied
+
+
+# Split a CSV ledger into a new partitioned ledger, streaming a compacted
+# copy of the CSV chunk by chunk; returns the rows copied. Transactions get
+# new IDs in their partitions.
+def migrate_csv_to_partitions(csv_path, directory, catalog, partition_by=PARTITION_BY):
+    CsvStorage(csv_path).recover(catalog)
+    storage = PartitionedStorage(directory, DURABILITY_EXIT, partition_by)
+    compactor = LedgerCompactor(csv_path)
+    try:
+        if storage.exists():
+            raise ValueError(f"{directory} already contains transactions")
+        compactor.run()
+        storage.import_records(
+            record
+            for chunk, _, _ in LedgerLoader(compactor.temp_path).chunks()
+            for record in chunk
+        )
+    finally:
+        compactor.cancel()
+        storage.close()
+    return sum(entry["aggregates"].count for entry in storage.partitions.values())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4) or sys.argv[3:] not in ([], ["month"], ["year"]):
+        sys.exit(
+            "Usage: python storage.py LEDGER.csv LEDGER.db\n"
+            "       python storage.py LEDGER.csv LEDGER_DIR/ [month|year]"
+        )
+    catalog = load_categories()  # Legacy category labels are migrated to IDs
+    source, target = sys.argv[1:3]
+    if target.lower().endswith(SQLITE_SUFFIXES):
+        copied = migrate_csv_to_sqlite(source, target, catalog)
+    else:
+        copied = migrate_csv_to_partitions(source, target, catalog, *sys.argv[3:])
+    print(f"Migrated {copied} transactions")
@@ -0,0 +1,95 @@
+"""
+Tests for the streaming CSV and PDF writers in export.py
+
+The PDF test needs matplotlib, which the GUI only imports on a PDF export,
+and is skipped where it is not installed.
+"""
+
+import csv, importlib.util, os, tempfile, unittest, warnings
+
+from export import export_csv, export_pdf, iter_records
+from transaction_store import EXPENSE, INCOME, TransactionStore
+
+
+# Build a store of count rows with the row at position 1 deleted
+def build_store(count):
+    store = TransactionStore()
+    for index in range(count):
+        store.append(
+            739000 + index,
+            "food",
+            INCOME if index % 4 == 0 else EXPENSE,
+            1000 + index,
+            f"note {index}",
+            index,
+        )
+    store.delete(1)
+    return store
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = build_store(95)
+        self.total = len(self.store) - self.store.deleted_count
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_csv_export_writes_live_rows(self):
+        path = os.path.join(self.directory.name, "export.csv")
+        progress = []
+
+        completed = export_csv(
+            path,
+            iter_records(self.store),
+            self.total,
+            str.upper,
+            progress.append,
+            lambda: False,
+        )
+        self.assertTrue(completed)
+        with open(path, encoding="utf-8", newline="") as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(len(rows), self.total + 1)
+        self.assertEqual(rows[1][1:], ["FOOD", "income", "10.00", "note 0"])
+        self.assertNotIn("note 1", [row[4] for row in rows])
+        self.assertEqual(progress[-1], 1.0)
+
+    def test_cancelled_csv_export_leaves_no_file(self):
+        path = os.path.join(self.directory.name, "export.csv")
+
+        completed = export_csv(
+            path, iter_records(self.store), self.total, str, len, lambda: True
+        )
+        self.assertFalse(completed)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    @unittest.skipUnless(
+        importlib.util.find_spec("matplotlib"), "matplotlib is not installed"
+    )
+    def test_pdf_export_writes_one_page_per_batch(self):
+        path = os.path.join(self.directory.name, "export.pdf")
+        progress = []
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # Missing glyphs of fallback fonts
+            completed = export_pdf(
+                path,
+                iter_records(self.store),
+                self.total,
+                str,
+                ("Date", "Category", "Type", "Amount", "Note"),
+                progress.append,
+                lambda: False,
+            )
+        self.assertTrue(completed)
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(5), b"%PDF-")
+        self.assertEqual(len(progress), 3)
+        self.assertEqual(progress[-1], 1.0)
+        self.assertEqual(os.listdir(self.directory.name), ["export.pdf"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Tests for the bank-statement importer in importer.py
+"""
+
+import csv, os, tempfile, unittest
+
+from categories import load_categories
+from importer import content_keys, import_statement
+from transaction_store import EXPENSE, INCOME, TransactionStore
+
+CATEGORIES = os.path.join(os.path.dirname(__file__), os.pardir, "categories.json")
+
+
+class ImportStatementTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "statement.csv")
+        self.catalog = load_categories(CATEGORIES)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_statement(self, rows):
+        with open(self.path, "w", encoding="utf-8", newline="") as file:
+            csv.writer(file).writerows(rows)
+
+    def imported(self, store):
+        return [
+            (store.types[index], store.amounts[index], store.note(index))
+            for index in store.live_positions()
+        ]
+
+    def test_debit_and_credit_cells(self):
+        self.write_statement(
+            [
+                ["Date", "Description", "Debit", "Credit"],
+                ["01/08/2025", "coffee", "45.00", ""],
+                ["02/08/2025", "salary", "0.00", "30,000.00"],
+                ["03/08/2025", "refund", "", "120.50"],
+                ["04/08/2025", "bank fee", "-15.00", "0.00"],
+                ["05/08/2025", "broken", "abc", ""],
+            ]
+        )
+
+        store, duplicates, invalid = import_statement(self.path, self.catalog)
+        self.assertEqual(
+            self.imported(store),
+            [
+                (EXPENSE, 4500, "coffee"),
+                (INCOME, 3000000, "salary"),
+                (INCOME, 12050, "refund"),
+                (EXPENSE, 1500, "bank fee"),
+            ],
+        )
+        self.assertEqual((duplicates, invalid), (0, 1))
+
+    def test_duplicates_are_skipped_as_often_as_the_ledger_holds_them(self):
+        existing = TransactionStore()
+        existing.append(739464, "food", EXPENSE, 4500, "coffee")
+        self.write_statement(
+            [
+                ["Date", "Amount", "Note"],
+                ["2025-08-01", "-45", "coffee"],
+                ["2025-08-01", "-45", "coffee"],
+            ]
+        )
+
+        store, duplicates, invalid = import_statement(self.path, self.catalog, existing)
+        self.assertEqual(self.imported(store), [(EXPENSE, 4500, "coffee")])
+        self.assertEqual((duplicates, invalid), (1, 0))
+        self.assertEqual(content_keys(existing), {(739464, EXPENSE, 4500, "coffee"): 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
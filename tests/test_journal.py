@@ -0,0 +1,90 @@
+"""
+Tests for crash recovery of CSV ledgers in journal.py
+"""
+
+import os, tempfile, unittest
+
+from journal import DURABILITY_EXIT, GroupCommitWriter, recover_csv
+from ledger_format import LEDGER_HEADER
+
+CANONICAL_ROWS = (
+    "2025-08-29,salary,income,3453453400,salary\n"
+    "2025-08-30,groceries,expense,12050,market\n"
+)
+
+
+class RecoverCsvTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "transactions.csv")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_ledger(self, text):
+        with open(self.path, "w", encoding="utf-8", newline="") as file:
+            file.write(text)
+
+    def read_ledger(self):
+        with open(self.path, encoding="utf-8", newline="") as file:
+            return file.read()
+
+    def test_torn_final_record_is_truncated(self):
+        self.write_ledger(LEDGER_HEADER + CANONICAL_ROWS + "2025-08-31,rent,exp")
+
+        self.assertEqual(recover_csv(self.path), len("2025-08-31,rent,exp"))
+        self.assertEqual(self.read_ledger(), LEDGER_HEADER + CANONICAL_ROWS)
+
+    def test_torn_quoted_note_is_truncated(self):
+        self.write_ledger(
+            LEDGER_HEADER + CANONICAL_ROWS + '2025-08-31,rent,expense,1,"a'
+        )
+
+        recover_csv(self.path)
+        self.assertEqual(self.read_ledger(), LEDGER_HEADER + CANONICAL_ROWS)
+
+    def test_complete_final_record_gets_its_newline(self):
+        last_row = "2025-08-31,rent_mortgage_payment,expense,34234400,rent"
+        self.write_ledger(LEDGER_HEADER + CANONICAL_ROWS + last_row)
+
+        self.assertEqual(recover_csv(self.path), 0)
+        self.assertEqual(
+            self.read_ledger(), LEDGER_HEADER + CANONICAL_ROWS + last_row + "\n"
+        )
+
+    def test_legacy_ledger_is_left_untouched(self):
+        legacy = (
+            "Date,Category,Type,Amount,Note\n"
+            "29-08-2025,เงินเดือน,income,34534534.0,salary\n"
+            "30-08-2025,Groceries,expense,120.5,market"
+        )
+        self.write_ledger(legacy)
+
+        self.assertEqual(recover_csv(self.path), 0)
+        self.assertEqual(self.read_ledger(), legacy)
+
+
+class GroupCommitWriterTest(unittest.TestCase):
+    def test_failed_write_keeps_the_batch(self):
+        written = []
+
+        def write_batch(batch):
+            if not written:
+                written.append(None)
+                raise OSError("No space left on device")
+            written.append(list(batch))
+
+        writer = GroupCommitWriter(write_batch, DURABILITY_EXIT)
+        writer.append("a")
+        writer.append("b")
+        with self.assertRaises(OSError):
+            writer.flush()
+        self.assertEqual(writer.pending, ["a", "b"])
+
+        writer.flush()
+        self.assertEqual(written[-1], ["a", "b"])
+        self.assertEqual(writer.pending, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
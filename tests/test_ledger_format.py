@@ -0,0 +1,109 @@
+"""
+Regression tests for the legacy ledger migrator in ledger_format.py
+
+The ledgers are built from rows in the exact shapes the baseline GUIs wrote:
+budget_tracker.py with a header, DD-MM-YYYY dates and localized category
+labels, and preview.py without a header as date,category,desc,amount.
+"""
+
+import csv, os, tempfile, unittest
+
+from categories import load_categories
+from ledger_format import LEDGER_HEADER, LEGACY_SUFFIX, migrate_ledger
+
+CATEGORIES = os.path.join(os.path.dirname(__file__), os.pardir, "categories.json")
+
+BUDGET_TRACKER_ROWS = [
+    ["Date", "Category", "Type", "Amount", "Note"],
+    ["29-08-2025", "เงินเดือน", "income", "34534534.0", "salary"],
+    ["29-08-2025", "ค่าเช่าที่พัก/ผ่อนบ้าน", "expense", "342344.0", "rent"],
+    ["30-08-2025", "Groceries", "expense", "120.5", "market"],
+]
+PREVIEW_ROWS = [
+    ["2025-08-01", "อาหาร", "ข้าวมันไก่", "50"],
+    ["2025-08-02", "การเดินทาง", "BTS", "44.5"],
+    ["2025-08-03", "รายรับ", "ขายของ", "1000"],
+    ["2025-08-04", "อื่นๆ", "ของขวัญ", "250"],
+]
+
+
+class MigrateLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "transactions.csv")
+        self.catalog = load_categories(CATEGORIES)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_ledger(self, rows):
+        with open(self.path, "w", encoding="utf-8", newline="") as file:
+            csv.writer(file).writerows(rows)
+
+    def read_records(self, path):
+        with open(path, encoding="utf-8", newline="") as file:
+            self.assertEqual(file.readline() + file.readline(), LEDGER_HEADER)
+            return list(csv.reader(file))
+
+    def test_mixed_baseline_rows_are_all_migrated(self):
+        self.write_ledger(BUDGET_TRACKER_ROWS + PREVIEW_ROWS)
+        with open(self.path, "rb") as file:
+            original = file.read()
+
+        self.assertEqual(migrate_ledger(self.path, self.catalog), (7, 0))
+        self.assertEqual(
+            self.read_records(self.path),
+            [
+                ["2025-08-29", "salary", "income", "3453453400", "salary"],
+                ["2025-08-29", "rent_mortgage_payment", "expense", "34234400", "rent"],
+                ["2025-08-30", "groceries", "expense", "12050", "market"],
+                [
+                    "2025-08-01",
+                    "dining_out_restaurants",
+                    "expense",
+                    "5000",
+                    "ข้าวมันไก่",
+                ],
+                ["2025-08-02", "public_transportation_fare", "expense", "4450", "BTS"],
+                ["2025-08-03", "miscellaneous_income", "income", "100000", "ขายของ"],
+                ["2025-08-04", "miscellaneous_expenses", "expense", "25000", "ของขวัญ"],
+            ],
+        )
+        with open(self.path + LEGACY_SUFFIX, "rb") as file:
+            self.assertEqual(file.read(), original)
+
+    def test_preview_rows_map_to_catalog_ids_and_keep_type_and_note(self):
+        self.write_ledger(PREVIEW_ROWS)
+        target = self.path + ".out"
+
+        self.assertEqual(migrate_ledger(self.path, self.catalog, target), (4, 0))
+        rows = self.read_records(target)
+        self.assertEqual(
+            [row[1] for row in rows],
+            [
+                "dining_out_restaurants",
+                "public_transportation_fare",
+                "miscellaneous_income",
+                "miscellaneous_expenses",
+            ],
+        )
+        self.assertTrue(all(row[1] in self.catalog.all_ids for row in rows))
+        self.assertEqual(
+            [row[2] for row in rows], ["expense", "expense", "income", "expense"]
+        )
+        self.assertEqual([row[4] for row in rows], [row[2] for row in PREVIEW_ROWS])
+        self.assertFalse(os.path.exists(self.path + LEGACY_SUFFIX))
+
+    def test_preview_row_labels_are_mapped_through_the_catalog(self):
+        self.write_ledger([["2025-08-05", "ค่าไฟ", "บิลเดือนสิงหาคม", "812.25"]])
+        target = self.path + ".out"
+
+        self.assertEqual(migrate_ledger(self.path, self.catalog, target), (1, 0))
+        self.assertEqual(
+            self.read_records(target),
+            [["2025-08-05", "electricity_bill", "expense", "81225", "บิลเดือนสิงหาคม"]],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
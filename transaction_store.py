@@ -0,0 +1,330 @@
+"""
+Columnar transaction store for Budget Tracker
+
+Transactions are kept column by column in compact typed arrays instead of
+one dict of strings per row:
+
+- amounts as integer minor units (satang) in an array of signed 64-bit ints
+- dates as day ordinals (datetime.date.toordinal)
+- types as one byte per row (0 = income, 1 = expense)
+- categories as interned ids into a shared list of stable category IDs
+  (see categories.py)
+- notes as UTF-8 bytes in a single string pool addressed by offsets
+- stable transaction IDs (see ledger_format.py), ascending in ledger order,
+  and a deleted flag per row; edits overwrite a row in place, deletes only
+  set its flag, so store positions never move
+"""
+
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+from itertools import compress
+
+# Transaction types, indexed by the value stored in the type column
+TRANSACTION_TYPES = ("income", "expense")
+INCOME = 0
+EXPENSE = 1
+
+# Amounts are stored in minor units (1 baht = 100 satang)
+MINOR_UNITS = 100
+
+# Date formats accepted when reading a ledger
+DATE_FORMATS = ("%d-%m-%Y", "%Y-%m-%d")
+DISPLAY_DATE_FORMAT = "%d-%m-%Y"
+
+# Turns the deleted column into a live mask for itertools.compress
+LIVE_MASK = bytes([1]) + bytes(255)
+
+
+#################### Value conversion ####################
+# Parse an amount string ("1234.5", "1,234.50") into integer minor units
+def parse_amount(text):
+    try:
+        value = Decimal(str(text).replace(",", "").strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {text!r}")
+    if not value.is_finite():
+        raise ValueError(f"Invalid amount: {text!r}")
+    return int((value * MINOR_UNITS).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+# Format integer minor units as "1,234.56"
+def format_amount(minor):
+    sign = "-" if minor < 0 else ""
+    units, cents = divmod(abs(minor), MINOR_UNITS)
+    return f"{sign}{units:,}.{cents:02d}"
+
+
+# Format integer minor units as a plain decimal "1234.56" for storage
+def format_decimal(minor):
+    sign = "-" if minor < 0 else ""
+    units, cents = divmod(abs(minor), MINOR_UNITS)
+    return f"{sign}{units}.{cents:02d}"
+
+
+# Parse a DD-MM-YYYY or YYYY-MM-DD date string into a day ordinal
+def parse_date(text):
+    text = text.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).toordinal()
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid date: {text!r}")
+
+
+# Format a day ordinal as DD-MM-YYYY; ledgers repeat the same few thousand
+# days, so results are cached instead of calling strftime per row
+@lru_cache(maxsize=None)
+def format_date(ordinal):
+    return date.fromordinal(ordinal).strftime(DISPLAY_DATE_FORMAT)
+
+
+# Get the type column value of "income" or "expense"
+def parse_type(text):
+    try:
+        return TRANSACTION_TYPES.index(text.strip())
+    except ValueError:
+        raise ValueError(f"Invalid transaction type: {text!r}")
+
+
+class TransactionStore:
+    #################### Initiation ####################
+    def __init__(self):
+        # Columns, one entry per transaction
+        self.amounts = array("q")
+        self.dates = array("l")
+        self.types = bytearray()
+        self.category_ids = array("L")
+        # Note i is note_pool[note_offsets[i]:note_offsets[i + 1]]
+        self.note_offsets = array("Q", [0])
+        self.ids = array("Q")
+        self.deleted = bytearray()  # 1 for deleted rows
+
+        # Interned category names and note string pool
+        self.categories = []
+        self.category_lookup = {}
+        self.note_pool = bytearray()
+
+        # Transaction IDs: the next one to assign, and an ID -> position map,
+        # only built once IDs stop ascending (otherwise positions are found by
+        # binary search)
+        self.next_id = 0
+        self.ids_ascending = True
+        self.id_positions = None
+
+        # Edits and deletes
+        self.note_overrides = {}  # position -> edited note, the pool is append-only
+        self.changes = []  # Parsed change rows not yet applied, see merge_chunk()
+        self.deleted_count = 0
+        self.garbage = 0  # Ledger rows compaction would drop, see CHANGE_GARBAGE
+
+    def __len__(self):
+        return len(self.amounts)
+
+    # Iterate over the (date ordinal, category, type, amount, note) tuples of
+    # live transactions
+    def __iter__(self):
+        for index in self.live_positions():
+            yield self.record(index)
+
+    #################### Insert ####################
+    # Get the id of a category name, adding it on first use
+    def intern_category(self, category):
+        category_id = self.category_lookup.get(category)
+        if category_id is None:
+            category_id = len(self.categories)
+            self.categories.append(category)
+            self.category_lookup[category] = category_id
+        return category_id
+
+    # Append a parsed transaction and return its index; without an ID it
+    # gets the next one
+    def append(
+        self,
+        date_ordinal,
+        category,
+        transaction_type,
+        amount,
+        note="",
+        transaction_id=None,
+    ):
+        if transaction_id is None:
+            transaction_id = self.next_id
+            self.next_id += 1
+        else:
+            self.add_id(transaction_id)
+        self.ids.append(transaction_id)
+        self.deleted.append(0)
+        self.amounts.append(amount)
+        self.dates.append(date_ordinal)
+        self.types.append(transaction_type)
+        self.category_ids.append(self.intern_category(category))
+        self.note_pool += note.encode("utf-8")
+        self.note_offsets.append(len(self.note_pool))
+        return len(self.amounts) - 1
+
+    # Append (date ordinal, category, type, amount, note) records; returns
+    # the number added
+    def extend(self, records):
+        start = len(self)
+        for record in records:
+            self.append(*record)
+        return len(self) - start
+
+    # Note an explicitly given ID before it is appended
+    def add_id(self, transaction_id):
+        self.next_id = max(self.next_id, transaction_id + 1)
+        if self.ids and transaction_id <= self.ids[-1]:
+            self.ids_ascending = False
+        if self.id_positions is not None:
+            self.id_positions[transaction_id] = len(self.ids)
+
+    # Replace the IDs of every row, e.g. with the ones storage assigned
+    def set_ids(self, ids):
+        self.ids = array("Q", ids)
+        self.ids_ascending = all(a < b for a, b in zip(self.ids, self.ids[1:]))
+        self.id_positions = None
+        if self.ids:
+            self.next_id = max(self.next_id, max(self.ids) + 1)
+
+    # Shift every ID by base, for rows parsed with IDs counted from 0
+    def rebase_ids(self, base):
+        if base:
+            self.ids = array(
+                "Q", [transaction_id + base for transaction_id in self.ids]
+            )
+            self.next_id += base
+            self.id_positions = None
+
+    # Append every transaction of another store
+    def extend_store(self, other):
+        category_ids = [self.intern_category(name) for name in other.categories]
+        note_base = len(self.note_pool)
+        position_base = len(self)
+        if not other.ids_ascending or (
+            self.ids and other.ids and other.ids[0] <= self.ids[-1]
+        ):
+            self.ids_ascending = False
+        self.id_positions = None
+        self.ids.extend(other.ids)
+        self.deleted.extend(other.deleted)
+        self.next_id = max(self.next_id, other.next_id)
+        self.note_overrides.update(
+            (position_base + position, note)
+            for position, note in other.note_overrides.items()
+        )
+        self.deleted_count += other.deleted_count
+        self.garbage += other.garbage
+        self.amounts.extend(other.amounts)
+        self.dates.extend(other.dates)
+        self.types.extend(other.types)
+        self.category_ids.extend(category_ids[i] for i in other.category_ids)
+        self.note_offsets.extend(note_base + i for i in other.note_offsets[1:])
+        self.note_pool += other.note_pool
+
+    #################### Edit ####################
+    # Replace the transaction at position with a (date ordinal, category,
+    # type, amount, note) record, keeping its ID
+    def update(self, position, record):
+        date_ordinal, category, transaction_type, amount, note = record
+        self.dates[position] = date_ordinal
+        self.category_ids[position] = self.intern_category(category)
+        self.types[position] = transaction_type
+        self.amounts[position] = amount
+        self.note_overrides[position] = note
+        self.garbage += 1
+
+    # Mark the transaction at position deleted; its position stays taken
+    def delete(self, position):
+        if not self.deleted[position]:
+            self.deleted[position] = 1
+            self.deleted_count += 1
+            self.garbage += 2
+
+    # Get the share of ledger rows that compaction would drop
+    def garbage_ratio(self):
+        live = len(self) - self.deleted_count
+        return self.garbage / max(live + self.garbage, 1)
+
+    #################### Lookup ####################
+    # Get the position of a transaction ID, or None if it is not in the store
+    def position(self, transaction_id):
+        if self.ids_ascending:
+            position = bisect_left(self.ids, transaction_id)
+            if position < len(self.ids) and self.ids[position] == transaction_id:
+                return position
+            return None
+        if self.id_positions is None:
+            self.id_positions = {
+                transaction_id: position
+                for position, transaction_id in enumerate(self.ids)
+            }
+        return self.id_positions.get(transaction_id)
+
+    # Get the positions of every transaction not deleted, ascending
+    def live_positions(self):
+        if not self.deleted_count:
+            return range(len(self))
+        return array("L", compress(range(len(self)), self.deleted.translate(LIVE_MASK)))
+
+    # Get the positions of every deleted transaction, ascending
+    def deleted_positions(self):
+        return array("L", compress(range(len(self)), self.deleted))
+
+    def amount(self, index):
+        return self.amounts[index]
+
+    def date(self, index):
+        return self.dates[index]
+
+    def type(self, index):
+        return TRANSACTION_TYPES[self.types[index]]
+
+    def category(self, index):
+        return self.categories[self.category_ids[index]]
+
+    def note(self, index):
+        if self.note_overrides:
+            note = self.note_overrides.get(index)
+            if note is not None:
+                return note
+        start = self.note_offsets[index]
+        end = self.note_offsets[index + 1]
+        return self.note_pool[start:end].decode("utf-8")
+
+    # Get transaction as (date ordinal, category, type, amount, note), the
+    # same values append() takes
+    def record(self, index):
+        return (
+            self.dates[index],
+            self.category(index),
+            self.types[index],
+            self.amounts[index],
+            self.note(index),
+        )
+
+    # Get transaction as display strings (date, category, type, amount, note)
+    def row(self, index):
+        return (
+            format_date(self.dates[index]),
+            self.category(index),
+            self.type(index),
+            format_amount(self.amounts[index]),
+            self.note(index),
+        )
+
+    #################### Aggregation ####################
+    # Get total income and expense in minor units
+    def totals(self):
+        amounts, types = self.amounts, self.types
+        if self.deleted_count:
+            live = self.deleted.translate(LIVE_MASK)
+            amounts = list(compress(amounts, live))
+            types = bytes(compress(types, live))
+        # The type column is 1 for expense rows, so it doubles as a mask
+        total_expense = sum(compress(amounts, types))
+        total_income = sum(amounts) - total_expense
+        return total_income, total_expense
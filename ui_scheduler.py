@@ -0,0 +1,58 @@
+"""
+Coalesced UI updates for the Budget Tracker windows
+
+Code that changes data marks the parts of the window that show it as dirty
+instead of redrawing them. An UpdateScheduler keeps one callback per region
+(totals, table, a chart, ...) and flushes every dirty region once, from a
+single after_idle call, after the events being handled have finished:
+
+    ui = UpdateScheduler(root)
+    ui.register("totals", show_totals)
+    ui.register("table", refresh_table)
+    ui.invalidate("totals", "table")  # Nothing is drawn yet
+    ui.invalidate("table")  # Still one table refresh
+
+Regions are flushed in the order they were registered, so a region can rely
+on the ones registered before it (labels before the widgets showing them).
+A region invalidated while a flush runs is flushed on the next idle pass.
+"""
+
+from profiling import profiled
+
+
+class UpdateScheduler:
+    def __init__(self, widget):
+        self.widget = widget  # Any widget of the window, for after_idle
+        self.handlers = {}  # Region -> callback, in flush order
+        self.dirty = set()
+        self.pending = None  # after_idle ID while a flush is scheduled
+
+    # Set the callback that redraws a region
+    def register(self, region, callback):
+        self.handlers[region] = callback
+
+    # Mark regions dirty and schedule a flush unless one is already pending
+    def invalidate(self, *regions):
+        self.dirty.update(regions)
+        if self.pending is None:
+            self.pending = self.widget.after_idle(self.flush)
+
+    # Whether a region is waiting to be redrawn
+    def is_dirty(self, region):
+        return region in self.dirty
+
+    # Redraw every dirty region once, in registration order
+    @profiled("ui.flush")
+    def flush(self):
+        self.pending = None
+        dirty, self.dirty = self.dirty, set()
+        for region, callback in self.handlers.items():
+            if region in dirty:
+                callback()
+
+    # Drop a scheduled flush, before the window is destroyed
+    def cancel(self):
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+            self.pending = None
+        self.dirty.clear()